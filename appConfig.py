@@ -1,10 +1,215 @@
+import json
 import os
-from azure.appconfiguration import AzureAppConfigurationClient
+import threading
+import time
 
+import tracing
 
+
+# Seconds a cached value is served before it is refreshed in the background.
+DEFAULT_TTL_SECS = int(os.getenv("APP_CONFIG_TTL_SECS", "300"))
+
+# Per-key TTL overrides, e.g. {"OPENAI_API_KEY": 3600}.
+KEY_TTL_SECS = {}
+
+_cache = {}
+_cache_lock = threading.Lock()
+_refreshing = set()
+_backend = None
+_prefetched = False
+_refresher = None
+
+
+class AzureAppConfigBackend:
+    """
+    Reads configuration settings from Azure App Configuration.
+
+    A single client is created per backend and reused for every request, and
+    `fetch_all` lists every setting matching the key prefix / label in one call.
+    """
+
+    def __init__(self, connection_str=None, key_prefix=None, label=None):
+        from azure.appconfiguration import AzureAppConfigurationClient
+
+        connection_str = connection_str or os.getenv("APP_CONFIG_CONNECTION_STRING")
+        self.client = AzureAppConfigurationClient.from_connection_string(connection_str)
+        self.key_prefix = key_prefix if key_prefix is not None else os.getenv("APP_CONFIG_KEY_PREFIX", "")
+        self.label = label if label is not None else os.getenv("APP_CONFIG_LABEL")
+
+    def fetch(self, key):
+        config_setting = self.client.get_configuration_setting(key=self.key_prefix + key, label=self.label)
+        return config_setting.value
+
+    def fetch_all(self):
+        settings = self.client.list_configuration_settings(
+            key_filter=f"{self.key_prefix}*", label_filter=self.label
+        )
+        return {setting.key[len(self.key_prefix):]: setting.value for setting in settings}
+
+
+class EnvBackend:
+    """
+    Reads configuration settings from environment variables, optionally namespaced by a prefix.
+    """
+
+    def __init__(self, key_prefix=None):
+        self.key_prefix = key_prefix if key_prefix is not None else os.getenv("APP_CONFIG_KEY_PREFIX", "")
+
+    def fetch(self, key):
+        return os.environ[self.key_prefix + key]
+
+    def fetch_all(self):
+        return {
+            name[len(self.key_prefix):]: value
+            for name, value in os.environ.items()
+            if name.startswith(self.key_prefix)
+        }
+
+
+class FileBackend:
+    """
+    Reads configuration settings from a local file.
+
+    Files ending in `.json` are read as a flat JSON object, anything else as KEY=VALUE lines.
+    The file is re-read on every fetch so edits are picked up on the next refresh.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("APP_CONFIG_FILE", "appconfig.json")
+
+    def fetch(self, key):
+        return self.fetch_all()[key]
+
+    def fetch_all(self):
+        with open(self.path, "r", encoding="utf-8") as config_file:
+            if self.path.endswith(".json"):
+                return {key: str(value) for key, value in json.load(config_file).items()}
+            settings = {}
+            for line in config_file:
+                line = line.strip()
+                if not line or line.startswith("#") or "=" not in line:
+                    continue
+                key, value = line.split("=", 1)
+                settings[key.strip()] = value.strip().strip("'\"")
+            return settings
+
+
+BACKENDS = {
+    "azure": AzureAppConfigBackend,
+    "env": EnvBackend,
+    "file": FileBackend,
+}
+
+
+def get_backend():
+    """
+    Returns the active configuration backend, creating it from APP_CONFIG_BACKEND (azure, env or file) on first use.
+    """
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS[os.getenv("APP_CONFIG_BACKEND", "azure").lower()]()
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Replaces the configuration backend and clears the cache.
+
+    Args:
+        backend: Any object exposing `fetch(key)` and `fetch_all()`.
+    """
+    global _backend, _prefetched
+    with _cache_lock:
+        _backend = backend
+        _cache.clear()
+        _prefetched = False
+
+
+def _ttl(key):
+    return KEY_TTL_SECS.get(key, DEFAULT_TTL_SECS)
+
+
+def _store(key, value):
+    _cache[key] = (value, time.monotonic() + _ttl(key))
+
+
+def _refresh_key(key):
+    try:
+        value = get_backend().fetch(key)
+        with _cache_lock:
+            _store(key, value)
+    except Exception as e:
+        # Keep serving the last-known-good value; try again after another TTL.
+        print(f"Config refresh failed for {key}: {e}")
+        with _cache_lock:
+            if key in _cache:
+                _store(key, _cache[key][0])
+    finally:
+        with _cache_lock:
+            _refreshing.discard(key)
+
+
+def _schedule_refresh(key):
+    with _cache_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    threading.Thread(target=_refresh_key, args=(key,), daemon=True).start()
+
+
+def prefetch(force=False):
+    """
+    Loads every configuration setting from the backend in one bulk call and starts the background refresher.
+
+    Safe to call on every Streamlit rerun: after the first successful call it is a no-op unless `force` is set.
+
+    Args:
+        force (bool, optional): Reload all settings even if they were already prefetched. Defaults to False.
+
+    Returns:
+        int: The number of settings loaded, or 0 when nothing was fetched.
+    """
+    global _prefetched
+    if _prefetched and not force:
+        return 0
+    try:
+        settings = get_backend().fetch_all()
+    except Exception as e:
+        print(f"Config prefetch failed: {e}")
+        return 0
+    with _cache_lock:
+        for key, value in settings.items():
+            _store(key, value)
+        _prefetched = True
+    start_background_refresh()
+    return len(settings)
+
+
+def _refresh_loop(interval):
+    while True:
+        time.sleep(interval)
+        prefetch(force=True)
+
+
+def start_background_refresh(interval=None):
+    """
+    Starts a daemon thread that re-lists all settings every `interval` seconds (defaults to the TTL).
+    """
+    global _refresher
+    if _refresher is not None and _refresher.is_alive():
+        return
+    _refresher = threading.Thread(target=_refresh_loop, args=(interval or DEFAULT_TTL_SECS,), daemon=True)
+    _refresher.start()
+
+
+@tracing.traced('config.fetch_key')
 def fetchKey(key):
     """
-    Fetches the value of the specified configuration key from Azure App Configuration.
+    Fetches the value of the specified configuration key.
+
+    Values are served from an in-process cache. A stale value is returned immediately while it is
+    refreshed in the background, and the last-known-good value keeps being served if the refresh fails.
+    Only a key that has never been loaded causes a synchronous call to the backend.
 
     Args:
         key (str): The configuration key to fetch.
@@ -15,7 +220,14 @@ def fetchKey(key):
     Raises:
         Exception: If the configuration key is not found or an error occurs while fetching the value.
     """
-    connection_str = os.getenv("APP_CONFIG_CONNECTION_STRING")
-    client = AzureAppConfigurationClient.from_connection_string(connection_str)
-    config_setting = client.get_configuration_setting(key=key)
-    return config_setting.value
+    entry = _cache.get(key)
+    if entry is not None:
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            _schedule_refresh(key)
+        return value
+
+    value = get_backend().fetch(key)
+    with _cache_lock:
+        _store(key, value)
+    return value
@@ -1,46 +1,402 @@
+from collections import OrderedDict
 from dotenv import load_dotenv
+import asyncio
+import hashlib
+import json
 import os
+import random
+import re
+import sqlite3
+import threading
+import time
 import openai
 import appConfig
+import tracing
 
 load_dotenv()
+
+# LLM client settings
+OPENAI_DEPLOYMENT = os.getenv('OPENAI_DEPLOYMENT', 'anveshPOC')
+# Azure deployments per model, e.g. "gpt-35-turbo=perf-sql-small,gpt-4=anveshPOC"; other models use OPENAI_DEPLOYMENT
+OPENAI_DEPLOYMENTS = dict(
+    entry.strip().split('=', 1) for entry in os.getenv('OPENAI_DEPLOYMENTS', '').split(',') if '=' in entry
+)
+OPENAI_TIMEOUT_SECS = float(os.getenv('OPENAI_TIMEOUT_SECS', '30'))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '3'))
+OPENAI_BACKOFF_SECS = float(os.getenv('OPENAI_BACKOFF_SECS', '0.5'))
+OPENAI_MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', '4'))
+
+# Caps in-flight completions for the whole process, across Streamlit sessions
+_llm_semaphore = threading.BoundedSemaphore(OPENAI_MAX_CONCURRENCY)
+
+# Completion cache settings
+COMPLETION_CACHE_MEMORY_ITEMS = int(os.getenv('COMPLETION_CACHE_MEMORY_ITEMS', '256'))
+COMPLETION_CACHE_DISK_ITEMS = int(os.getenv('COMPLETION_CACHE_DISK_ITEMS', '10000'))
+COMPLETION_CACHE_TTL_SECS = int(os.getenv('COMPLETION_CACHE_TTL_SECS', str(7 * 24 * 3600)))
+COMPLETION_CACHE_PATH = os.getenv('COMPLETION_CACHE_PATH', '.cache/completions.db')
+
+
+class CompletionCache:
+    """
+    Two-tier cache of chat completions: an in-memory LRU in front of a local SQLite file.
+
+    Entries are keyed on the normalized question (the user message without few-shot examples, which
+    change as questions are learned), a hash of the system message (which embeds the schema) and the
+    model parameters. A schema change gives the prompt a new hash, so its
+    questions miss; entries for other prompts stay cached side by side, and stale ones age out
+    through the TTL and the size limits.
+    """
+
+    def __init__(self, path=COMPLETION_CACHE_PATH, memory_items=COMPLETION_CACHE_MEMORY_ITEMS,
+                 disk_items=COMPLETION_CACHE_DISK_ITEMS, ttl_secs=COMPLETION_CACHE_TTL_SECS):
+        self.path = path
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self.ttl_secs = ttl_secs
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'discards': 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                system_hash TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    @staticmethod
+    def normalize(user_message):
+        # Case is kept: questions differing in an API name or literal need different SQL
+        return re.sub(r'\s+', ' ', user_message).strip().rstrip('?.!').strip()
+
+    @staticmethod
+    def hash_text(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def make_key(self, system_hash, user_message, params):
+        payload = json.dumps([system_hash, self.normalize(user_message), params], sort_keys=True)
+        return self.hash_text(payload)
+
+    def get(self, system_message, user_message, params):
+        """
+        Return the cached completion, or None on a miss.
+        """
+        system_hash = self.hash_text(system_message)
+        key = self.make_key(system_hash, user_message, params)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl_secs:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry[0]
+            row = self._db.execute(
+                "SELECT response, created_at FROM completions WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl_secs),
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self._db.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._remember(key, row[0], row[1])
+            self.stats['disk_hits'] += 1
+            return row[0]
+
+    def put(self, system_message, user_message, params, response):
+        """
+        Store a completion in both tiers, evicting the least recently used entries beyond the size limits.
+        """
+        system_hash = self.hash_text(system_message)
+        key = self.make_key(system_hash, user_message, params)
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions (key, system_hash, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, system_hash, response, now, now),
+            )
+            self._db.execute("DELETE FROM completions WHERE created_at <= ?", (now - self.ttl_secs,))
+            self._db.execute(
+                "DELETE FROM completions WHERE key NOT IN (SELECT key FROM completions ORDER BY last_used DESC LIMIT ?)",
+                (self.disk_items,),
+            )
+            self._db.commit()
+
+    def discard(self, system_message, user_message, params):
+        """
+        Drop a cached completion, e.g. generated SQL that failed to run, so the question is asked again.
+        """
+        key = self.make_key(self.hash_text(system_message), user_message, params)
+        with self._lock:
+            in_memory = self._memory.pop(key, None) is not None
+            on_disk = self._db.execute("DELETE FROM completions WHERE key = ?", (key,)).rowcount
+            self._db.commit()
+            if in_memory or on_disk:
+                self.stats['discards'] += 1
+
+    def _remember(self, key, response, created_at):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM completions")
+            self._db.commit()
+
+    def hit_rate(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+
+
+_completion_cache = None
+
+
+def get_completion_cache():
+    """
+    Returns the process-wide completion cache, creating it on first use.
+    """
+    global _completion_cache
+    if _completion_cache is None:
+        _completion_cache = CompletionCache()
+    return _completion_cache
+
+def discard_completion(system_message, cache_key, model="gpt-4", temperature=0, max_tokens=500):
+    """
+    Removes a cached completion, taking the same arguments as `get_completion_from_messages` with the
+    text it was cached under. Used when generated SQL fails to run, so the same bad SQL is not served
+    again for the question.
+    """
+    params = {'model': model, 'temperature': temperature, 'max_tokens': max_tokens}
+    get_completion_cache().discard(system_message, cache_key, params)
+
 def initialize_openai_api():
     openai.api_type = appConfig.fetchKey("OPENAI_TYPE").strip()
     openai.api_base = appConfig.fetchKey("OPENAI_BASE").strip()
     openai.api_version = appConfig.fetchKey("OPENAI_API_VERSION").strip()
     openai.api_key =  appConfig.fetchKey("OPENAI_API_KEY").strip()
 
-def get_completion_from_messages(system_message, user_message, model="gpt-4", temperature=0, max_tokens=500) -> str:
+
+def _build_request(system_message, user_message, model, temperature, max_tokens, timeout):
+    initialize_openai_api()
+    request = {
+        'messages': [
+            {'role': 'system', 'content': system_message},
+            {'role': 'user', 'content': f"{user_message}"}
+        ],
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+        'top_p': 0.95,
+        'frequency_penalty': 0,
+        'presence_penalty': 0,
+        'stop': None,
+        'request_timeout': timeout or OPENAI_TIMEOUT_SECS,
+    }
+    # Azure routes by deployment name; OpenAI-compatible endpoints (including the local stub) by model
+    if openai.api_type in ('azure', 'azure_ad'):
+        request['engine'] = OPENAI_DEPLOYMENTS.get(model, OPENAI_DEPLOYMENT)
+    else:
+        request['model'] = model
+    return request
+
+
+def _retry_delay(error, attempt):
+    """
+    Returns the seconds to wait before retrying `error`, or None if it should not be retried.
+    """
+    retryable = (
+        openai.error.RateLimitError, openai.error.ServiceUnavailableError, openai.error.Timeout,
+        openai.error.APIConnectionError, openai.error.TryAgain,
+    )
+    status = getattr(error, 'http_status', None)
+    if not isinstance(error, retryable) and not (isinstance(error, openai.error.APIError) and status and status >= 500):
+        return None
+    if attempt >= OPENAI_MAX_RETRIES:
+        return None
+    retry_after = (getattr(error, 'headers', None) or {}).get('Retry-After')
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    # Full jitter: spread retries of concurrent callers over the whole backoff window
+    return random.uniform(0, OPENAI_BACKOFF_SECS * 2 ** attempt)
+
+
+def _create_with_retries(request):
+    attempt = 0
+    while True:
+        try:
+            with _llm_semaphore:
+                return openai.ChatCompletion.create(**request)
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            time.sleep(delay)
+
+
+@tracing.traced('llm.completion')
+def get_completion_from_messages(system_message, user_message, model="gpt-4", temperature=0, max_tokens=500, use_cache=True, timeout=None, cache_key=None) -> str:
     """
     Generates a completion response from a system message and a user message using the OpenAI Chat API.
 
+    Calls are bounded by a per-call timeout, retried with jittered exponential backoff on 429/5xx
+    and connection errors, and limited process-wide to OPENAI_MAX_CONCURRENCY in flight.
+
     Args:
         system_message (str): The system message to be included in the conversation.
         user_message (str): The user message to be included in the conversation.
         model (str, optional): The model to use for generating the completion. Defaults to "gpt-4".
         temperature (float, optional): Controls the randomness of the output. Higher values make the output more random. Defaults to 0.
         max_tokens (int, optional): The maximum number of tokens in the response. Defaults to 500.
+        use_cache (bool, optional): Serve repeated questions from the completion cache. Defaults to True.
+        timeout (float, optional): Seconds to wait for the API. Defaults to OPENAI_TIMEOUT_SECS.
+        cache_key (str, optional): The text the completion is cached under, e.g. the bare question
+            when `user_message` adds examples to it that change over time. Defaults to `user_message`.
 
     Returns:
         str: The completion response generated by the Chat API.
     """
-    initialize_openai_api()
-    messages = [
-        {'role': 'system', 'content': system_message},
-        {'role': 'user', 'content': f"{user_message}"}
-    ]
-    response = openai.ChatCompletion.create(
-            engine="anveshPOC",
-            messages = messages,
-            temperature=0.7,
-            max_tokens=800,
-            top_p=0.95,
-            frequency_penalty=0,
-            presence_penalty=0,
-            stop=None
-            )
-    
-    return response.choices[0].message["content"]
+    params = {'model': model, 'temperature': temperature, 'max_tokens': max_tokens}
+    if use_cache:
+        cached = get_completion_cache().get(system_message, cache_key or user_message, params)
+        if cached is not None:
+            return cached
+
+    request = _build_request(system_message, user_message, model, temperature, max_tokens, timeout)
+    response = _create_with_retries(request)
+    content = response.choices[0].message["content"]
+    if use_cache:
+        get_completion_cache().put(system_message, cache_key or user_message, params, content)
+    return content
+
+
+def stream_completion_from_messages(system_message, user_message, model="gpt-4", temperature=0, max_tokens=500, use_cache=True, timeout=None, cache_key=None):
+    """
+    Generates a completion like `get_completion_from_messages`, yielding the text as it is produced.
+
+    Retries only happen before the first token has been received. A cached completion is yielded in one piece.
+    The concurrency slot is held only while a response is streaming; close the generator (e.g. with
+    `contextlib.closing`) when stopping early so the slot is released at once.
+
+    Args:
+        system_message (str): The system message to be included in the conversation.
+        user_message (str): The user message to be included in the conversation.
+        model (str, optional): The model to use for generating the completion. Defaults to "gpt-4".
+        temperature (float, optional): Controls the randomness of the output. Defaults to 0.
+        max_tokens (int, optional): The maximum number of tokens in the response. Defaults to 500.
+        use_cache (bool, optional): Serve repeated questions from the completion cache. Defaults to True.
+        timeout (float, optional): Seconds to wait for each read from the API. Defaults to OPENAI_TIMEOUT_SECS.
+        cache_key (str, optional): The text the completion is cached under. Defaults to `user_message`.
+
+    Yields:
+        str: Successive pieces of the completion text.
+    """
+    # The span is not made active: the caller's code runs between the pieces this generator yields
+    llm_span = tracing.start_span('llm.stream', model=model, cached=False)
+    pieces = _stream_completion(system_message, user_message, model, temperature, max_tokens, use_cache, timeout, cache_key, llm_span)
+    try:
+        for piece in pieces:
+            if 'first_token_ms' not in llm_span.attributes:
+                llm_span.set_attribute('first_token_ms', llm_span.elapsed_ms())
+            yield piece
+    except Exception as e:
+        llm_span.finish(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        # Release the concurrency slot right away if the caller stopped reading
+        pieces.close()
+        llm_span.finish()
+
+
+def _stream_completion(system_message, user_message, model, temperature, max_tokens, use_cache, timeout, cache_key, llm_span):
+    params = {'model': model, 'temperature': temperature, 'max_tokens': max_tokens}
+    if use_cache:
+        cached = get_completion_cache().get(system_message, cache_key or user_message, params)
+        if cached is not None:
+            llm_span.set_attribute('cached', True)
+            yield cached
+            return
+
+    request = _build_request(system_message, user_message, model, temperature, max_tokens, timeout)
+    request['stream'] = True
+    pieces = []
+    attempt = 0
+    while True:
+        # The slot is held while the response streams in, but not during backoff. The finally
+        # also runs when the caller abandons the generator halfway, which closes it
+        _llm_semaphore.acquire()
+        try:
+            chunks = openai.ChatCompletion.create(**request)
+            for chunk in chunks:
+                if not chunk.choices:
+                    continue
+                piece = chunk.choices[0].get('delta', {}).get('content')
+                if piece:
+                    pieces.append(piece)
+                    yield piece
+            break
+        except Exception as e:
+            delay = None if pieces else _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+        finally:
+            _llm_semaphore.release()
+        time.sleep(delay)
+
+    if use_cache:
+        get_completion_cache().put(system_message, cache_key or user_message, params, ''.join(pieces))
+
+
+@tracing.traced('llm.completion')
+async def aget_completion_from_messages(system_message, user_message, model="gpt-4", temperature=0, max_tokens=500, use_cache=True, timeout=None, cache_key=None) -> str:
+    """
+    Async variant of `get_completion_from_messages`, sharing its cache, retry policy and concurrency limit.
+
+    Returns:
+        str: The completion response generated by the Chat API.
+    """
+    params = {'model': model, 'temperature': temperature, 'max_tokens': max_tokens}
+    if use_cache:
+        cached = get_completion_cache().get(system_message, cache_key or user_message, params)
+        if cached is not None:
+            return cached
+
+    request = _build_request(system_message, user_message, model, temperature, max_tokens, timeout)
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    while True:
+        # Wait for a slot off the event loop so other coroutines keep running
+        await loop.run_in_executor(None, _llm_semaphore.acquire)
+        try:
+            response = await openai.ChatCompletion.acreate(**request)
+            break
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+        finally:
+            _llm_semaphore.release()
+        await asyncio.sleep(delay)
+
+    content = response.choices[0].message["content"]
+    if use_cache:
+        get_completion_cache().put(system_message, cache_key or user_message, params, content)
+    return content
 
 if __name__ == "__main__":
     system_message = "You are a helpful assistant"
@@ -0,0 +1,320 @@
+# baselines.py
+"""
+Rolling per-API baselines and regression verdicts.
+
+ApiBaselines holds one row per API with an EWMA and a rolling median (over the last
+BASELINE_WINDOW_RUNS runs) of its 90th/95th percentile and error percentage. When a run is ingested
+each of its APIs is judged against that baseline, the verdict is stored in RunVerdicts and the
+baseline is updated, so the work per run is proportional to its number of APIs and never rescans
+PerformanceMetrics. The aggregate report's TOTAL row is not an API and gets no baseline or verdict.
+
+    python baselines.py rebuild   # recompute baselines and verdicts from all ingested runs
+"""
+import json
+import os
+import sys
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import sql_db
+
+BASELINE_METRICS = ['NinetyPercentile', 'NinetyFivePercentile', 'ErrorPercentage']
+BASELINE_WINDOW_RUNS = int(os.getenv('BASELINE_WINDOW_RUNS', '10'))
+BASELINE_EWMA_ALPHA = float(os.getenv('BASELINE_EWMA_ALPHA', '0.3'))
+# Runs an API needs in its baseline before it is judged
+BASELINE_MIN_RUNS = int(os.getenv('BASELINE_MIN_RUNS', '3'))
+# A 90th percentile this much above the rolling median (and by at least the minimum delta) is a regression
+REGRESSION_LATENCY_PCT = float(os.getenv('REGRESSION_LATENCY_PCT', '20'))
+REGRESSION_MIN_DELTA_MS = float(os.getenv('REGRESSION_MIN_DELTA_MS', '50'))
+# An error percentage this many points above the rolling median is a regression
+REGRESSION_ERROR_POINTS = float(os.getenv('REGRESSION_ERROR_POINTS', '1'))
+
+REGRESSED, IMPROVED, OK, NEW = 'REGRESSED', 'IMPROVED', 'OK', 'NEW'
+
+API_BASELINES_TABLE_DDL = """
+CREATE TABLE ApiBaselines (
+    API VARCHAR(255) NOT NULL PRIMARY KEY,
+    RunCount INT NOT NULL,
+    LastRunId INT NOT NULL,
+    EwmaNinetyPercentile FLOAT,
+    EwmaNinetyFivePercentile FLOAT,
+    EwmaErrorPercentage FLOAT,
+    MedianNinetyPercentile FLOAT,
+    MedianNinetyFivePercentile FLOAT,
+    MedianErrorPercentage FLOAT,
+    RecentValues {text}
+);
+"""
+
+RUN_VERDICTS_TABLE_DDL = """
+CREATE TABLE RunVerdicts (
+    RunId INT NOT NULL,
+    API VARCHAR(255) NOT NULL,
+    Verdict VARCHAR(10) NOT NULL,
+    NinetyPercentile FLOAT,
+    BaselineNinetyPercentile FLOAT,
+    NinetyPercentileChange FLOAT,
+    ErrorPercentage FLOAT,
+    BaselineErrorPercentage FLOAT,
+    PRIMARY KEY (RunId, API)
+);
+"""
+
+# IN-list size when loading and replacing baselines, well below every backend's parameter limit
+_IN_CHUNK = 500
+
+# Label of the aggregate report's run-wide row
+TOTAL_LABEL = 'TOTAL'
+
+# Backend whose baseline tables are known to exist
+_tables_ready_for = None
+_tables_lock = threading.Lock()
+
+
+def setup_baseline_tables(conn=None):
+    """
+    Creates the ApiBaselines and RunVerdicts tables if they do not exist yet.
+    """
+    global _tables_ready_for
+    if conn is None:
+        with sql_db.connection() as conn:
+            return setup_baseline_tables(conn)
+    with _tables_lock:
+        backend = sql_db.get_backend()
+        if _tables_ready_for is backend:
+            return
+        existing = {table_name for table_name, _, _ in backend.introspect_schema(conn, ['ApiBaselines', 'RunVerdicts'])}
+        types = backend.types
+        if 'ApiBaselines' not in existing:
+            sql_db.create_table(conn, API_BASELINES_TABLE_DDL.format(**types))
+        if 'RunVerdicts' not in existing:
+            sql_db.create_table(conn, RUN_VERDICTS_TABLE_DDL.format(**types))
+        conn.commit()
+        _tables_ready_for = backend
+
+
+def _chunks(values):
+    for offset in range(0, len(values), _IN_CHUNK):
+        yield values[offset:offset + _IN_CHUNK]
+
+
+def _load_baselines(conn, apis):
+    # Locking read: the rows (and missing keys) stay locked until the caller's transaction ends.
+    # APIs are locked in sorted order so two ingests of overlapping APIs cannot deadlock
+    baselines = {}
+    cursor = conn.cursor()
+    table = sql_db.get_backend().lock_for_update('ApiBaselines')
+    for chunk in _chunks(sorted(apis)):
+        cursor.execute(
+            "SELECT API, RunCount, EwmaNinetyPercentile, EwmaNinetyFivePercentile, EwmaErrorPercentage, RecentValues "
+            f"FROM {table} WHERE API IN ({', '.join('?' * len(chunk))})",
+            list(chunk),
+        )
+        for api, run_count, *ewma, recent_values in cursor.fetchall():
+            baselines[api] = {
+                'run_count': int(run_count),
+                'ewma': [None if value is None else float(value) for value in ewma],
+                'recent': json.loads(recent_values) if recent_values else [],
+            }
+    return baselines
+
+
+def _error_percentage(value):
+    try:
+        return float(str(value).rstrip('%'))
+    except ValueError:
+        return None
+
+
+def _medians(recent):
+    # Column medians of the [p90, p95, error %] window, ignoring missing values; None where all are missing
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        medians = np.nanmedian(np.array(recent, dtype='float64'), axis=0)
+    return [None if np.isnan(median) else float(median) for median in medians]
+
+
+def judge(values, baseline):
+    """
+    Judge one API of a run against its baseline.
+
+    Parameters:
+    values (list): The run's [p90, p95, error %] for the API.
+    baseline (dict): The API's baseline, or None if it has none yet.
+
+    Returns:
+    tuple: The verdict, the baseline p90 and error % (rolling medians) and the relative p90 change.
+    """
+    if baseline is None or baseline['run_count'] < BASELINE_MIN_RUNS or not baseline['recent']:
+        return NEW, None, None, None
+    p90, _, error_percentage = values
+    baseline_p90, _, baseline_error = _medians(baseline['recent'])
+    change = (p90 - baseline_p90) / baseline_p90 if p90 is not None and baseline_p90 else None
+    slower = change is not None and change * 100 > REGRESSION_LATENCY_PCT and p90 - baseline_p90 >= REGRESSION_MIN_DELTA_MS
+    more_errors = (error_percentage is not None and baseline_error is not None
+                   and error_percentage - baseline_error > REGRESSION_ERROR_POINTS)
+    if slower or more_errors:
+        verdict = REGRESSED
+    elif change is not None and -change * 100 > REGRESSION_LATENCY_PCT and baseline_p90 - p90 >= REGRESSION_MIN_DELTA_MS:
+        verdict = IMPROVED
+    else:
+        verdict = OK
+    return verdict, baseline_p90, baseline_error, change
+
+
+def update_baselines(conn, run_id, metrics_df, commit=True):
+    """
+    Judge a newly ingested run against the per-API baselines, store the verdicts and fold the run
+    into the baselines. Only the run's APIs are read and written, in one transaction that locks
+    their baseline rows, so concurrent ingests in any process or app instance take turns.
+
+    Parameters:
+    conn (Connection): The database connection object.
+    run_id (int): The run's RunId.
+    metrics_df (pandas.DataFrame): The run's rows in PerformanceMetrics layout.
+    commit (bool, optional): Commit when done; False leaves it to the caller. Defaults to True.
+
+    Returns:
+    pandas.DataFrame: One verdict row per API, in RunVerdicts layout.
+    """
+    setup_baseline_tables(conn)
+    metrics = metrics_df[metrics_df['API'] != TOTAL_LABEL].drop_duplicates('API', keep='last')
+    apis = [str(api) for api in metrics['API']]
+    p90 = pd.to_numeric(metrics['NinetyPercentile'], errors='coerce').astype(float).tolist()
+    p95 = pd.to_numeric(metrics['NinetyFivePercentile'], errors='coerce').astype(float).tolist()
+    errors = [_error_percentage(value) for value in metrics['ErrorPercentage']]
+
+    sql_db.get_backend().begin_write(conn)
+    try:
+        baselines = _load_baselines(conn, apis)
+        verdicts, new_baselines = [], []
+        for api, values in zip(apis, zip(p90, p95, errors)):
+            values = [None if value is None or np.isnan(value) else value for value in values]
+            baseline = baselines.get(api)
+            verdict, baseline_p90, baseline_error, change = judge(values, baseline)
+            verdicts.append((int(run_id), api, verdict, values[0], baseline_p90, change, values[2], baseline_error))
+
+            previous = baseline or {'run_count': 0, 'ewma': [None] * len(values), 'recent': []}
+            recent = (previous['recent'] + [values])[-BASELINE_WINDOW_RUNS:]
+            ewma = [
+                previous_value if value is None else
+                value if previous_value is None else
+                BASELINE_EWMA_ALPHA * value + (1 - BASELINE_EWMA_ALPHA) * previous_value
+                for value, previous_value in zip(values, previous['ewma'])
+            ]
+            new_baselines.append((
+                api, previous['run_count'] + 1, int(run_id), *ewma, *_medians(recent), json.dumps(recent),
+            ))
+
+        cursor = conn.cursor()
+        if apis:
+            for chunk in _chunks(apis):
+                cursor.execute(f"DELETE FROM ApiBaselines WHERE API IN ({', '.join('?' * len(chunk))})", list(chunk))
+            cursor.executemany(
+                "INSERT INTO ApiBaselines (API, RunCount, LastRunId, EwmaNinetyPercentile, EwmaNinetyFivePercentile, "
+                "EwmaErrorPercentage, MedianNinetyPercentile, MedianNinetyFivePercentile, MedianErrorPercentage, RecentValues) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                new_baselines,
+            )
+            cursor.executemany(
+                "INSERT INTO RunVerdicts (RunId, API, Verdict, NinetyPercentile, BaselineNinetyPercentile, "
+                "NinetyPercentileChange, ErrorPercentage, BaselineErrorPercentage) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                verdicts,
+            )
+        if commit:
+            conn.commit()
+    except Exception:
+        if commit:
+            conn.rollback()
+        raise
+    if commit:
+        sql_db.notify_data_changed()
+    return pd.DataFrame(verdicts, columns=[
+        'RunId', 'API', 'Verdict', 'NinetyPercentile', 'BaselineNinetyPercentile',
+        'NinetyPercentileChange', 'ErrorPercentage', 'BaselineErrorPercentage',
+    ])
+
+
+def run_verdicts_query(run_ids):
+    """
+    Build the query counting regressed and improved APIs per run, for the history panel.
+    """
+    run_id_list = ', '.join(str(int(run_id)) for run_id in run_ids) or 'NULL'
+    return (
+        "SELECT RunId, "
+        f"SUM(CASE WHEN Verdict = '{REGRESSED}' THEN 1 ELSE 0 END) AS Regressed, "
+        f"SUM(CASE WHEN Verdict = '{IMPROVED}' THEN 1 ELSE 0 END) AS Improved, "
+        f"SUM(CASE WHEN Verdict = '{NEW}' THEN 1 ELSE 0 END) AS New, "
+        "COUNT(*) AS APIs "
+        f"FROM RunVerdicts WHERE RunId IN ({run_id_list}) GROUP BY RunId"
+    )
+
+
+def regressions_query(run_ids):
+    """
+    Build the query listing the regressed APIs of some runs, worst first.
+    """
+    run_id_list = ', '.join(str(int(run_id)) for run_id in run_ids) or 'NULL'
+    return (
+        "SELECT RunId, API, NinetyPercentile, BaselineNinetyPercentile, NinetyPercentileChange, "
+        "ErrorPercentage, BaselineErrorPercentage "
+        f"FROM RunVerdicts WHERE Verdict = '{REGRESSED}' AND RunId IN ({run_id_list}) "
+        "ORDER BY RunId DESC, NinetyPercentileChange DESC"
+    )
+
+
+def describe_verdicts(row):
+    """
+    One-line verdict for a run from its `run_verdicts_query` row.
+    """
+    if row['APIs'] == row['New']:
+        return "Building baseline"
+    if row['Regressed']:
+        return f"{int(row['Regressed'])} regressed"
+    if row['Improved']:
+        return f"OK, {int(row['Improved'])} improved"
+    return "OK"
+
+
+def rebuild_baselines():
+    """
+    Recompute all baselines and verdicts by replaying every ingested run in RunId order.
+
+    Returns:
+    int: The number of runs replayed.
+    """
+    with sql_db.connection() as conn:
+        setup_baseline_tables(conn)
+        cursor = conn.cursor()
+        sql_db.get_backend().begin_write(conn)
+        cursor.execute("DELETE FROM RunVerdicts")
+        cursor.execute("DELETE FROM ApiBaselines")
+        cursor.execute("SELECT RunId FROM Runs ORDER BY RunId")
+        run_ids = [int(row[0]) for row in cursor.fetchall()]
+        try:
+            for run_id in run_ids:
+                cursor.execute(
+                    "SELECT API, NinetyPercentile, NinetyFivePercentile, ErrorPercentage FROM PerformanceMetrics WHERE RunId = ?",
+                    (run_id,),
+                )
+                metrics = pd.DataFrame.from_records(
+                    [tuple(row) for row in cursor.fetchall()], columns=['API'] + BASELINE_METRICS
+                )
+                if len(metrics):
+                    update_baselines(conn, run_id, metrics, commit=False)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    sql_db.notify_data_changed()
+    return len(run_ids)
+
+
+if __name__ == "__main__":
+    if 'rebuild' in sys.argv[1:]:
+        print(f"Rebuilt baselines from {rebuild_baselines()} runs")
+    else:
+        setup_baseline_tables()
@@ -0,0 +1,322 @@
+# batch_ingest.py
+"""
+Headless batch processing of JMeter results files.
+
+Files are parsed and summarized in a process pool, ingested through the shared connection pool by
+a few writer threads, and an HTML report is written per run. Used by `python main_app.py batch`;
+the upload page shares the validation and ingest steps.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import glob
+import os
+import threading
+import time
+
+import pandas as pd
+
+import baselines
+import jtl_ingest
+import sql_db
+import summary_engine
+import tracing
+from latency_sketch import LatencySketch
+
+RESULTS_FILE_EXTENSIONS = ('.csv', '.jtl')
+BATCH_PARSE_WORKERS = int(os.getenv('BATCH_PARSE_WORKERS', str(os.cpu_count() or 2)))
+BATCH_DB_WORKERS = int(os.getenv('BATCH_DB_WORKERS', '4'))
+# Threads parsing files uploaded together in the browser
+UPLOAD_PARSE_WORKERS = int(os.getenv('UPLOAD_PARSE_WORKERS', '4'))
+
+
+def discover_files(patterns):
+    """
+    Expand directories and glob patterns into the results files to process.
+
+    Parameters:
+    patterns (list): Directories, glob patterns or file paths.
+
+    Returns:
+    tuple: Sorted paths whose names follow the `<Release>_<start>_<end>.csv` convention, and the
+    sorted paths that were skipped because they do not.
+    """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for extension in RESULTS_FILE_EXTENSIONS:
+                paths.update(glob.glob(os.path.join(pattern, f"*{extension}")))
+        else:
+            paths.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    matching = sorted(path for path in paths if summary_engine.is_run_file_name(path))
+    return matching, sorted(paths - set(matching))
+
+
+def summarize_file(path, sla_secs, acceptable_error_rate):
+    """
+    Parse and summarize one results file. Runs in a worker process, so it only touches the file.
+
+    Returns:
+    dict: The content hash, aggregate report, serialized latency sketches, summary figures, HTML
+    report and timings, all picklable.
+    """
+    started = time.perf_counter()
+    with open(path, 'rb') as results_file:
+        file_hash = summary_engine.content_hash(results_file)
+        report, sketches = jtl_ingest.load_results_file(results_file)
+    summary = summary_engine.compute_summary(report, path, sla_secs, acceptable_error_rate)
+    html_report = summary_engine.render_summary_html(summary)
+    return {
+        'path': path,
+        'content_hash': file_hash,
+        'report': report,
+        'sketches': {label: sketch.to_bytes() for label, sketch in sketches.items()},
+        'release': summary['release'],
+        'test_status': summary['test_status'],
+        'total_samples': summary['total_samples'],
+        'test_start_time': summary['test_start_time'],
+        'test_end_time': summary['test_end_time'],
+        'html': html_report,
+        'parse_secs': time.perf_counter() - started,
+    }
+
+
+def parse_upload(uploaded_file, content_hash=None):
+    """
+    Validate and parse one uploaded results file.
+
+    Parameters:
+    uploaded_file (file-like): The uploaded file; must have a `name`.
+    content_hash (str, optional): The file's SHA-256, if the caller hashed it already. Defaults to hashing the file.
+
+    Returns:
+    dict: The file name, content hash, release, test start and end times, aggregate report and latency sketches.
+
+    Raises:
+    ValueError: If the file name or columns are not those of a results file, or the file is empty.
+    """
+    name = os.path.basename(uploaded_file.name)
+    if not summary_engine.is_run_file_name(name):
+        raise ValueError("file name does not match <Release>_<start>_<end>.csv")
+    release, test_start_time, test_end_time = summary_engine.parse_run_file_name(name)
+    try:
+        report, sketches = jtl_ingest.load_results_file(uploaded_file)
+    except pd.errors.EmptyDataError:
+        raise ValueError("the file is empty")
+    missing = [column for column in sql_db.PERFORMANCE_METRICS_COLUMNS if column not in report.columns]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+    if report.empty:
+        raise ValueError("the file has no results")
+    return {
+        'name': name,
+        'content_hash': content_hash or summary_engine.content_hash(uploaded_file),
+        'release': release,
+        'test_start_time': test_start_time,
+        'test_end_time': test_end_time,
+        'report': report,
+        'sketches': sketches,
+    }
+
+
+def parse_uploads(uploaded_files, max_workers=None, content_hashes=None):
+    """
+    Validate and parse several uploaded files concurrently.
+
+    Parameters:
+    uploaded_files (list): The uploaded files.
+    max_workers (int, optional): Parse threads. Defaults to UPLOAD_PARSE_WORKERS.
+    content_hashes (list, optional): The files' SHA-256s, if the caller hashed them already.
+
+    Returns:
+    list: (parsed dict, None) or (None, error message) per file, in upload order.
+    """
+    def parse(uploaded_file, content_hash):
+        try:
+            return parse_upload(uploaded_file, content_hash), None
+        except Exception as e:
+            return None, str(e)
+
+    content_hashes = content_hashes or [None] * len(uploaded_files)
+    with ThreadPoolExecutor(max_workers=max_workers or UPLOAD_PARSE_WORKERS, thread_name_prefix='upload-parse') as pool:
+        return list(pool.map(parse, uploaded_files, content_hashes))
+
+
+def ingest_run(conn, release, test_start_time, test_end_time, report, sketches, content_hash=None, file_name=None):
+    """
+    Insert one results file as a run: the run row, its metrics, its latency sketches and its
+    regression verdicts, in one transaction.
+
+    With a content hash, a file that was ingested before is not ingested again: the earlier run is
+    returned instead. This also holds for two concurrent ingests of the same file, since the hash is
+    the IngestedFiles primary key.
+
+    Parameters:
+    conn (Connection): The database connection object.
+    release (str): The test (release) name.
+    test_start_time (datetime): The test start time.
+    test_end_time (datetime): The test end time.
+    report (pandas.DataFrame): The aggregate report with JMeter column names.
+    sketches (dict): API label -> LatencySketch.
+    content_hash (str, optional): SHA-256 of the file content. Defaults to None (no deduplication).
+    file_name (str, optional): The file name, recorded with the hash. Defaults to None.
+
+    Returns:
+    dict: The RunId, the number of metric rows inserted, whether the file was a duplicate of an
+    earlier run, and the run's regression verdicts (verdict -> number of APIs, plus the regressed
+    API names).
+    """
+    if content_hash is not None:
+        existing = sql_db.ingested_runs(conn, [content_hash]).get(content_hash)
+        if existing is not None:
+            return _duplicate(existing)
+    # Create missing tables up front; creating them inside the run's transaction would commit it early
+    baselines.setup_baseline_tables(conn)
+
+    try:
+        # The database allocates the RunId; everything below commits or rolls back together. Taking
+        # the write lock first keeps the baseline update from reading baselines another ingest is changing
+        sql_db.get_backend().begin_write(conn)
+        run_id = sql_db.create_run(conn, release, test_start_time, test_end_time)
+        if content_hash is not None:
+            sql_db.record_ingested_file(conn, content_hash, run_id, file_name)
+        metrics = sql_db.to_performance_metrics_frame(report, run_id)
+        stats = sql_db.bulk_insert(conn, 'PerformanceMetrics', metrics, commit=False)
+        if sketches:
+            sql_db.store_latency_sketches(conn, run_id, sketches, commit=False)
+        # Commits the whole run
+        verdicts = baselines.update_baselines(conn, run_id, metrics)
+    except Exception as e:
+        conn.rollback()
+        if content_hash is not None and sql_db.get_backend().is_unique_violation(e):
+            # The same file was ingested concurrently and committed first
+            existing = sql_db.ingested_runs(conn, [content_hash]).get(content_hash)
+            if existing is not None:
+                return _duplicate(existing)
+        raise
+    return {
+        'run_id': run_id,
+        'rows': stats['rows'],
+        'duplicate': False,
+        'verdicts': verdicts['Verdict'].value_counts().to_dict(),
+        'regressed': verdicts.loc[verdicts['Verdict'] == baselines.REGRESSED, 'API'].tolist(),
+    }
+
+
+def _duplicate(run_id):
+    return {'run_id': run_id, 'rows': 0, 'duplicate': True, 'verdicts': {}, 'regressed': []}
+
+
+def ingest_summary(result):
+    """
+    Insert one summarized file from `summarize_file` as a run, on a pooled connection.
+
+    Returns:
+    dict: The RunId, rows inserted, whether the file was ingested before, and seconds taken.
+    """
+    started = time.perf_counter()
+    with tracing.span('batch.ingest', new_trace=True, file=os.path.basename(result['path'])):
+        with sql_db.connection() as conn:
+            sketches = {label: LatencySketch.from_bytes(data) for label, data in result['sketches'].items()}
+            ingested = ingest_run(conn, result['release'], result['test_start_time'], result['test_end_time'],
+                                  result['report'], sketches, result['content_hash'], os.path.basename(result['path']))
+    ingested['ingest_secs'] = time.perf_counter() - started
+    return ingested
+
+
+def write_report(result, out_dir):
+    """
+    Write a file's HTML summary report to `out_dir`.
+
+    Returns:
+    str: The report path.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(result['path']))[0]
+    path = os.path.join(out_dir, f"{name}_PerfTestReport.html")
+    with open(path, 'w', encoding='utf-8') as report_file:
+        report_file.write(result['html'])
+    return path
+
+
+def run_batch(paths, sla_secs, acceptable_error_rate, ingest=True, report_dir=None,
+              parse_workers=None, db_workers=None, progress=print):
+    """
+    Summarize, ingest and report on many results files.
+
+    Parsing is CPU bound and runs in `parse_workers` processes. Each parsed file is handed to one of
+    `db_workers` threads, which insert it through the shared connection pool while later files are
+    still being parsed.
+
+    Parameters:
+    paths (list): Results files to process.
+    sla_secs (int): The 90th percentile SLA in seconds.
+    acceptable_error_rate (float): The highest error percentage for a passing test.
+    ingest (bool, optional): Insert each file as a run. Defaults to True.
+    report_dir (str, optional): Write HTML reports here; None skips reports. Defaults to None.
+    parse_workers (int, optional): Worker processes. Defaults to BATCH_PARSE_WORKERS.
+    db_workers (int, optional): Writer threads. Defaults to BATCH_DB_WORKERS.
+    progress (callable, optional): Receives one progress line per file. Defaults to print.
+
+    Returns:
+    dict: Per-file outcomes and throughput totals.
+    """
+    started = time.perf_counter()
+    outcomes, lock = [], threading.Lock()
+    totals = {'files': len(paths), 'succeeded': 0, 'failed': 0, 'samples': 0, 'rows': 0, 'duplicates': 0, 'regressed_runs': 0}
+
+    def finish(path, result=None, error=None, ingested=None, report_path=None):
+        with lock:
+            outcome = {'path': path, 'error': error}
+            if error is None:
+                outcome.update(release=result['release'], test_status=result['test_status'],
+                               samples=result['total_samples'], parse_secs=result['parse_secs'], report=report_path)
+                outcome.update(ingested or {})
+                totals['succeeded'] += 1
+                totals['samples'] += result['total_samples']
+                totals['rows'] += outcome.get('rows', 0)
+                totals['duplicates'] += 1 if outcome.get('duplicate') else 0
+                totals['regressed_runs'] += 1 if outcome.get('regressed') else 0
+            else:
+                totals['failed'] += 1
+            outcomes.append(outcome)
+            done = len(outcomes)
+            elapsed = time.perf_counter() - started
+        name = os.path.basename(outcome['path'])
+        if error is None:
+            detail = f"{outcome['test_status']}, {outcome['samples']} samples, parse {outcome['parse_secs']:.2f}s"
+            if ingested and ingested['duplicate']:
+                detail += f", already ingested as RunId {ingested['run_id']}"
+            elif ingested:
+                detail += f", RunId {ingested['run_id']} ({ingested['rows']} rows, {ingested['ingest_secs']:.2f}s)"
+                if ingested['regressed']:
+                    detail += f", regressed: {', '.join(ingested['regressed'])}"
+        else:
+            detail = f"FAILED: {error}"
+        progress(f"[{done}/{len(paths)}] {name}: {detail} | {done / elapsed:.1f} files/sec")
+
+    def store(result):
+        try:
+            ingested = ingest_summary(result) if ingest else None
+            report_path = write_report(result, report_dir) if report_dir else None
+        except Exception as e:
+            finish(result["path"], error=f"{type(e).__name__}: {e}")
+            return
+        finish(result['path'], result, ingested=ingested, report_path=report_path)
+
+    with ProcessPoolExecutor(max_workers=parse_workers or BATCH_PARSE_WORKERS) as parse_pool, \
+            ThreadPoolExecutor(max_workers=db_workers or BATCH_DB_WORKERS, thread_name_prefix='batch-ingest') as db_pool:
+        futures = {parse_pool.submit(summarize_file, path, sla_secs, acceptable_error_rate): path for path in paths}
+        stores = []
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                finish(futures[future], error=f"{type(e).__name__}: {e}")
+                continue
+            stores.append(db_pool.submit(store, result))
+        for store_future in stores:
+            store_future.result()
+
+    totals['seconds'] = time.perf_counter() - started
+    totals['files_per_sec'] = len(paths) / totals['seconds'] if totals['seconds'] else 0.0
+    totals['samples_per_sec'] = totals['samples'] / totals['seconds'] if totals['seconds'] else 0.0
+    return {'outcomes': outcomes, 'totals': totals}
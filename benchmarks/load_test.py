@@ -0,0 +1,337 @@
+# benchmarks/load_test.py
+"""
+Concurrent-user load test of the PerfTestAnalyzer page.
+
+Each simulated session is a thread, like a Streamlit session, that repeats the page's rerun:
+sometimes upload a results file, load the history panel, ask a question (answered from a query
+template or by the LLM) and run the SQL. Like the page, each database step checks out a pooled
+connection of its own, and none is held during the LLM call. Everything runs
+locally against a scratch SQLite database and the stub LLM from `llm_stub`, with configurable
+latency and error injection.
+
+The sessions are stepped through increasing concurrency levels. For each level the report shows
+throughput, per-stage latency percentiles and errors, and the level at which each stage saturates:
+
+    python -m benchmarks.load_test --sessions 1,2,4,8,16 --duration 20 --llm-latency 1.5 --error-rate 0.05
+"""
+import argparse
+from datetime import datetime, timedelta
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from benchmarks import synthetic_data
+from benchmarks.run_benchmarks import RESULTS_DIR, configure_environment, git_revision
+
+STAGES = ['checkout', 'upload', 'history', 'question', 'sql', 'rerun']
+# A stage is saturated at the first level where its p95 is this many times its p95 at the lowest level
+SATURATION_FACTOR = 2.0
+# Throughput has levelled off once adding sessions raises it by less than this fraction
+THROUGHPUT_GAIN_THRESHOLD = 0.1
+
+# Template questions are answered without the LLM; the others always reach it, since the session and
+# iteration make them unique and so bypass the completion cache
+TEMPLATE_QUESTIONS = [
+    "Which run is the latest?",
+    "Display records which has NinetyPercentile greater than {threshold} at RunID {run_id}",
+    "Get me list of API,NinetyPercentile which has NinetyPercentile > 100 and < {threshold} at RunID {run_id}",
+]
+LLM_QUESTION = "Summarize the slowest APIs of the latest run for analyst {session}, request {iteration}"
+
+
+class Recorder:
+    """
+    Collects (stage, seconds, ok) samples from all sessions.
+    """
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.errors = {stage: 0 for stage in STAGES}
+        self.error_messages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, error=None):
+        with self._lock:
+            self.samples[stage].append(seconds)
+            if error is not None:
+                self.errors[stage] += 1
+                message = f"{type(error).__name__}: {error}"[:200]
+                self.error_messages[message] = self.error_messages.get(message, 0) + 1
+
+    def timed(self, stage, fn):
+        started = time.perf_counter()
+        try:
+            value = fn()
+        except Exception as e:
+            self.record(stage, time.perf_counter() - started, e)
+            raise
+        self.record(stage, time.perf_counter() - started)
+        return value
+
+
+def make_upload_files(count, apis):
+    """
+    Aggregate reports to upload, as (file name, CSV bytes); each gets a distinct release and start time.
+    """
+    files = []
+    for index in range(count):
+        start = datetime(2024, 1, 1) + timedelta(hours=index)
+        report = synthetic_data.generate_aggregate_report(apis, seed=index)
+        buffer = synthetic_data.to_csv_buffer(report, synthetic_data.run_file_name(f"Load{index}", start, 3600))
+        files.append((buffer.name, buffer.getvalue()))
+    return files
+
+
+def run_session(session, stop_at, recorder, upload_files, upload_share, llm_share, think_secs, seed):
+    """
+    Repeat the page rerun until `stop_at`. Returns the number of reruns completed without error.
+    """
+    import baselines
+    import batch_ingest
+    import main_app
+    import sql_db
+    import sql_examples
+    import sql_intents
+    from azure_openai import stream_completion_from_messages
+    from prompts.prompts import SYSTEM_MESSAGE, DIALECT_NOTES
+
+    rng = random.Random(seed)
+    backend = sql_db.get_backend()
+    completed, iteration = 0, 0
+
+    def upload(conn):
+        name, data = upload_files[rng.randrange(len(upload_files))]
+        uploaded_file = io.BytesIO(data)
+        uploaded_file.name = name
+        parsed = batch_ingest.parse_upload(uploaded_file)
+        return batch_ingest.ingest_run(conn, parsed['release'], parsed['test_start_time'], parsed['test_end_time'],
+                                       parsed['report'], parsed['sketches'], parsed['content_hash'], name)
+
+    def history(conn):
+        runs = sql_db.cached_query(sql_db.run_history_query(limit=10), conn)
+        return sql_db.cached_query(baselines.run_verdicts_query(runs['RunId'].tolist()), conn)
+
+    def question():
+        if rng.random() >= llm_share:
+            text = rng.choice(TEMPLATE_QUESTIONS).format(threshold=rng.choice([200, 400, 800]), run_id=rng.randint(1, 5))
+            intent = sql_intents.get_intent_matcher().match(text)
+            if intent is not None:
+                return intent['sql']
+        else:
+            text = LLM_QUESTION.format(session=session, iteration=iteration)
+        system_message = SYSTEM_MESSAGE.format(
+            schema=sql_db.get_schema_prompt(), dialect=backend.dialect, dialect_notes=DIALECT_NOTES[backend.name]
+        )
+        prompt = sql_examples.build_user_message(text, backend.name)
+        response = ''.join(stream_completion_from_messages(
+            system_message, prompt, model=sql_examples.NL_TO_SQL_MODEL, max_tokens=sql_examples.NL_TO_SQL_MAX_TOKENS,
+            cache_key=text,
+        ))
+        return main_app.extract_sql(response)
+
+    def with_connection(step):
+        # Like the page, check out a pooled connection for each database step only
+        conn = recorder.timed('checkout', sql_db.get_pool().acquire)
+        try:
+            return step(conn)
+        finally:
+            sql_db.get_pool().release(conn)
+
+    while time.monotonic() < stop_at:
+        iteration += 1
+        started = time.perf_counter()
+        try:
+            if rng.random() < upload_share:
+                recorder.timed('upload', lambda: with_connection(upload))
+            recorder.timed('history', lambda: with_connection(history))
+            query = recorder.timed('question', question)
+            recorder.timed('sql', lambda: with_connection(lambda conn: sql_db.query_page(query, conn, 0)))
+        except Exception as e:
+            recorder.record('rerun', time.perf_counter() - started, e)
+        else:
+            recorder.record('rerun', time.perf_counter() - started)
+            completed += 1
+        time.sleep(think_secs * rng.uniform(0.5, 1.5))
+    return completed
+
+
+def percentiles_ms(samples):
+    if not samples:
+        return None
+    values = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {'count': len(samples), 'p50_ms': float(values[0]), 'p95_ms': float(values[1]), 'p99_ms': float(values[2]),
+            'max_ms': float(max(samples) * 1000)}
+
+
+def run_level(sessions, duration_secs, upload_files, upload_share, llm_share, think_secs):
+    """
+    Run `sessions` concurrent sessions for `duration_secs`.
+
+    Returns:
+    dict: Reruns completed, throughput, per-stage percentiles and errors, and the internal span summary.
+    """
+    import tracing
+
+    tracing.reset()
+    recorder = Recorder()
+    completed = [0] * sessions
+    started = time.monotonic()
+    stop_at = started + duration_secs
+
+    def session_thread(index):
+        completed[index] = run_session(index, stop_at, recorder, upload_files, upload_share, llm_share, think_secs, seed=index)
+
+    threads = [threading.Thread(target=session_thread, args=(index,), name=f"session-{index}") for index in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        'sessions': sessions,
+        'seconds': elapsed,
+        'reruns': sum(completed),
+        'reruns_per_sec': sum(completed) / elapsed,
+        'stages': {stage: percentiles_ms(samples) for stage, samples in recorder.samples.items() if samples},
+        'errors': {stage: count for stage, count in recorder.errors.items() if count},
+        'error_messages': recorder.error_messages,
+        'spans': tracing.stage_summary(),
+    }
+
+
+def saturation(levels):
+    """
+    Find where the instance stops scaling.
+
+    Returns:
+    dict: The first session count at which throughput stops growing, and per stage the first session
+    count at which its p95 reached SATURATION_FACTOR times its p95 at the lowest level (None if never).
+    """
+    throughput_at = None
+    for previous, current in zip(levels, levels[1:]):
+        if current['reruns_per_sec'] < previous['reruns_per_sec'] * (1 + THROUGHPUT_GAIN_THRESHOLD):
+            throughput_at = current['sessions']
+            break
+    stages = {}
+    for stage in STAGES:
+        base = levels[0]['stages'].get(stage)
+        stages[stage] = next(
+            (level['sessions'] for level in levels[1:]
+             if base and level['stages'].get(stage) and level['stages'][stage]['p95_ms'] >= SATURATION_FACTOR * base['p95_ms']),
+            None,
+        )
+    return {'throughput_levels_off_at': throughput_at, 'stage_p95_saturates_at': stages}
+
+
+def run(session_levels, duration_secs, apis, upload_share, llm_share, think_secs, stub_config):
+    """
+    Step through the concurrency levels against a fresh scratch database and stub LLM.
+
+    Returns:
+    dict: Run metadata, per-level results and the saturation points.
+    """
+    import llm_stub
+
+    work_dir = tempfile.mkdtemp(prefix='perf-load-')
+    server, base_url = llm_stub.start_stub_server(config=stub_config)
+    configure_environment(work_dir, base_url)
+    try:
+        import baselines
+        import sql_db
+
+        sql_db.setup_performance_metrics_table()
+        sql_db.setup_latency_sketches_table()
+        sql_db.setup_ingested_files_table()
+        baselines.setup_baseline_tables()
+        upload_files = make_upload_files(20, apis)
+
+        levels = []
+        for sessions in session_levels:
+            level = run_level(sessions, duration_secs, upload_files, upload_share, llm_share, think_secs)
+            levels.append(level)
+            print_level(level)
+    finally:
+        server.shutdown()
+        if 'sql_db' in sys.modules:
+            sys.modules['sql_db'].get_pool().close_all()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'duration_secs': duration_secs,
+            'apis': apis,
+            'upload_share': upload_share,
+            'llm_share': llm_share,
+            'think_secs': think_secs,
+            'pool_max_size': sys.modules['sql_db'].DB_POOL_MAX_SIZE,
+            'llm': {'latency': stub_config.latency, 'jitter': stub_config.jitter, 'error_rate': stub_config.error_rate,
+                    'error_status': stub_config.error_status, 'token_delay': stub_config.token_delay,
+                    'requests': stub_config.requests, 'errors': stub_config.errors},
+        },
+        'levels': levels,
+        'saturation': saturation(levels),
+    }
+
+
+def print_level(level):
+    errors = sum(level['errors'].values())
+    print(f"\n{level['sessions']} sessions: {level['reruns']} reruns in {level['seconds']:.1f}s, "
+          f"{level['reruns_per_sec']:.2f} reruns/sec, {errors} errors")
+    for stage, stats in level['stages'].items():
+        print(f"  {stage:<10} n={stats['count']:<6} p50 {stats['p50_ms']:9.1f} ms  p95 {stats['p95_ms']:9.1f} ms  "
+              f"p99 {stats['p99_ms']:9.1f} ms  errors {level['errors'].get(stage, 0)}")
+    for message, count in sorted(level['error_messages'].items(), key=lambda item: -item[1])[:3]:
+        print(f"  x{count} {message}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the PerfTestAnalyzer page with concurrent simulated sessions")
+    parser.add_argument('--sessions', default='1,2,4,8,16', help="comma-separated concurrency levels")
+    parser.add_argument('--duration', type=float, default=15, help="seconds per level")
+    parser.add_argument('--apis', type=int, default=50, help="APIs per uploaded results file")
+    parser.add_argument('--upload-share', type=float, default=0.1, help="fraction of reruns that upload a file")
+    parser.add_argument('--llm-share', type=float, default=0.5, help="fraction of questions that need the LLM")
+    parser.add_argument('--think-time', type=float, default=0.5, help="mean seconds between a session's reruns")
+    parser.add_argument('--pool-size', type=int, help="database pool size (default: DB_POOL_MAX_SIZE)")
+    parser.add_argument('--llm-latency', type=float, default=1.0, help="stub LLM seconds before responding")
+    parser.add_argument('--llm-jitter', type=float, default=0.5, help="extra random stub LLM latency in seconds")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="stub LLM seconds between streamed chunks")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of stub LLM requests that fail")
+    parser.add_argument('--error-status', type=int, default=429, help="HTTP status of injected failures")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/load-<timestamp>.json)")
+    args = parser.parse_args()
+
+    if args.pool_size:
+        os.environ['DB_POOL_MAX_SIZE'] = str(args.pool_size)
+
+    import llm_stub
+
+    stub_config = llm_stub.StubConfig(latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.error_rate,
+                                      error_status=args.error_status, token_delay=args.token_delay)
+    results = run([int(level) for level in args.sessions.split(',')], args.duration, args.apis,
+                  args.upload_share, args.llm_share, args.think_time, stub_config)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as results_file:
+        json.dump(results, results_file, indent=2)
+
+    def at(sessions):
+        return f"{sessions} sessions" if sessions else "not reached"
+
+    points = results['saturation']
+    print(f"\nThroughput levels off at: {at(points['throughput_levels_off_at'])}")
+    for stage, sessions in points['stage_p95_saturates_at'].items():
+        print(f"  {stage:<10} p95 x{SATURATION_FACTOR:g} at: {at(sessions)}")
+    print(f"Results written to {output}")
@@ -0,0 +1,322 @@
+# benchmarks/run_benchmarks.py
+"""
+Benchmarks for the ingest, summary and query hot paths.
+
+Everything runs locally: data comes from `benchmarks.synthetic_data`, storage is an embedded SQLite
+file and the LLM is the stub server from `llm_stub`. Results are written as JSON so runs from
+different versions can be compared:
+
+    python -m benchmarks.run_benchmarks --runs 5 --apis 50 --samples 2000
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import synthetic_data
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+# A benchmark whose median got slower by more than this factor is reported as a regression
+REGRESSION_THRESHOLD = 1.2
+
+
+def configure_environment(work_dir, llm_base_url):
+    """
+    Point the app at a scratch SQLite database, the stub LLM and env-based configuration.
+    Must run before the app modules are imported, since some read their settings at import time.
+    """
+    os.environ.update({
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': os.path.join(work_dir, 'bench.db'),
+        'APP_CONFIG_BACKEND': 'env',
+        'OPENAI_TYPE': 'open_ai',
+        'OPENAI_BASE': llm_base_url,
+        'OPENAI_API_VERSION': 'none',
+        'OPENAI_API_KEY': 'stub',
+        'COMPLETION_CACHE_PATH': os.path.join(work_dir, 'completions.db'),
+        'SQL_EXAMPLES_PATH': os.path.join(work_dir, 'sql_examples.db'),
+        'DATA_VERSION_CHECK_SECS': '0',
+    })
+
+
+def measure(fn, repeat):
+    """
+    Call `fn` `repeat` times.
+
+    Returns:
+    dict: min/median/mean/p95/max seconds per call, and the value of the last call.
+    """
+    timings, value = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = fn()
+        timings.append(time.perf_counter() - started)
+    return timing_stats(timings), value
+
+
+def timing_stats(timings):
+    ordered = sorted(timings)
+    return {
+        'calls': len(ordered),
+        'min_secs': ordered[0],
+        'median_secs': statistics.median(ordered),
+        'mean_secs': statistics.fmean(ordered),
+        'p95_secs': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        'max_secs': ordered[-1],
+    }
+
+
+def bench_ingest(runs, apis, samples_per_api):
+    """
+    Parse raw sample logs and insert each as a run: run row, metrics and latency sketches.
+    """
+    import jtl_ingest
+    import sql_db
+    import summary_engine
+
+    files = []
+    for run in range(runs):
+        start = datetime(2024, 1, 1) + timedelta(days=run)
+        samples = synthetic_data.generate_samples(apis, samples_per_api, start=start, seed=run)
+        files.append(synthetic_data.to_csv_buffer(samples, synthetic_data.run_file_name(f"Release{run + 1}", start, 3600)))
+
+    parse_timings, insert_timings = [], []
+    with sql_db.connection() as conn:
+        for uploaded_file in files:
+            started = time.perf_counter()
+            df, sketches = jtl_ingest.load_results_file(uploaded_file)
+            parse_timings.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            release, test_start_time, test_end_time = summary_engine.parse_run_file_name(uploaded_file.name)
+            run_id = sql_db.create_run(conn, release, test_start_time, test_end_time)
+            sql_db.bulk_insert(conn, 'PerformanceMetrics', sql_db.to_performance_metrics_frame(df, run_id))
+            sql_db.store_latency_sketches(conn, run_id, sketches)
+            insert_timings.append(time.perf_counter() - started)
+
+    parse = timing_stats(parse_timings)
+    insert = timing_stats(insert_timings)
+    parse['samples_per_sec'] = apis * samples_per_api / parse['median_secs']
+    insert['rows_per_sec'] = (apis + 1) / insert['median_secs']
+    return {'ingest.parse_jtl': parse, 'ingest.insert_run': insert}
+
+
+def bench_summary(apis, repeat):
+    """
+    Compute and render the test summary of an aggregate report, then serve it from the memo.
+    """
+    import summary_engine
+
+    report = synthetic_data.generate_aggregate_report(apis)
+    name = synthetic_data.run_file_name('Release1', datetime(2024, 1, 1), 3600)
+
+    def compute():
+        summary = summary_engine.compute_summary(report, name, sla_secs=2, acceptable_error_rate=1)
+        return summary_engine.render_summary_html(summary)
+
+    cold, _ = measure(compute, repeat)
+    uploaded_file = synthetic_data.to_csv_buffer(report, name)
+    summary_engine.summarize_results_file(uploaded_file, 2, 1)
+    warm, _ = measure(lambda: summary_engine.summarize_results_file(uploaded_file, 2, 1), repeat)
+    return {'summary.compute': cold, 'summary.memoized': warm}
+
+
+def bench_schema(repeat):
+    """
+    Fetch the schema prompt with and without the schema cache.
+    """
+    import sql_db
+
+    cold, _ = measure(lambda: sql_db.get_schema_representation(force=True), repeat)
+    warm, _ = measure(sql_db.get_schema_prompt, repeat)
+    return {'schema.introspect': cold, 'schema.cached': warm}
+
+
+def bench_history(repeat):
+    """
+    Run the history panel query with and without the result cache.
+    """
+    import query_cache
+    import sql_db
+
+    query = sql_db.run_history_query(limit=10)
+    with sql_db.connection() as conn:
+        def uncached():
+            query_cache.get_query_cache().invalidate()
+            return sql_db.cached_query(query, conn)
+
+        cold, _ = measure(uncached, repeat)
+        warm, _ = measure(lambda: sql_db.cached_query(query, conn), repeat)
+    return {'history.query': cold, 'history.cached': warm}
+
+
+def bench_load_runs(repeat):
+    """
+    Load every ingested run as a compact frame, and as `pd.read_sql_query` would, comparing memory per row.
+
+    Returns:
+    tuple: Timings, and the memory report of the compact frame against the read_sql_query one.
+    """
+    import pandas as pd
+
+    import compact_frames
+    import sql_db
+
+    query = "SELECT m.*, r.TestName FROM PerformanceMetrics m JOIN Runs r ON r.RunId = m.RunId ORDER BY m.RunId, m.API"
+    with sql_db.connection() as conn:
+        compact, df = measure(lambda: sql_db.load_runs(conn), repeat)
+        untyped, baseline = measure(lambda: pd.read_sql_query(query, conn), repeat)
+    report = compact_frames.memory_report(df, baseline=baseline)
+    del report['columns']
+    return {'load_runs.compact': compact, 'load_runs.read_sql_query': untyped}, {'performance_metrics': report}
+
+
+def bench_nl_to_sql(repeat):
+    """
+    Question -> streamed completion from the stub LLM -> guarded, paged SQL execution.
+    """
+    import azure_openai
+    import sql_db
+    import sql_examples
+    import sql_intents
+    from prompts.prompts import SYSTEM_MESSAGE, DIALECT_NOTES
+
+    backend = sql_db.get_backend()
+    system_message = SYSTEM_MESSAGE.format(
+        schema=sql_db.get_schema_prompt(), dialect=backend.dialect, dialect_notes=DIALECT_NOTES[backend.name]
+    )
+
+    with sql_db.connection() as conn:
+        def round_trip(use_cache):
+            prompt = sql_examples.build_user_message("Which run is the latest?", backend.name)
+            response = ''.join(azure_openai.stream_completion_from_messages(
+                system_message, prompt, model=sql_examples.NL_TO_SQL_MODEL,
+                max_tokens=sql_examples.NL_TO_SQL_MAX_TOKENS, use_cache=use_cache, cache_key="Which run is the latest?"))
+            query = response.split('```')[1].strip() if '```' in response else response
+            return sql_db.query_page(query, conn, 0)
+
+        cold, _ = measure(lambda: round_trip(use_cache=False), repeat)
+        round_trip(use_cache=True)
+        warm, _ = measure(lambda: round_trip(use_cache=True), repeat)
+        retrieve, _ = measure(lambda: sql_examples.get_example_store().retrieve("Which run is the latest?", backend.name), repeat)
+        fast_path, _ = measure(lambda: sql_db.query_page(
+            sql_intents.get_intent_matcher().match("Which run is the latest?")['sql'], conn, 0), repeat)
+    return {'nl_to_sql.round_trip': cold, 'nl_to_sql.cached': warm, 'nl_to_sql.retrieve_examples': retrieve,
+            'nl_to_sql.fast_path': fast_path}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare median timings with an earlier results file.
+
+    Returns:
+    list: (benchmark, baseline median, current median, ratio, regressed) for benchmarks in both files.
+    """
+    rows = []
+    for name, current in results['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if previous is None:
+            continue
+        ratio = current['median_secs'] / previous['median_secs'] if previous['median_secs'] else float('inf')
+        rows.append((name, previous['median_secs'], current['median_secs'], ratio, ratio > threshold))
+    return rows
+
+
+def run(runs, apis, samples_per_api, repeat, llm_latency):
+    """
+    Run every benchmark against a fresh scratch database and stub LLM.
+
+    Returns:
+    dict: Run metadata and per-benchmark timings.
+    """
+    import llm_stub
+
+    work_dir = tempfile.mkdtemp(prefix='perf-bench-')
+    server, base_url = llm_stub.start_stub_server(config=llm_stub.StubConfig(latency=llm_latency))
+    configure_environment(work_dir, base_url)
+    try:
+        import sql_db
+
+        sql_db.setup_performance_metrics_table()
+        sql_db.setup_latency_sketches_table()
+
+        benchmarks = {}
+        benchmarks.update(bench_ingest(runs, apis, samples_per_api))
+        benchmarks.update(bench_summary(apis, repeat))
+        benchmarks.update(bench_schema(repeat))
+        benchmarks.update(bench_history(repeat))
+        benchmarks.update(bench_nl_to_sql(repeat))
+        load_timings, memory = bench_load_runs(repeat)
+        benchmarks.update(load_timings)
+    finally:
+        server.shutdown()
+        if 'sql_db' in sys.modules:
+            sys.modules['sql_db'].get_pool().close_all()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': {'runs': runs, 'apis': apis, 'samples_per_api': samples_per_api, 'repeat': repeat},
+            'llm_latency_secs': llm_latency,
+        },
+        'benchmarks': benchmarks,
+        'memory': memory,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ingest, summary and query hot paths")
+    parser.add_argument('--runs', type=int, default=3, help="runs to ingest")
+    parser.add_argument('--apis', type=int, default=50, help="APIs per run")
+    parser.add_argument('--samples', type=int, default=2000, help="samples per API and run")
+    parser.add_argument('--repeat', type=int, default=20, help="calls per timed benchmark")
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="stub LLM response latency in seconds")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare medians with")
+    args = parser.parse_args()
+
+    results = run(args.runs, args.apis, args.samples, args.repeat, args.llm_latency)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as results_file:
+        json.dump(results, results_file, indent=2)
+
+    for name, stats in results['benchmarks'].items():
+        throughput = ''.join(f"  {key}={value:,.0f}" for key, value in stats.items() if key.endswith('_per_sec'))
+        print(f"{name:<24} median {stats['median_secs'] * 1000:9.3f} ms  p95 {stats['p95_secs'] * 1000:9.3f} ms{throughput}")
+    for name, report in results['memory'].items():
+        print(f"{name:<24} {report['bytes_per_row']:.0f} bytes/row compact vs {report['baseline_bytes_per_row']:.0f} "
+              f"read_sql_query (x{report['reduction']:.1f} smaller, {report['rows']} rows)")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('meta', {}).get('scale') != results['meta']['scale']:
+            print(f"Note: {args.compare} was run at a different scale: {baseline.get('meta', {}).get('scale')}")
+        rows = compare(results, baseline)
+        for name, previous, current, ratio, regressed in rows:
+            print(f"{name:<24} {previous * 1000:9.3f} ms -> {current * 1000:9.3f} ms  x{ratio:.2f}{'  REGRESSION' if regressed else ''}")
+        if any(row[4] for row in rows):
+            sys.exit(1)
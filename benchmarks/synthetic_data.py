@@ -0,0 +1,166 @@
+# benchmarks/synthetic_data.py
+"""
+Synthetic JMeter results for benchmarks and local testing.
+
+Produces raw sample logs (JTL in CSV format) and aggregate report CSVs at a configurable scale of
+runs x APIs x samples, named like real uploads (`<Release>_<start>_<end>.csv`). Output is
+deterministic for a given seed.
+
+    python -m benchmarks.synthetic_data --out synthetic --runs 5 --apis 50 --samples 2000
+"""
+import argparse
+from datetime import datetime, timedelta
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+import jtl_ingest
+
+RUN_FILE_TIME_FORMAT = '%d-%m-%Y-%H-%M-%S'
+
+
+def api_names(apis):
+    """
+    Returns `apis` distinct API labels, e.g. ['API0000', 'API0001', ...].
+    """
+    return [f"API{i:04d}" for i in range(apis)]
+
+
+def run_file_name(release, start, duration_secs, suffix='.csv'):
+    """
+    Build an upload file name, `<Release>_<start>_<end>.csv`.
+    """
+    end = start + timedelta(seconds=duration_secs)
+    return f"{release}_{start.strftime(RUN_FILE_TIME_FORMAT)}_{end.strftime(RUN_FILE_TIME_FORMAT)}{suffix}"
+
+
+def generate_samples(apis, samples_per_api, start=None, duration_secs=3600, error_rate=0.01, seed=0):
+    """
+    Generate a raw JMeter sample log with log-normally distributed latencies.
+
+    Each API gets its own median latency, so per-API percentiles differ like they do in real runs.
+
+    Parameters:
+    apis (int): Number of distinct labels.
+    samples_per_api (int): Samples per label.
+    start (datetime, optional): Test start time. Defaults to 2024-01-01 00:00.
+    duration_secs (int, optional): Test duration the timestamps are spread over. Defaults to 3600.
+    error_rate (float, optional): Fraction of failed samples. Defaults to 0.01.
+    seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+    pandas.DataFrame: Samples with jtl_ingest.RAW_SAMPLE_COLUMNS, in timestamp order.
+    """
+    rng = np.random.default_rng(seed)
+    start = start or datetime(2024, 1, 1)
+    count = apis * samples_per_api
+    labels = np.repeat(np.array(api_names(apis)), samples_per_api)
+    medians = np.repeat(rng.uniform(50, 1500, apis), samples_per_api)
+    samples = pd.DataFrame({
+        'timeStamp': int(start.timestamp() * 1000) + rng.integers(0, duration_secs * 1000, count),
+        'elapsed': np.maximum(1, rng.lognormal(np.log(medians), 0.5)).astype('int64'),
+        'label': labels,
+        'success': np.where(rng.random(count) < error_rate, 'false', 'true'),
+        'bytes': rng.integers(200, 20000, count),
+    })
+    return samples.sort_values('timeStamp', kind='stable').reset_index(drop=True)[jtl_ingest.RAW_SAMPLE_COLUMNS]
+
+
+def generate_aggregate_report(apis, samples_per_api=1000, seed=0):
+    """
+    Generate a JMeter aggregate report directly, without materializing samples.
+
+    Returns:
+    pandas.DataFrame: One row per API plus a 'TOTAL' row, with jtl_ingest.AGGREGATE_REPORT_COLUMNS.
+    """
+    rng = np.random.default_rng(seed)
+    median = rng.uniform(50, 1500, apis).round()
+    report = pd.DataFrame({
+        'Label': api_names(apis),
+        '# Samples': rng.integers(samples_per_api // 2, samples_per_api * 2, apis),
+        'Average': (median * 1.1).round(2),
+        'Median': median,
+        '90% Line': (median * 1.9).round(),
+        '95% Line': (median * 2.3).round(),
+        '99% Line': (median * 3.2).round(),
+        'Min': (median * 0.2).round(),
+        'Max': (median * 6).round(),
+        'Error %': rng.uniform(0, 3, apis),
+        'Throughput': rng.uniform(0.5, 50, apis).round(5),
+        'Received KB/sec': rng.uniform(1, 500, apis).round(2),
+        'Std. Dev.': (median * 0.6).round(2),
+    })
+    samples = report['# Samples']
+    total = {
+        'Label': 'TOTAL',
+        '# Samples': int(samples.sum()),
+        'Average': round(float((report['Average'] * samples).sum() / samples.sum()), 2),
+        'Median': float(report['Median'].median()),
+        '90% Line': float(report['90% Line'].quantile(0.9)),
+        '95% Line': float(report['95% Line'].quantile(0.95)),
+        '99% Line': float(report['99% Line'].quantile(0.99)),
+        'Min': float(report['Min'].min()),
+        'Max': float(report['Max'].max()),
+        'Error %': float((report['Error %'] * samples).sum() / samples.sum()),
+        'Throughput': round(float(report['Throughput'].sum()), 5),
+        'Received KB/sec': round(float(report['Received KB/sec'].sum()), 2),
+        'Std. Dev.': float(report['Std. Dev.'].mean()),
+    }
+    report = pd.concat([report, pd.DataFrame([total])], ignore_index=True)
+    report['Error %'] = report['Error %'].map('{:.2f}%'.format)
+    return report[jtl_ingest.AGGREGATE_REPORT_COLUMNS]
+
+
+def to_csv_buffer(df, name):
+    """
+    Write a frame to an in-memory CSV that looks like a Streamlit upload (bytes, with a `name`).
+    """
+    buffer = io.BytesIO(df.to_csv(index=False).encode('utf-8'))
+    buffer.name = name
+    return buffer
+
+
+def write_dataset(out_dir, runs, apis, samples_per_api, raw=True, seed=0):
+    """
+    Write one results file per run to `out_dir`.
+
+    Parameters:
+    out_dir (str): Output directory, created if missing.
+    runs (int): Number of runs (files).
+    apis (int): Labels per run.
+    samples_per_api (int): Samples per label and run.
+    raw (bool, optional): Write raw sample logs rather than aggregate reports. Defaults to True.
+    seed (int, optional): Random seed of the first run. Defaults to 0.
+
+    Returns:
+    list: The written file paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for run in range(runs):
+        start = datetime(2024, 1, 1) + timedelta(days=run)
+        name = run_file_name(f"Release{run + 1}", start, 3600)
+        if raw:
+            df = generate_samples(apis, samples_per_api, start=start, seed=seed + run)
+        else:
+            df = generate_aggregate_report(apis, samples_per_api, seed=seed + run)
+        path = os.path.join(out_dir, name)
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic JMeter results files")
+    parser.add_argument('--out', default='synthetic', help="output directory")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--apis', type=int, default=20)
+    parser.add_argument('--samples', type=int, default=1000, help="samples per API and run")
+    parser.add_argument('--aggregate', action='store_true', help="write aggregate reports instead of raw sample logs")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for written in write_dataset(args.out, args.runs, args.apis, args.samples, raw=not args.aggregate, seed=args.seed):
+        print(written)
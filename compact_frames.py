@@ -0,0 +1,218 @@
+# compact_frames.py
+"""
+Compact in-memory representation of loaded runs.
+
+PerformanceMetrics and Runs columns are mapped to small dtypes: API and test names become
+categoricals over process-wide shared dictionaries (so frames of different runs concatenate
+without falling back to strings), latencies and rates become float32, counts are downcast to the
+smallest integer type that holds them and the '1.23%' error strings become numbers.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Column -> compact kind
+CATEGORY, FLOAT, INTEGER, PERCENT, DATETIME = 'category', 'float32', 'integer', 'percent', 'datetime'
+COMPACT_COLUMN_KINDS = {
+    'RunId': INTEGER,
+    'API': CATEGORY,
+    'TestName': CATEGORY,
+    'Samples': INTEGER,
+    'Average': FLOAT,
+    'Median': FLOAT,
+    'NinetyPercentile': FLOAT,
+    'NinetyFivePercentile': FLOAT,
+    'NinetyNinePercentile': FLOAT,
+    'Minimum': FLOAT,
+    'Maximum': FLOAT,
+    'ErrorPercentage': PERCENT,
+    'Throughput': FLOAT,
+    'ReceivedKBPersecond': FLOAT,
+    'StandardDeviation': FLOAT,
+    'TestStartTime': DATETIME,
+    'TestEndTime': DATETIME,
+    'IngestedAt': DATETIME,
+}
+
+
+class SharedCategories:
+    """
+    Append-only dictionary of category values shared by every frame loaded in the process.
+
+    Codes never change once assigned, so an older frame's categories are always a prefix of the
+    current ones and `align` only has to extend them, without touching the codes.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._dtype = pd.CategoricalDtype([])
+        self._lock = threading.Lock()
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    def encode(self, values):
+        """
+        Encode values as a categorical over the shared dictionary; missing values stay missing.
+        """
+        # Factorize locally, then translate the (few) distinct values to shared codes
+        local_codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        with self._lock:
+            for value in uniques:
+                if value not in self._codes:
+                    self._codes[value] = len(self._codes)
+            if len(self._codes) != len(self._dtype.categories):
+                self._dtype = pd.CategoricalDtype(list(self._codes))
+            dtype = self._dtype
+            shared_codes = np.array([self._codes[value] for value in uniques] + [-1], dtype='int32')
+        # factorize marks missing values with -1, which indexes the trailing -1. The codes are valid
+        # by construction, so pandas does not need to check them again
+        return pd.Categorical.from_codes(shared_codes[local_codes], dtype=dtype, validate=False)
+
+    def align(self, series):
+        """
+        Extend a categorical encoded earlier to the current dictionary.
+        """
+        if len(series.cat.categories) == len(self._dtype.categories):
+            return series
+        return series.cat.set_categories(self._dtype.categories)
+
+
+_dictionaries = {'API': SharedCategories(), 'TestName': SharedCategories()}
+
+
+def _compact_column(name, values):
+    kind = COMPACT_COLUMN_KINDS[name]
+    if kind == CATEGORY:
+        dictionary = _dictionaries.get(name)
+        if dictionary is None:
+            dictionary = _dictionaries.setdefault(name, SharedCategories())
+        return dictionary.encode(values)
+    if kind == PERCENT:
+        try:
+            return np.array([value.rstrip('%') if isinstance(value, str) else value for value in values], dtype='float32')
+        except (TypeError, ValueError):
+            return pd.to_numeric(pd.Series(values, copy=False).astype(str).str.rstrip('%'), errors='coerce').to_numpy(dtype='float32')
+    if kind == DATETIME:
+        return pd.to_datetime(pd.Series(values, copy=False), errors='coerce')
+    if kind == FLOAT:
+        try:
+            return np.asarray(values, dtype='float32')
+        except (TypeError, ValueError):
+            return pd.to_numeric(pd.Series(values, copy=False), errors='coerce').to_numpy(dtype='float32')
+    numbers = np.asarray(values)
+    if numbers.dtype.kind in 'iu':
+        # Smallest integer type holding the column, without pandas' downcast round trip
+        for dtype in ('int8', 'int16', 'int32'):
+            limits = np.iinfo(dtype)
+            if not len(numbers) or (numbers.min() >= limits.min and numbers.max() <= limits.max):
+                return numbers.astype(dtype)
+        return numbers
+    numbers = pd.to_numeric(pd.Series(values, copy=False), errors='coerce')
+    if numbers.isna().any():
+        # NULLs in an integer column: keep them as NaN in a float column
+        return numbers.to_numpy(dtype='float32')
+    return pd.to_numeric(numbers, downcast='integer').to_numpy()
+
+
+def compact_frame(df):
+    """
+    Convert the known PerformanceMetrics/Runs columns of a frame to their compact dtypes.
+    Other columns, e.g. aggregates computed by a generated query, are left as they are.
+
+    Parameters:
+    df (pandas.DataFrame): A query result.
+
+    Returns:
+    pandas.DataFrame: A new frame with compact columns.
+    """
+    return pd.DataFrame({
+        column: _compact_column(column, df[column]) if column in COMPACT_COLUMN_KINDS else df[column]
+        for column in df.columns
+    }, index=df.index)
+
+
+def _is_compact_column(name, series):
+    kind = COMPACT_COLUMN_KINDS[name]
+    if kind == CATEGORY:
+        return isinstance(series.dtype, pd.CategoricalDtype)
+    if kind == DATETIME:
+        return series.dtype.kind == 'M'
+    if kind == INTEGER:
+        # Integer columns with NULLs are kept as float32
+        return series.dtype.kind in 'iu' or series.dtype == np.float32
+    return series.dtype == np.float32
+
+
+def is_compact(df):
+    """
+    Tell whether every known PerformanceMetrics/Runs column of a frame already has its compact dtype,
+    e.g. because it was built by `frame_from_cursor` or `compact_frame`.
+    """
+    return all(_is_compact_column(column, df[column]) for column in df.columns if column in COMPACT_COLUMN_KINDS)
+
+
+def frame_from_cursor(cursor):
+    """
+    Build a compact frame from an executed cursor.
+
+    Cursors with a columnar (Arrow) fetch, like turbodbc's `fetchallarrow`, are converted without
+    copying numeric columns. Otherwise the rows are transposed once and each column is built
+    directly in its compact dtype, skipping the intermediate object-dtype frame that
+    `pd.read_sql_query` creates.
+
+    Returns:
+    pandas.DataFrame: The compact result.
+    """
+    columns = [column[0] for column in cursor.description]
+    if hasattr(cursor, 'fetchallarrow'):
+        return compact_frame(cursor.fetchallarrow().to_pandas())
+    rows = cursor.fetchall()
+    if not rows:
+        return pd.DataFrame(columns=columns)
+    data = {}
+    for name, values in zip(columns, zip(*rows)):
+        data[name] = _compact_column(name, values) if name in COMPACT_COLUMN_KINDS else list(values)
+    return pd.DataFrame(data)
+
+
+def concat_runs(frames):
+    """
+    Concatenate compact frames of several runs, keeping the shared categoricals categorical.
+    """
+    frames = [frame.copy(deep=False) for frame in frames]
+    for frame in frames:
+        for column, dictionary in _dictionaries.items():
+            if column in frame.columns and isinstance(frame[column].dtype, pd.CategoricalDtype):
+                frame[column] = dictionary.align(frame[column])
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_report(df, baseline=None):
+    """
+    Measure the memory a frame holds per row.
+
+    Parameters:
+    df (pandas.DataFrame): The frame to measure.
+    baseline (pandas.DataFrame, optional): The same data in another representation, e.g. as read
+    by `pd.read_sql_query`, to compare with.
+
+    Returns:
+    dict: Row count, total and per-row bytes, bytes per column and, with a baseline, the baseline's
+    per-row bytes and the reduction factor.
+    """
+    by_column = df.memory_usage(deep=True, index=False)
+    total = int(by_column.sum())
+    report = {
+        'rows': len(df),
+        'bytes': total,
+        'bytes_per_row': total / len(df) if len(df) else 0.0,
+        'columns': {column: int(size) for column, size in by_column.items()},
+    }
+    if baseline is not None:
+        baseline_total = int(baseline.memory_usage(deep=True, index=False).sum())
+        report['baseline_bytes_per_row'] = baseline_total / len(baseline) if len(baseline) else 0.0
+        report['reduction'] = baseline_total / total if total else 0.0
+    return report
@@ -0,0 +1,297 @@
+# db_backends.py
+from datetime import datetime
+import os
+import re
+import sqlite3
+
+
+def _top_level_keywords(statement, keywords):
+    """
+    Find `keywords` outside parentheses, string literals and quoted identifiers.
+
+    Returns:
+    list: (position, upper-cased keyword) pairs in statement order.
+    """
+    found, depth, i = [], 0, 0
+    pattern = re.compile(r'\b(' + '|'.join(keywords) + r')\b', re.IGNORECASE)
+    while i < len(statement):
+        char = statement[i]
+        if char in "'\"[":
+            i = statement.find({'[': ']'}.get(char, char), i + 1)
+            if i < 0:
+                break
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0 and (i == 0 or not (statement[i - 1].isalnum() or statement[i - 1] == '_')):
+            match = pattern.match(statement, i)
+            if match:
+                found.append((i, re.sub(r'\s+', ' ', match.group(1)).upper()))
+                i = match.end()
+                continue
+        i += 1
+    return found
+
+
+class SqlServerBackend:
+    """
+    Microsoft SQL Server through pyodbc. Credentials come from App Configuration.
+    """
+
+    name = 'sqlserver'
+    dialect = 'SQL Server (T-SQL)'
+    types = {
+        'identity': 'INT IDENTITY(1,1) PRIMARY KEY',
+        'blob': 'VARBINARY(MAX)',
+        'datetime': 'DATETIME',
+        'text': 'VARCHAR(MAX)',
+    }
+
+    def __init__(self, connection_url=None):
+        self._connection_url = connection_url
+
+    def connection_url(self):
+        if self._connection_url is None:
+            import appConfig
+
+            DATABASE_NAME = appConfig.fetchKey('DATABASE_NAME')
+            server = appConfig.fetchKey('SQL_SERVER')
+            username = appConfig.fetchKey('SQL_USERNAME')
+            password = appConfig.fetchKey('SQL_PASSWORD')
+            dbConnectionString = os.getenv('DB_CONNECTION_STRING')
+            self._connection_url = dbConnectionString.format(DATABASE_NAME=DATABASE_NAME, server=server, username=username, password=password)
+        return self._connection_url
+
+    def connect(self):
+        import pyodbc
+
+        return pyodbc.connect(self.connection_url())
+
+    def prepare_bulk_cursor(self, cursor):
+        cursor.fast_executemany = True
+
+    def is_unique_violation(self, error):
+        import pyodbc
+
+        return isinstance(error, pyodbc.IntegrityError)
+
+    def begin(self, conn):
+        # pyodbc connections run with autocommit off, so a transaction is always open
+        pass
+
+    def begin_write(self, conn):
+        # Writers serialize on the rows they read with `lock_for_update` instead
+        pass
+
+    def lock_for_update(self, table_name):
+        """
+        Table reference whose reads lock the rows (and, for missing keys, the key range) until commit,
+        so a read-modify-write in one transaction cannot interleave with another one.
+        """
+        return f"{table_name} WITH (UPDLOCK, HOLDLOCK)"
+
+    def create_index(self, cursor, name, table_name, keys, include=()):
+        """
+        Create an index; `include` columns are stored in the leaf level only, making it covering.
+        """
+        sql = f"CREATE INDEX {name} ON {table_name} ({', '.join(keys)})"
+        if include:
+            sql += f" INCLUDE ({', '.join(include)})"
+        cursor.execute(sql)
+
+    def rename_table(self, cursor, old_name, new_name):
+        cursor.execute("EXEC sp_rename ?, ?", (old_name, new_name))
+
+    def set_identity_insert(self, cursor, table_name, enabled):
+        cursor.execute(f"SET IDENTITY_INSERT {table_name} {'ON' if enabled else 'OFF'}")
+
+    def top(self, n, columns, rest, distinct=False):
+        """
+        Build `SELECT [DISTINCT] TOP n <columns> <rest>`.
+        """
+        return f"SELECT {'DISTINCT ' if distinct else ''}TOP {int(n)} {columns} {rest}"
+
+    def cap_rows(self, statement, n):
+        """
+        Add `TOP (n)` to a SELECT that has no TOP of its own; CTEs are left to the fetch-side cap.
+        """
+        match = re.match(r'SELECT\s+(DISTINCT\s+)?', statement, re.IGNORECASE)
+        if match is None or re.match(r'TOP\b', statement[match.end():], re.IGNORECASE):
+            return statement
+        return f"{statement[:match.end()]}TOP ({int(n)}) {statement[match.end():]}"
+
+    def paginate(self, statement, offset, limit):
+        """
+        Return rows `offset` to `offset + limit` of a SELECT with OFFSET/FETCH.
+
+        OFFSET/FETCH needs an ORDER BY, so the statement's own ORDER BY is reused; without one the
+        order is left to the server (or the first column, for UNION/INTERSECT/EXCEPT). A statement
+        that already uses TOP or OFFSET is paged as a derived table.
+        """
+        clauses = _top_level_keywords(statement, ['ORDER\\s+BY', 'OFFSET', 'UNION', 'INTERSECT', 'EXCEPT'])
+        keywords = {keyword for _, keyword in clauses}
+        paging = f"OFFSET {int(offset)} ROWS FETCH NEXT {int(limit)} ROWS ONLY"
+        already_limited = 'OFFSET' in keywords or re.match(r'SELECT\s+(DISTINCT\s+)?TOP\b', statement, re.IGNORECASE)
+        if already_limited and not re.match(r'WITH\b', statement, re.IGNORECASE):
+            return f"SELECT * FROM ({statement}) AS page_source ORDER BY (SELECT NULL) {paging}"
+        if 'ORDER BY' in keywords:
+            return f"{statement} {paging}"
+        order_by = 'ORDER BY 1' if keywords & {'UNION', 'INTERSECT', 'EXCEPT'} else 'ORDER BY (SELECT NULL)'
+        return f"{statement} {order_by} {paging}"
+
+    def count_rows(self, statement):
+        """
+        Build a COUNT(*) over a SELECT, or return None for a CTE, which T-SQL cannot nest in a derived table.
+        """
+        if re.match(r'WITH\b', statement, re.IGNORECASE):
+            return None
+        clauses = dict((keyword, position) for position, keyword in _top_level_keywords(statement, ['ORDER\\s+BY', 'OFFSET']))
+        if 'ORDER BY' in clauses and 'OFFSET' not in clauses and not re.match(r'SELECT\s+(DISTINCT\s+)?TOP\b', statement, re.IGNORECASE):
+            # A derived table may not have an ORDER BY of its own, and the order does not change the count
+            statement = statement[:clauses['ORDER BY']].rstrip()
+        return f"SELECT COUNT(*) FROM ({statement}) AS counted"
+
+    def insert_returning_id(self, cursor, table_name, id_column, columns, values):
+        placeholders = ', '.join('?' * len(columns))
+        cursor.execute(
+            f"INSERT INTO {table_name} ({', '.join(columns)}) OUTPUT INSERTED.{id_column} VALUES ({placeholders})",
+            list(values),
+        )
+        return int(cursor.fetchone()[0])
+
+    def schema_version(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*), MAX(modify_date) FROM sys.tables")
+        return str(tuple(cursor.fetchone()))
+
+    def introspect_schema(self, conn, tables):
+        cursor = conn.cursor()
+        placeholders = ', '.join('?' * len(tables))
+        cursor.execute(
+            "SELECT table_name, column_name, data_type FROM information_schema.columns "
+            f"WHERE table_name IN ({placeholders}) ORDER BY table_name, ordinal_position",
+            list(tables),
+        )
+        return cursor.fetchall()
+
+
+class SqliteBackend:
+    """
+    Embedded SQLite database file, for local and CI use with no network round trips.
+    """
+
+    name = 'sqlite'
+    dialect = 'SQLite'
+    types = {
+        'identity': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'blob': 'BLOB',
+        'datetime': 'DATETIME',
+        'text': 'TEXT',
+    }
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('SQLITE_PATH', 'perf_analyzer.db')
+
+    def connect(self):
+        # Pooled connections are handed between threads, but only used by one thread at a time
+        if self.path == ':memory:':
+            # A named shared-cache database, so every pooled connection sees the same in-memory data
+            conn = sqlite3.connect(f"file:perf_analyzer_{id(self)}?mode=memory&cache=shared",
+                                   uri=True, check_same_thread=False, timeout=30)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def prepare_bulk_cursor(self, cursor):
+        pass
+
+    def is_unique_violation(self, error):
+        return isinstance(error, sqlite3.IntegrityError)
+
+    def begin(self, conn):
+        # Open the transaction explicitly so DDL is part of it too
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+
+    def begin_write(self, conn):
+        # Take the database write lock up front, so reads in the transaction cannot go stale before
+        # its writes; concurrent writers, in this process or another, wait for the busy timeout
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+
+    def lock_for_update(self, table_name):
+        # BEGIN IMMEDIATE already holds the write lock
+        return table_name
+
+    def create_index(self, cursor, name, table_name, keys, include=()):
+        """
+        Create an index; SQLite has no INCLUDE, so covering columns are appended to the key.
+        """
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table_name} ({', '.join(list(keys) + list(include))})")
+
+    def rename_table(self, cursor, old_name, new_name):
+        cursor.execute(f"ALTER TABLE {old_name} RENAME TO {new_name}")
+
+    def set_identity_insert(self, cursor, table_name, enabled):
+        # SQLite accepts explicit values for an INTEGER PRIMARY KEY
+        pass
+
+    def top(self, n, columns, rest, distinct=False):
+        """
+        Build `SELECT [DISTINCT] <columns> <rest> LIMIT n`.
+        """
+        return f"SELECT {'DISTINCT ' if distinct else ''}{columns} {rest} LIMIT {int(n)}"
+
+    def cap_rows(self, statement, n):
+        """
+        Append `LIMIT n` to a statement that does not already end with a LIMIT clause.
+        """
+        if re.search(r'\bLIMIT\s+\d+(\s*(,|OFFSET)\s*\d+)?\s*$', statement, re.IGNORECASE):
+            return statement
+        return f"{statement} LIMIT {int(n)}"
+
+    def paginate(self, statement, offset, limit):
+        """
+        Return rows `offset` to `offset + limit` of a SELECT; SQLite keeps a subquery's ORDER BY.
+        """
+        return f"SELECT * FROM ({statement}) LIMIT {int(limit)} OFFSET {int(offset)}"
+
+    def count_rows(self, statement):
+        return f"SELECT COUNT(*) FROM ({statement})"
+
+    def insert_returning_id(self, cursor, table_name, id_column, columns, values):
+        placeholders = ', '.join('?' * len(columns))
+        cursor.execute(f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})", list(values))
+        return int(cursor.lastrowid)
+
+    def schema_version(self, conn):
+        return str(conn.execute("PRAGMA schema_version").fetchone()[0])
+
+    def introspect_schema(self, conn, tables):
+        placeholders = ', '.join('?' * len(tables))
+        rows = conn.execute(
+            "SELECT m.name, p.name, lower(p.type) FROM sqlite_master m JOIN pragma_table_info(m.name) p "
+            f"WHERE m.type IN ('table', 'view') AND m.name IN ({placeholders}) ORDER BY m.name, p.cid",
+            list(tables),
+        ).fetchall()
+        # Report bare type names like information_schema does, e.g. 'decimal' rather than 'decimal(10, 2)'
+        return [(table_name, column_name, column_type.split('(')[0].strip()) for table_name, column_name, column_type in rows]
+
+
+# Store datetimes as ISO text (the implicit adapter is deprecated since Python 3.12)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' '))
+
+BACKENDS = {
+    'sqlserver': SqlServerBackend,
+    'sqlite': SqliteBackend,
+}
+
+
+def create_backend(name=None):
+    """
+    Create the storage backend named by `name` or the DB_BACKEND environment variable (sqlserver or sqlite).
+    """
+    return BACKENDS[(name or os.getenv('DB_BACKEND', 'sqlserver')).lower()]()
@@ -0,0 +1,237 @@
+# jtl_ingest.py
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from latency_sketch import LatencySketch
+
+# Columns read from a raw JMeter sample log (JTL in CSV format)
+RAW_SAMPLE_COLUMNS = ['timeStamp', 'elapsed', 'label', 'success', 'bytes']
+
+# Rows read per chunk; memory use is bounded by this and by the number of distinct (label, elapsed) pairs
+JTL_CHUNK_SIZE = int(os.getenv('JTL_CHUNK_SIZE', '500000'))
+
+# Column layout of the JMeter aggregate report produced from a raw log
+AGGREGATE_REPORT_COLUMNS = [
+    'Label', '# Samples', 'Average', 'Median', '90% Line', '95% Line', '99% Line',
+    'Min', 'Max', 'Error %', 'Throughput', 'Received KB/sec', 'Std. Dev.',
+]
+
+PERCENTILES = {'Median': 0.5, '90% Line': 0.9, '95% Line': 0.95, '99% Line': 0.99}
+
+
+def is_raw_sample_log(columns):
+    """
+    Check whether a CSV header belongs to a raw JMeter sample log rather than an aggregate report.
+
+    Parameters:
+    columns (iterable): The column names of the file.
+
+    Returns:
+    bool: True if the file holds one row per sample.
+    """
+    return {'timeStamp', 'elapsed', 'label'} <= set(columns)
+
+
+class JtlAggregator:
+    """
+    Incrementally aggregates raw JMeter samples into per-label summary statistics.
+
+    Each chunk is reduced with vectorized groupby operations into additive counters
+    (count, sum, sum of squares, min, max, errors, bytes, time window) and a histogram of
+    elapsed times per label, which are merged into the running state. Percentiles are
+    computed exactly from the merged histogram when `result` is called.
+    """
+
+    def __init__(self):
+        self.stats = None
+        self.histogram = None
+
+    def add_chunk(self, chunk):
+        """
+        Merge one chunk of raw samples into the running aggregates.
+
+        Parameters:
+        chunk (pandas.DataFrame): Rows with at least 'timeStamp', 'elapsed' and 'label' columns.
+        """
+        if chunk.empty:
+            return
+        elapsed = pd.to_numeric(chunk['elapsed'], errors='coerce').fillna(0).astype('int64')
+        timestamp = chunk['timeStamp']
+        if not pd.api.types.is_numeric_dtype(timestamp):
+            timestamp = pd.to_datetime(timestamp).astype('int64') // 10**6
+        if 'success' in chunk:
+            failed = chunk['success'].astype(str).str.lower() != 'true'
+        else:
+            failed = pd.Series(False, index=chunk.index)
+        received = pd.to_numeric(chunk['bytes'], errors='coerce').fillna(0) if 'bytes' in chunk else 0
+
+        frame = pd.DataFrame({
+            'label': chunk['label'].astype(str),
+            'elapsed': elapsed,
+            'elapsed_sq': elapsed.astype('float64') ** 2,
+            'failed': failed.astype('int64'),
+            'bytes': received,
+            'start': timestamp.astype('int64'),
+            'end': timestamp.astype('int64') + elapsed,
+        })
+        grouped = frame.groupby('label', sort=False)
+        chunk_stats = grouped.agg(
+            count=('elapsed', 'size'),
+            total=('elapsed', 'sum'),
+            total_sq=('elapsed_sq', 'sum'),
+            minimum=('elapsed', 'min'),
+            maximum=('elapsed', 'max'),
+            errors=('failed', 'sum'),
+            bytes=('bytes', 'sum'),
+            start=('start', 'min'),
+            end=('end', 'max'),
+        )
+        chunk_histogram = frame.groupby(['label', 'elapsed'], sort=False).size()
+
+        if self.stats is None:
+            self.stats = chunk_stats
+            self.histogram = chunk_histogram
+            return
+        combined = pd.concat([self.stats, chunk_stats]).groupby(level=0, sort=False)
+        self.stats = combined.agg({
+            'count': 'sum', 'total': 'sum', 'total_sq': 'sum', 'minimum': 'min', 'maximum': 'max',
+            'errors': 'sum', 'bytes': 'sum', 'start': 'min', 'end': 'max',
+        })
+        self.histogram = self.histogram.add(chunk_histogram, fill_value=0).astype('int64')
+
+    def latency_histogram(self):
+        """
+        Returns:
+        pandas.Series: Sample counts indexed by (label, elapsed ms).
+        """
+        return self.histogram
+
+    def latency_sketches(self):
+        """
+        Build one mergeable latency sketch per label from the merged histogram.
+
+        The 'TOTAL' row is not included; merge the per-label sketches to get it.
+
+        Returns:
+        dict: Label -> LatencySketch.
+        """
+        if self.histogram is None:
+            return {}
+        sketches = {}
+        for label, label_histogram in self.histogram.groupby(level='label', sort=False):
+            sketch = LatencySketch()
+            sketch.add_many(label_histogram.index.get_level_values('elapsed'), label_histogram.values)
+            sketches[label] = sketch
+        return sketches
+
+    def result(self):
+        """
+        Build the aggregate report from the merged state.
+
+        Returns:
+        pandas.DataFrame: One row per label plus a final 'TOTAL' row, using AGGREGATE_REPORT_COLUMNS.
+        """
+        if self.stats is None:
+            return pd.DataFrame(columns=AGGREGATE_REPORT_COLUMNS)
+
+        stats = self.stats.copy()
+        total = stats.agg({
+            'count': 'sum', 'total': 'sum', 'total_sq': 'sum', 'minimum': 'min', 'maximum': 'max',
+            'errors': 'sum', 'bytes': 'sum', 'start': 'min', 'end': 'max',
+        })
+        stats.loc['TOTAL'] = total
+
+        histogram = self.histogram.sort_index().rename('n').reset_index()
+        total_histogram = histogram.groupby('elapsed', sort=True)['n'].sum().reset_index()
+        total_histogram['label'] = 'TOTAL'
+        histogram = pd.concat([histogram, total_histogram], ignore_index=True)
+        histogram['cum'] = histogram.groupby('label', sort=False)['n'].cumsum()
+        label_total = histogram.groupby('label', sort=False)['n'].transform('sum')
+
+        report = pd.DataFrame(index=stats.index)
+        report['# Samples'] = stats['count'].astype('int64')
+        mean = stats['total'] / stats['count']
+        report['Average'] = mean.round(2)
+        for column, quantile in PERCENTILES.items():
+            # Nearest-rank percentile: the first latency whose cumulative count reaches ceil(q * n)
+            reached = histogram[histogram['cum'] >= np.ceil(quantile * label_total)]
+            report[column] = reached.groupby('label', sort=False)['elapsed'].first()
+        report['Min'] = stats['minimum'].astype('int64')
+        report['Max'] = stats['maximum'].astype('int64')
+        report['Error %'] = (stats['errors'] / stats['count'] * 100).map('{:.2f}%'.format)
+        duration_secs = ((stats['end'] - stats['start']) / 1000).where(lambda d: d > 0, 1)
+        report['Throughput'] = (stats['count'] / duration_secs).round(5)
+        report['Received KB/sec'] = (stats['bytes'] / 1024 / duration_secs).round(2)
+        variance = (stats['total_sq'] / stats['count'] - mean ** 2).clip(lower=0)
+        report['Std. Dev.'] = np.sqrt(variance).round(2)
+        report.index.name = 'Label'
+        return report.reset_index()[AGGREGATE_REPORT_COLUMNS]
+
+
+def aggregate_jtl(source, chunksize=None):
+    """
+    Stream a raw JMeter sample log in fixed-size chunks and aggregate it per label.
+
+    Parameters:
+    source (str or file-like): Path or buffer of the JTL/CSV sample log.
+    chunksize (int, optional): Rows per chunk. Defaults to JTL_CHUNK_SIZE.
+
+    Returns:
+    JtlAggregator: The aggregator holding the merged state; call `result()` for the report.
+    """
+    aggregator = JtlAggregator()
+    reader = pd.read_csv(
+        source,
+        usecols=lambda column: column in RAW_SAMPLE_COLUMNS,
+        dtype={'label': str, 'success': str},
+        chunksize=chunksize or JTL_CHUNK_SIZE,
+        encoding='utf-8-sig',
+    )
+    for chunk in reader:
+        aggregator.add_chunk(chunk)
+    return aggregator
+
+
+def load_results_file(uploaded_file, chunksize=None):
+    """
+    Read an uploaded results file, either a JMeter aggregate report or a raw sample log.
+
+    Raw sample logs are streamed through `aggregate_jtl` so they are never fully loaded into memory,
+    and also yield a latency sketch per label.
+
+    Parameters:
+    uploaded_file (file-like): The uploaded CSV file.
+    chunksize (int, optional): Rows per chunk for raw logs. Defaults to JTL_CHUNK_SIZE.
+
+    Returns:
+    tuple: The aggregate report with JMeter column names, and a dict of label -> LatencySketch
+    (empty for aggregate reports, which carry no per-sample data).
+    """
+    header = uploaded_file.readline()
+    if isinstance(header, bytes):
+        header = header.decode('utf-8-sig')
+    uploaded_file.seek(0)
+    columns = [column.strip().lstrip('\ufeff') for column in header.split(',')]
+    if is_raw_sample_log(columns):
+        aggregator = aggregate_jtl(uploaded_file, chunksize=chunksize)
+        return aggregator.result(), aggregator.latency_sketches()
+    if isinstance(uploaded_file, io.TextIOBase):
+        return pd.read_csv(uploaded_file, skip_blank_lines=True), {}
+    return pd.read_csv(uploaded_file, skip_blank_lines=True, encoding='utf-8-sig'), {}
+
+
+def read_results_file(uploaded_file, chunksize=None):
+    """
+    Read an uploaded results file and return only its aggregate report.
+
+    Parameters:
+    uploaded_file (file-like): The uploaded CSV file.
+    chunksize (int, optional): Rows per chunk for raw logs. Defaults to JTL_CHUNK_SIZE.
+
+    Returns:
+    pandas.DataFrame: The aggregate report with JMeter column names.
+    """
+    return load_results_file(uploaded_file, chunksize=chunksize)[0]
@@ -0,0 +1,148 @@
+# latency_sketch.py
+import math
+import struct
+import zlib
+
+import numpy as np
+
+# Default relative accuracy: every quantile is within 1% of the exact value
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+_HEADER = struct.Struct('<4sdQI')
+_MAGIC = b'LSK1'
+
+
+class LatencySketch:
+    """
+    Mergeable latency sketch with bounded relative error (DDSketch-style log buckets).
+
+    Positive latencies are counted in buckets whose boundaries grow geometrically by
+    gamma = (1 + a) / (1 - a), where `a` is the relative accuracy. Bucket `i` covers
+    (gamma^(i-1), gamma^i] and is represented by 2 * gamma^i / (gamma + 1).
+
+    Error bound: for any quantile q, `quantile(q)` returns a value within a relative
+    error of `a` of the exact nearest-rank q-quantile of all samples added, including
+    after any number of merges of sketches built with the same accuracy. Latencies of
+    zero (or below) are counted separately and reported as 0.
+
+    A sketch of real-world latencies stays at a few hundred buckets, and serializes
+    to a few hundred bytes to a few KB.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        """
+        Add a latency observed `count` times.
+        """
+        self.add_many([value], [count])
+
+    def add_many(self, values, counts=None):
+        """
+        Add many latencies at once.
+
+        Parameters:
+        values (array-like): Latencies in milliseconds.
+        counts (array-like, optional): How often each latency was observed. Defaults to once each.
+        """
+        values = np.asarray(values, dtype='float64')
+        counts = np.ones(len(values), dtype='int64') if counts is None else np.asarray(counts, dtype='int64')
+        positive = values > 0
+        self.zero_count += int(counts[~positive].sum())
+        indexes = np.ceil(np.log(values[positive]) / self._log_gamma).astype('int64')
+        unique_indexes, inverse = np.unique(indexes, return_inverse=True)
+        bucket_counts = np.bincount(inverse, weights=counts[positive], minlength=len(unique_indexes))
+        for index, bucket_count in zip(unique_indexes.tolist(), bucket_counts.astype('int64').tolist()):
+            self.buckets[index] = self.buckets.get(index, 0) + bucket_count
+        self.count += int(counts.sum())
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one.
+
+        Raises:
+        ValueError: If the sketches were built with different relative accuracies.
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracies")
+        for index, bucket_count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + bucket_count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """
+        Estimate the q-quantile (0 <= q <= 1) of the added latencies.
+
+        Returns:
+        float: The estimated latency, or None if the sketch is empty.
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        if rank <= self.zero_count:
+            return 0.0
+        cumulative = self.zero_count
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            if cumulative >= rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def quantiles(self, qs):
+        """
+        Estimate several quantiles in one pass.
+
+        Returns:
+        dict: Quantile -> estimated latency.
+        """
+        return {q: self.quantile(q) for q in qs}
+
+    def to_bytes(self):
+        """
+        Serialize the sketch to a compact, compressed byte string.
+        """
+        indexes = np.array(sorted(self.buckets), dtype='int32')
+        counts = np.array([self.buckets[index] for index in indexes.tolist()], dtype='int64')
+        header = _HEADER.pack(_MAGIC, self.relative_accuracy, self.zero_count, len(indexes))
+        return zlib.compress(header + indexes.tobytes() + counts.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Deserialize a sketch produced by `to_bytes`.
+
+        Raises:
+        ValueError: If the payload is not a serialized sketch.
+        """
+        payload = zlib.decompress(data)
+        magic, relative_accuracy, zero_count, size = _HEADER.unpack_from(payload)
+        if magic != _MAGIC:
+            raise ValueError("Not a serialized LatencySketch")
+        offset = _HEADER.size
+        indexes = np.frombuffer(payload, dtype='int32', count=size, offset=offset)
+        counts = np.frombuffer(payload, dtype='int64', count=size, offset=offset + 4 * size)
+        sketch = cls(relative_accuracy)
+        sketch.buckets = dict(zip(indexes.tolist(), counts.tolist()))
+        sketch.zero_count = zero_count
+        sketch.count = zero_count + int(counts.sum())
+        return sketch
+
+
+def merge_sketches(sketches, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    """
+    Merge an iterable of sketches into a new sketch.
+    """
+    merged = LatencySketch(relative_accuracy)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
@@ -0,0 +1,165 @@
+# llm_stub.py
+"""
+Local OpenAI-compatible chat completion server for development and testing.
+
+Point the app at it with the env config backend, for example:
+
+    python llm_stub.py --port 8765 --latency 0.5 --error-rate 0.1
+    APP_CONFIG_BACKEND=env OPENAI_TYPE=open_ai OPENAI_BASE=http://127.0.0.1:8765/v1 \\
+        OPENAI_API_VERSION=none OPENAI_API_KEY=stub streamlit run main_app_streamlit.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = "```\nSELECT MAX(RunId) AS LatestRunId FROM PerformanceMetrics\n```"
+
+
+class StubConfig:
+    """
+    Behaviour of the stub server; attributes can be changed while it runs.
+
+    Attributes:
+        latency (float): Seconds to wait before answering.
+        jitter (float): Extra random latency, uniformly distributed in [0, jitter].
+        error_rate (float): Fraction of requests answered with `error_status`.
+        error_status (int): HTTP status returned for injected errors (429 or 5xx).
+        token_delay (float): Seconds between streamed chunks.
+        response (str): Completion text, or a callable taking the messages and returning it.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=429, token_delay=0.0,
+                 response=DEFAULT_RESPONSE):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token_delay = token_delay
+        self.response = response
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def count(self, error):
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+
+
+def _make_handler(config):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if not self.path.split('?')[0].endswith('/chat/completions'):
+                self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            time.sleep(config.latency + random.uniform(0, config.jitter))
+
+            failed = random.random() < config.error_rate
+            config.count(failed)
+            if failed:
+                self._send_json(
+                    config.error_status,
+                    {'error': {'message': 'Injected failure', 'type': 'server_error'}},
+                    {'Retry-After': '0'} if config.error_status == 429 else None,
+                )
+                return
+
+            response = config.response
+            text = response(request.get('messages', [])) if callable(response) else response
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            model = request.get('model', 'stub')
+            if request.get('stream'):
+                self._stream(completion_id, model, text)
+                return
+            self._send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(text.split()), 'total_tokens': len(text.split())},
+            })
+
+        def _stream(self, completion_id, model, text):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            # Split after each run of whitespace so the chunks join back into the exact text
+            for piece in re.split(r'(?<=\s)(?=\S)', text):
+                chunk = {
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(config.token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return StubHandler
+
+
+def start_stub_server(host='127.0.0.1', port=0, config=None):
+    """
+    Start the stub server on a background thread.
+
+    Args:
+        host (str, optional): Interface to bind. Defaults to 127.0.0.1.
+        port (int, optional): Port to bind; 0 picks a free port. Defaults to 0.
+        config (StubConfig, optional): Latency/error injection settings.
+
+    Returns:
+        tuple: The running server and its base URL (ending in /v1).
+    """
+    config = config or StubConfig()
+    server = ThreadingHTTPServer((host, port), _make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds before each response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra random latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument('--error-status', type=int, default=429, help="HTTP status of injected failures")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument('--response', default=DEFAULT_RESPONSE, help="completion text to return")
+    args = parser.parse_args()
+
+    stub_config = StubConfig(args.latency, args.jitter, args.error_rate, args.error_status, args.token_delay, args.response)
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(stub_config))
+    print(f"Stub OpenAI endpoint listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
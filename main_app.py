@@ -1,50 +1,136 @@
 # main_app.py
+"""
+Command line entry point for running the analyzer without a browser.
 
-import streamlit as st
-import sqlite3
-import pandas as pd
+    python main_app.py ask "Fetch me the latest RunId?"
+    python main_app.py batch results/ "archive/*.jtl" --reports reports/
+"""
+import argparse
+import sys
+
+import appConfig
+import batch_ingest
 import sql_db
-from prompts.prompts import SYSTEM_MESSAGE
-from azure_openai import get_completion_from_messages
-import json
+import sql_examples
+import sql_intents
+from prompts.prompts import SYSTEM_MESSAGE, DIALECT_NOTES
+from azure_openai import get_completion_from_messages, discard_completion
+
 
-def query_database(query):
+def extract_sql(response):
     """
-    Run SQL query and return results in a dataframe
+    Extract the SQL query from a completion, which may wrap it in a ``` code block.
 
     Parameters:
-    query (str): SQL query to be executed
+    response (str): The completion text.
 
     Returns:
-    pandas.DataFrame: Results of the query in a dataframe
+    str: The SQL query.
+    """
+    if "```" in response:
+        # Find the start and end of the SQL query
+        start = response.find('```\n') + 4
+        end = response.find('\n```', start)
+        return response[start:end]
+    return response
+
+
+def ask(user_message):
     """
-    return pd.read_sql_query(query, conn)
-
-# Create or connect to SQLite database
-conn = sql_db.create_connection()
-
-# Schema Representation for finances table
-schemas = sql_db.get_schema_representation()
-print(schemas['PerformanceMetrics'])
-
-# Format the system message with the schema
-formatted_system_message = SYSTEM_MESSAGE.format(schema=schemas['PerformanceMetrics'])
-
-# Generate the SQL query from the user message
-user_message = "Fetch me the latest RunId?"
-
-# Use GPT-4 to generate the SQL query
-response = get_completion_from_messages(formatted_system_message, user_message)
-if "```" in response:
-# Find the start and end of the SQL query
-    start = response.find('```\n') + 4
-    end = response.find('\n```', start)
-    # Extract the SQL query
-    query = response[start:end]
-else:
-    query = response
-print(query)
-
-# Run the SQL query
-sql_results = query_database(query)
-print(sql_results)
\ No newline at end of file
+    Generate SQL for a natural language question and run it.
+
+    Parameters:
+    user_message (str): The question, e.g. "Fetch me the latest RunId?".
+
+    Returns:
+    tuple: The generated SQL query, the results dataframe and whether the results were truncated.
+    """
+    backend = sql_db.get_backend()
+    # Common question shapes are answered from SQL templates without calling the model
+    intent = sql_intents.get_intent_matcher().match(user_message)
+    if intent is not None:
+        query = intent['sql']
+    else:
+        # Format the system message with the schema
+        formatted_system_message = SYSTEM_MESSAGE.format(
+            schema=sql_db.get_schema_prompt(), dialect=backend.dialect, dialect_notes=DIALECT_NOTES[backend.name]
+        )
+
+        # Generate the SQL query, with similar known questions as examples. The completion is cached
+        # under the bare question, since the examples change as questions are learned
+        prompt = sql_examples.build_user_message(user_message, backend.name)
+        query = extract_sql(get_completion_from_messages(
+            formatted_system_message, prompt, model=sql_examples.NL_TO_SQL_MODEL, max_tokens=sql_examples.NL_TO_SQL_MAX_TOKENS,
+            cache_key=user_message,
+        ))
+    try:
+        with sql_db.connection() as conn:
+            sql_results, truncated = sql_db.guarded_query(query, conn)
+    except Exception:
+        # Don't serve SQL that failed (or was refused by the guard) again for this question
+        if intent is None:
+            discard_completion(formatted_system_message, user_message, model=sql_examples.NL_TO_SQL_MODEL,
+                               max_tokens=sql_examples.NL_TO_SQL_MAX_TOKENS)
+        raise
+    if intent is None:
+        sql_examples.get_example_store().add(user_message, query, backend.name)
+    return query, sql_results, truncated
+
+
+def run_batch_command(args):
+    paths, skipped = batch_ingest.discover_files(args.paths)
+    for path in skipped:
+        print(f"Skipping {path}: name does not match <Release>_<start>_<end>.csv")
+    if not paths:
+        print("No results files found.")
+        return 1
+
+    sla_secs = args.sla_secs if args.sla_secs is not None else int(appConfig.fetchKey("Sla_Config_secs"))
+    error_rate = args.error_rate if args.error_rate is not None else int(appConfig.fetchKey("Acceptable_Error_rate"))
+    print(f"Processing {len(paths)} files with {args.workers or batch_ingest.BATCH_PARSE_WORKERS} parse workers")
+    batch = batch_ingest.run_batch(
+        paths, sla_secs, error_rate, ingest=not args.no_ingest, report_dir=args.reports,
+        parse_workers=args.workers, db_workers=args.db_workers,
+    )
+
+    totals = batch['totals']
+    print(
+        f"\n{totals['succeeded']}/{totals['files']} files succeeded, {totals['failed']} failed in {totals['seconds']:.1f}s\n"
+        f"Throughput: {totals['files_per_sec']:.2f} files/sec, {totals['samples_per_sec']:,.0f} samples/sec, "
+        f"{totals['rows']} metric rows inserted"
+    )
+    if not args.no_ingest:
+        print(f"{totals['duplicates']} files were already ingested, "
+              f"{totals['regressed_runs']} runs regressed against their API baselines")
+    return 1 if totals['failed'] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI PerfInsights command line")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ask_parser = commands.add_parser('ask', help="generate and run SQL for a question")
+    ask_parser.add_argument('question')
+
+    batch_parser = commands.add_parser('batch', help="summarize, ingest and report on many results files")
+    batch_parser.add_argument('paths', nargs='+', help="directories, glob patterns or <Release>_<start>_<end>.csv files")
+    batch_parser.add_argument('--reports', help="directory for the HTML reports")
+    batch_parser.add_argument('--no-ingest', action='store_true', help="summarize only, do not insert runs")
+    batch_parser.add_argument('--workers', type=int, help="parse processes (default: CPU count)")
+    batch_parser.add_argument('--db-workers', type=int, help="database writer threads")
+    batch_parser.add_argument('--sla-secs', type=int, help="90th percentile SLA (default: Sla_Config_secs)")
+    batch_parser.add_argument('--error-rate', type=float, help="acceptable error %% (default: Acceptable_Error_rate)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'ask':
+        query, sql_results, truncated = ask(args.question)
+        print(query)
+        print(sql_results)
+        if truncated:
+            print(f"(first {len(sql_results)} rows shown)")
+        return 0
+    return run_batch_command(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 # main_app.py
 
+from contextlib import closing
 from datetime import datetime
 from io import StringIO
 import appConfig
@@ -10,26 +11,29 @@ import streamlit as st
 import sqlite3
 import pandas as pd
 import sql_db
-from prompts.prompts import SYSTEM_MESSAGE
-from azure_openai import get_completion_from_messages
+import sql_examples
+import sql_guard
+import sql_intents
+import tracing
+import query_cache
+import baselines
+import batch_ingest
+import compact_frames
+import summary_engine
+import report_mailer
+from prompts.prompts import SYSTEM_MESSAGE, DIALECT_NOTES, SAMPLE_QUERIES
+from azure_openai import stream_completion_from_messages, discard_completion, get_completion_cache
 from streamlit import components  
 import re
 from datetime import datetime
-from streamlit_js_eval import streamlit_js_eval
-
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
-from email import encoders
-from email.utils import COMMASPACE, formatdate
-import smtplib
+
 from PIL import ImageGrab
 #from reportlab.pdfgen import canvas
 import time
 from PIL import Image
 
 
+@tracing.traced('render.summary')
 def generate_testresults_summary():
     """
     This function generates table for test results summary. The results are displayed
@@ -44,212 +48,94 @@ def generate_testresults_summary():
 
     
     # Create an upload file in UI
-    uploaded_file = st.file_uploader("Upload test results to generate test summary", type="csv")
+    uploaded_file = st.file_uploader("Upload test results or a raw JTL sample log to generate test summary", type=["csv", "jtl"])
     if uploaded_file is not None:
-        upload = uploaded_file
-        # Process the uploaded file
-        file_contents = uploaded_file.read().decode('utf-8-sig')
-        data = pd.read_csv(io.StringIO(file_contents))      
-        
         acceptable_error_percentage = int(appConfig.fetchKey("Acceptable_Error_rate"))
         sla_configuration_secs = int(appConfig.fetchKey("Sla_Config_secs"))        
 
-        sla_config_millsec = sla_configuration_secs * 1000        
-        overall_rps = data.loc[data['Label'] == 'TOTAL', 'Throughput'].values[0]  
-
-        error_percentage_str = data.loc[data['Label'] == 'TOTAL', 'Error %'].values[0]  
-        error_perc_decimal = float(error_percentage_str[:-1])         
-        if error_perc_decimal > acceptable_error_percentage:
-            test_status = "FAIL"
-            teststatus_html = f'<t5r><td><b>TestStatus</b></td><td style="color:red;">{test_status}</td></tr>'
-        else:
-            test_status = "PASS"
-            teststatus_html = f'<t5r><td><b>TestStatus</b></td><td style="color:Green;">{test_status}</td></tr>'
-         
-        total_samples_count = data.loc[data['Label'] == 'TOTAL', '# Samples'].values[0]          
-        failed_samples_count = round(total_samples_count * (error_perc_decimal / 100))   
-        passed_samples_count = total_samples_count - failed_samples_count
-        samples_with_sla_count = len(data[(data['Label'] != 'TOTAL') & (data['90% Line'] <= sla_config_millsec)]['Label'].unique())   
-        samples_with_no_sla_count = len(data[(data['Label'] != 'TOTAL') & (data['90% Line'] > sla_config_millsec)]['Label'].unique())   
-        labels = data[(data['Label'] != 'TOTAL') & (data['90% Line'] > sla_config_millsec)][['Label', '90% Line']]          
-
-        test_start_time = datetime.strptime(uploaded_file.name.split('_')[1], '%d-%m-%Y-%H-%M-%S')
-        test_end_time =datetime.strptime(uploaded_file.name.split('_')[2].split('.')[0], '%d-%m-%Y-%H-%M-%S')
-        
-        duration = test_end_time - test_start_time
-
-        minutes = duration.seconds // 60
-        seconds = duration.seconds % 60        
-        
-        duration_str = '{:02d}:{:02d}'.format(minutes, seconds)
-        dft = pd.DataFrame(labels)        
-        
-        # Define the layout of the table
-        table_layout = """
-        <style>
-        table {
-        border-collapse: collapse;
-        width: 90%;
-        }
-        th, td {
-        text-align: left;
-        padding: 8px;
-        border: 1px solid black;
-        }
-
-        </style>
-        """
-        table_html = f'<table>{table_layout}'        
-        
-        table_header = f'<tr><th colspan="3" style="text-align:center;">Performance Test Summary</th></tr>'
-        rps_html = f'<tr><td><b>RequestPerSecond</b></td><td>{overall_rps}</td></tr>'  
-        testconfig_html = f'<tr><td><b>Test Configuration</b></td><td><table><tr><td>Run Duration</td><td>{duration_str}</td></tr><tr><td>StartTime</td><td>{test_start_time}</td></tr><tr><td>EndTime</td><td>{test_end_time}</td></tr></table></td></tr>'        
-        test_execution_summary_html = f'<tr><td><b>Test Execution Summary</b></td><td><table><tr><td>Transactions</td><td>{total_samples_count}</td></tr><tr><td>Passed</td><td style="color:Green;">{passed_samples_count}</td></tr><tr><td>Failed</td><td style="color:red;">{failed_samples_count}</td></tr><tr><td>Meeting SLA ({sla_configuration_secs} sec):</td><td style="color:Green;">{samples_with_sla_count}</td></tr><tr><td>Not Meeting SLA ({sla_configuration_secs} sec)</td><td style="color:Red;">{samples_with_no_sla_count}</td></tr></table></td></tr>'
-
-        stable_html = f'<table>'
-        for row in dft.values:            
-            table_row = '<tr>'
-            for value in row:                
-                table_row += f'<td>{value}</td>'
-            table_row += '</tr>'
-            stable_html += table_row
-        stable_html += '</table>'              
-
-        sla_table_html = f'<tr><td><b>Transactions-Not Meeting SLA(90th Percentile)</b></td><td>{stable_html}</td></tr>'
-        table_html += table_header + teststatus_html + rps_html + testconfig_html + test_execution_summary_html +sla_table_html                                          
-        
-        table_html += '</table>'              
-        html_code = f"""
-        {table_html}
-        """        
+        # Summary stats and HTML are computed once per file content and SLA settings
+        summary = summary_engine.summarize_results_file(uploaded_file, sla_configuration_secs, acceptable_error_percentage)
+        html_code = summary['html']
         st.markdown(html_code, unsafe_allow_html=True)
         
 
-        # smtp_server = 'smtp.office365.com'  
-        # smtp_port = 587  
-        # smtp_username = 'taniyagupta250295@gmail.com'
-        # smtp_password = 'cdkcncdcn2@T'  
-        #receiver_emails = ['Taniya.Gupta@microsoft.com','Anvesh.Bonagiri@microsoft.com','Shwetha.Punnam@microsoft.com','angolla@microsoft.com']        
-
-        smtp_server = appConfig.fetchKey("smtp_server")
-        smtp_port = int(appConfig.fetchKey("smtp_port"))  
-        smtp_username = appConfig.fetchKey("smtp_username")
-        smtp_password = appConfig.fetchKey("smtp_password")
-        receiver_emails = appConfig.fetchKey("receiver_emails")
-
-
-        # Global Config End
-        release_number = uploaded_file.name.split('_')[0]
-        message_body = f'''  
-        Hi Team,
-
-        Please find the performance Test Report of {release_number}.
-
-        Thanks,
-        Performance Test Team.
-        '''
-        test_report_name = f'{release_number}_PerfTestReport.html'        
-
-        # Create the email message  
-        msg = MIMEMultipart()  
-        msg['From'] = smtp_username
-        msg['To'] = ", ".join(receiver_emails)  
-        msg['Subject'] = 'Performance Test Report'  
-        
-        
-        # Add the HTML text as a MIMEText object          
-        msg.attach(MIMEText(message_body, 'plain'))  
-       
-        # Add the HTML text as an attachment  
-        attachment = MIMEApplication(html_code.encode('utf-8'), _subtype='html')  
-        attachment.add_header('Content-Disposition', 'attachment', filename=test_report_name)  
-        msg.attach(attachment)  
-        
-        # Send the email  
-        with smtplib.SMTP(smtp_server, smtp_port) as server: 
-            print('Email started running successfully!')   
-            server.ehlo()  
-            server.starttls()  
-            server.login(smtp_username, smtp_password)  
-            server.sendmail(smtp_username, receiver_emails, msg.as_string())                       
-            print('Email sent successfully!')  
+        # Hand the report to the background mailer; re-enqueueing the same report on a rerun is a no-op
+        release_number = summary['release']
+        report_mailer.enqueue_report(release_number, html_code)
+        st.caption(f"Performance Test Report of {release_number} queued for email delivery.")
 
 
    
 
-def query_database(query, conn):
-    """
-    Run SQL query and return results in a dataframe
-    
-    Parameters:
-        query (str): The SQL query to be executed
-        conn (connection): The database connection object
-    
-    Returns:
-        pandas.DataFrame: The results of the query in a dataframe
-    """
-    return pd.read_sql_query(query, conn)
-
+@tracing.traced('ingest.upload')
 def upload_performance_metrics_data():
     """
-    Uploads performance results from a CSV file and inserts them into the database.
+    Uploads performance results from one or more CSV files and inserts them into the database.
     
-    This function allows the user to upload a CSV file containing performance metrics data.
-    It reads the contents of the uploaded file, processes it, and inserts the data into the database.
-    The function also displays the contents of the uploaded file and provides feedback on the success of the upload.
+    The uploaded files are validated (file name pattern and columns) and parsed concurrently, then
+    ingested one after another with a status line per file, each in its own transaction. Files whose
+    content was ingested before, in this session or any other, are not ingested again, and the
+    history panel is refreshed in place afterwards.
     """
     if st.checkbox('Upload Performance Results'):
         # Create an upload file in UI 
-        uploaded_file = st.file_uploader("Upload Test Results", type="csv")
-        if uploaded_file is not None:
-            upload = uploaded_file
-
-            file_contents = uploaded_file.read().decode('utf-8-sig')
-            try:
-                df = pd.read_csv(StringIO(file_contents), skip_blank_lines=True)
-            except pd.errors.EmptyDataError:
-                st.write("The uploaded file is empty. Please upload a different file.")
-
-            filename_str = os.path.splitext(uploaded_file.name)[0]           
-
-            pattern = r'^[A-Za-z0-9]+[\d.]*_[0-9]{2}-[0-9]{2}-[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}_[0-9]{2}-[0-9]{2}-[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}$'  
-            
-            if re.match(pattern, filename_str):                                  
-                cursor = conn.cursor()   
-                new_run_id = cursor.execute("SELECT MAX(RunId) + 1 AS NewRunId FROM PerformanceMetrics").fetchone()[0]
-                if new_run_id is None:
-                    new_run_id = 1
-                run_date = datetime.now()
-                # Insert the uploaded file into the database.
-                for index, row in df.iterrows():
-                    data_dict = {
-                        "API": row['Label'],
-                        "Samples": row['# Samples'],
-                        "Average": row['Average'],
-                        "Median": row['Median'],
-                        "NinetyPercentile": row['90% Line'],
-                        "NinetyFivePercentile": row['95% Line'],
-                        "NinetyNinePercentile": row['99% Line'],
-                        "Minimum": row['Min'],
-                        "Maximum": row['Max'],
-                        "ErrorPercentage": row['Error %'],
-                        "Throughput": row['Throughput'],
-                        "ReceivedKBPersecond": row['Received KB/sec'],
-                        "StandardDeviation": row['Std. Dev.'],
-                        "RunId" : new_run_id,
-                        "TestName": uploaded_file.name.split('_')[0],
-                        "TestStartTime": datetime.strptime(uploaded_file.name.split('_')[1], '%d-%m-%Y-%H-%M-%S'),
-                        "TestEndTime": datetime.strptime(uploaded_file.name.split('_')[2].split('.')[0], '%d-%m-%Y-%H-%M-%S'),
-                    }
-                    sql_db.insert_data(conn,table_name="PerformanceMetrics", data_dict=data_dict)                       
-                
-                st.write("File upload was successful.")
-            else:  
-                st.write("File upload Failed due to Incorrect File format.")             
-            streamlit_js_eval(js_expressions="parent.window.location.reload()")  
-                
-            
-            
+        uploaded_files = st.file_uploader("Upload Test Results", type=["csv", "jtl"], accept_multiple_files=True)
+        if uploaded_files:
+            # Content hash -> final outcome (ingested or duplicate) of files handled earlier in this session.
+            # Rejected and failed files are only shown for this rerun, so the next rerun tries them again
+            upload_status = st.session_state.setdefault('upload_status', {})
+            hashes = [summary_engine.content_hash(uploaded_file) for uploaded_file in uploaded_files]
+            status = {digest: upload_status[digest] for digest in hashes if digest in upload_status}
+            new_files = [(uploaded_file, digest) for uploaded_file, digest in zip(uploaded_files, hashes) if digest not in status]
+            for uploaded_file, digest in new_files:
+                status[digest] = {'File': uploaded_file.name, 'Status': 'Queued', 'Details': ''}
+
+            status_table = st.empty()
+
+            def show_status():
+                status_table.dataframe(pd.DataFrame([status[digest] for digest in dict.fromkeys(hashes)]), hide_index=True)
+
+            def finish(digest, outcome, details):
+                status[digest].update(Status=outcome, Details=details)
+                if outcome not in ('Rejected', 'Failed'):
+                    upload_status[digest] = status[digest]
+
+            # Files ingested earlier, e.g. by another analyst, are recognized by their hash without parsing them
+            with sql_db.connection() as conn:
+                known = sql_db.ingested_runs(conn, [digest for _, digest in new_files])
+            for digest, run_id in known.items():
+                finish(digest, 'Duplicate', f"already ingested as RunId {run_id}")
+            new_files = [(uploaded_file, digest) for uploaded_file, digest in new_files if digest not in known]
+
+            show_status()
+            if not new_files:
+                return
+
+            ingested = 0
+            parsed_files = batch_ingest.parse_uploads([uploaded_file for uploaded_file, _ in new_files],
+                                                      content_hashes=[digest for _, digest in new_files])
+            for (uploaded_file, digest), (parsed, error) in zip(new_files, parsed_files):
+                if error is not None:
+                    finish(digest, 'Rejected', error)
+                else:
+                    try:
+                        with sql_db.connection() as conn:
+                            run = batch_ingest.ingest_run(conn, parsed['release'], parsed['test_start_time'], parsed['test_end_time'],
+                                                          parsed['report'], parsed['sketches'], digest, parsed['name'])
+                        if run['duplicate']:
+                            finish(digest, 'Duplicate', f"already ingested as RunId {run['run_id']}")
+                        else:
+                            details = f"RunId {run['run_id']}, {run['rows']} rows"
+                            if run['regressed']:
+                                details += f", regressed: {', '.join(run['regressed'])}"
+                            finish(digest, 'Regressed' if run['regressed'] else 'Ingested', details)
+                            ingested += 1
+                    except Exception as e:
+                        finish(digest, 'Failed', str(e))
+                show_status()
+
+            if ingested:
+                refresh_testresults_history()
             
             
 def generate_sql_queries():
@@ -271,35 +157,150 @@ def generate_sql_queries():
         user_message = st.text_area("Enter your message:")
 
         if user_message:
-            # Format the system message with the schema
-            formatted_system_message = SYSTEM_MESSAGE.format(schema=schemas['PerformanceMetrics'])
-
-            # Use GPT-4 to generate the SQL query
-            response = get_completion_from_messages(formatted_system_message, user_message)
-            if "```" in response:
-                # Find the start and end of the SQL query
-                start = response.find('```\n') + 4
-                end = response.find('\n```', start)
-
-                # Extract the SQL query
-                query = response[start:end]
+            backend = sql_db.get_backend()
+            # Common question shapes are answered from SQL templates without calling the model. The
+            # match is kept for the question's reruns (e.g. paging), so each question is counted once
+            if st.session_state.get('intent_question') != user_message:
+                st.session_state['intent_question'] = user_message
+                st.session_state['intent'] = sql_intents.get_intent_matcher().match(user_message)
+            intent = st.session_state['intent']
+            if intent is not None:
+                query = intent['sql']
+                st.caption(f"Answered from the '{intent['intent']}' query template")
             else:
-                query = response
+                # Format the system message with the schema
+                formatted_system_message = SYSTEM_MESSAGE.format(
+                    schema=sql_db.get_schema_prompt(), dialect=backend.dialect, dialect_notes=DIALECT_NOTES[backend.name]
+                )
+
+                # Use GPT-4 to generate the SQL query, showing the response as it streams in
+                st.write("Generated Message for the prompt:")
+                response_placeholder = st.empty()
+                response = ""
+                prompt = sql_examples.build_user_message(user_message, backend.name)
+                # Closing the stream releases its LLM slot even if this rerun is stopped halfway. The
+                # completion is cached under the bare question, since the examples change as questions are learned
+                with closing(stream_completion_from_messages(formatted_system_message, prompt, model=sql_examples.NL_TO_SQL_MODEL,
+                                                             max_tokens=sql_examples.NL_TO_SQL_MAX_TOKENS,
+                                                             cache_key=user_message)) as pieces:
+                    for piece in pieces:
+                        response += piece
+                        response_placeholder.code(response)
+                if "```" in response:
+                    # Find the start and end of the SQL query
+                    start = response.find('```\n') + 4
+                    end = response.find('\n```', start)
+
+                    # Extract the SQL query
+                    query = response[start:end]
+                else:
+                    query = response
 
-            st.write("Generated Message for the prompt:")
-            st.code(response)
             # Display the generated SQL query
             st.write("Generated SQL Query:")
             st.code(query, language="sql")
             try:
-                # Run the SQL query and display the results
-                sql_results = query_database(query, conn)
-                st.write("Query Results:")
-                st.dataframe(sql_results)
-
+                # Run the SQL query one page at a time; only the current page is fetched and rendered
+                display_query_results(query)
+                # A generated query that ran becomes an example for similar questions
+                if intent is None:
+                    sql_examples.get_example_store().add(user_message, query, backend.name)
             except Exception as e:
+                # Don't serve SQL that failed (or was refused by the guard) again for this question
+                if intent is None:
+                    discard_completion(formatted_system_message, user_message, model=sql_examples.NL_TO_SQL_MODEL,
+                                       max_tokens=sql_examples.NL_TO_SQL_MAX_TOKENS)
                 st.write(f"An error occurred: {e}")
 
+def _change_results_page(step):
+    st.session_state['results_page'] = max(0, st.session_state['results_page'] + step)
+
+def _reset_results_page():
+    st.session_state['results_page'] = 0
+
+@tracing.traced('render.results')
+def display_query_results(query):
+    """
+    Displays a generated query's results one page at a time, with page size control, an optional
+    total row count and the next page prefetched in the background.
+
+    Parameters:
+        query (str): The generated SQL query
+
+    Returns:
+        None
+    """
+    # A new query starts again from its first page
+    if st.session_state.get('results_query') != query:
+        st.session_state['results_query'] = query
+        st.session_state['results_page'] = 0
+    page = st.session_state.setdefault('results_page', 0)
+    page_size = st.selectbox("Rows per page", sql_guard.SQL_PAGE_SIZES,
+                             index=sql_guard.SQL_PAGE_SIZES.index(sql_guard.SQL_PAGE_SIZE) if sql_guard.SQL_PAGE_SIZE in sql_guard.SQL_PAGE_SIZES else 0,
+                             key='results_page_size', on_change=_reset_results_page)
+
+    with sql_db.connection() as conn:
+        sql_results, has_next = sql_db.query_page(query, conn, page, page_size)
+    if has_next:
+        sql_db.prefetch_page(query, page + 1, page_size)
+
+    st.write("Query Results:")
+    st.dataframe(sql_results)
+    first_row = page * page_size + 1
+    caption = f"Page {page + 1}: rows {first_row}-{first_row + len(sql_results) - 1}" if len(sql_results) else f"Page {page + 1}: no rows"
+    if st.checkbox("Show total row count", key='results_show_count'):
+        with sql_db.connection() as conn:
+            total_rows = sql_db.query_row_count(query, conn)
+        if total_rows is not None:
+            caption += f" of {total_rows}"
+    st.caption(caption)
+
+    previous_col, next_col = st.columns(2)
+    previous_col.button("Previous page", on_click=_change_results_page, args=(-1,), disabled=page == 0)
+    next_col.button("Next page", on_click=_change_results_page, args=(1,), disabled=not has_next)
+
+def load_testresults_history(incremental=False):
+    """
+    Returns the latest runs for the history panel. An incremental load only queries runs newer
+    than the ones already shown and merges them in.
+    """
+    history = st.session_state.get('history_runs')
+    with sql_db.connection() as conn:
+        if incremental and history is not None and len(history):
+            new_runs = sql_db.cached_query(sql_db.run_history_query(limit=10, after_run_id=int(history['RunId'].max())), conn)
+            history = compact_frames.concat_runs([new_runs, history]).head(10)
+        else:
+            history = sql_db.cached_query(sql_db.run_history_query(limit=10), conn)
+    st.session_state['history_runs'] = history
+    return history
+
+
+def show_testresults_history(placeholder, history):
+    """
+    Draws the history runs with their regression verdicts, and the regressed APIs below them.
+    Verdicts are stored at ingest time, so this reads RunVerdicts rather than comparing runs.
+    """
+    run_ids = [int(run_id) for run_id in history['RunId']]
+    with sql_db.connection() as conn:
+        baselines.setup_baseline_tables(conn)
+        verdicts = sql_db.cached_query(baselines.run_verdicts_query(run_ids), conn)
+        regressed = bool(len(verdicts) and verdicts['Regressed'].astype(int).sum())
+        regressions = sql_db.cached_query(baselines.regressions_query(run_ids), conn) if regressed else None
+    verdict_by_run = {int(row['RunId']): baselines.describe_verdicts(row) for _, row in verdicts.iterrows()}
+    table = history.assign(Verdict=[verdict_by_run.get(run_id, "No baseline") for run_id in run_ids])
+    with placeholder.container():
+        st.dataframe(
+            table.rename(columns={'RunId': 'Run ID', 'TestName': 'Test Name', 'TestStartTime': 'Test StartTime', 'TestEndTime': 'Test EndTime'}),
+            hide_index=True, width=4500,
+        )
+        if regressed:
+            with st.expander("Regressed APIs"):
+                st.dataframe(regressions.rename(columns={
+                    'RunId': 'Run ID', 'NinetyPercentile': '90th Pct', 'BaselineNinetyPercentile': 'Baseline 90th Pct',
+                    'NinetyPercentileChange': 'Change', 'ErrorPercentage': 'Error %', 'BaselineErrorPercentage': 'Baseline Error %',
+                }), hide_index=True)
+
+@tracing.traced('render.history')
 def generate_testresults_history():
     """
     This function generates table for test results history which has run details. The query results are displayed
@@ -309,26 +310,74 @@ def generate_testresults_history():
         None
 
     Returns:
-        None
+        streamlit placeholder: The history table, so it can be refreshed in place.
     """
     with col2:
         st.header("Test Results History")
-        #Anil-Final
-        query = "select distinct top 10  RunId,TestName,TestStartTime,TestEndTime FROM [dbo].[PerformanceMetrics] order by RunId Desc"
+        history_table = st.empty()
         try:
-                # Run the SQL query and display the results
-                sql_results = query_database(query, conn)
-                sql_results = sql_results.rename(columns={'RunId': 'Run ID', 'TestName': 'Test Name', 'TestStartTime': 'Test StartTime', 'TestEndTime': 'Test EndTime'})
-
-                df = pd.DataFrame(sql_results)
-                st.dataframe(df, hide_index=True, width=4500)
-
+            # Run the SQL query and display the results
+            show_testresults_history(history_table, load_testresults_history())
         except Exception as e:
-                st.write(f"An error occurred: {e}")
+            history_table.write(f"An error occurred: {e}")
+    return history_table
+
+@tracing.traced('render.history')
+def refresh_testresults_history():
+    """
+    Redraws the history table with newly ingested runs, without reloading the page.
+    """
+    try:
+        show_testresults_history(history_table, load_testresults_history(incremental=True))
+    except Exception as e:
+        history_table.write(f"An error occurred: {e}")
 
 
 
         
+def generate_diagnostics():
+    """
+    This function shows where time is going: latency percentiles per stage, a per-stage breakdown of
+    the most recent requests and cache hit rates. Spans can be exported to a local file in
+    OpenTelemetry (OTLP/JSON) format.
+
+    Parameters:
+        None
+
+    Returns:
+        None
+    """
+    st.subheader("Latency by stage")
+    stages = pd.DataFrame(tracing.stage_summary())
+    if stages.empty:
+        st.write("No spans recorded yet. Use the other pages and come back.")
+    else:
+        st.dataframe(stages.round(3), hide_index=True)
+
+    st.subheader("Recent requests")
+    traces = tracing.recent_traces(limit=20)
+    if traces:
+        breakdown = pd.DataFrame([
+            dict({'Trace ID': trace['trace_id'][:16], 'Page': trace['root'], 'Started': trace['started_at'],
+                  'Total ms': trace['total_ms'], 'Errors': trace['errors']}, **trace['stages'])
+            for trace in traces
+        ])
+        st.dataframe(breakdown.round(2), hide_index=True)
+        st.caption("Stage columns are milliseconds per request; nested stages (e.g. db.checkout inside schema.fetch) overlap.")
+
+    st.subheader("Caches")
+    st.write({
+        'query results': query_cache.get_query_cache().summary(),
+        'completions hit rate': get_completion_cache().hit_rate(),
+        'query template hit rate': sql_intents.get_intent_matcher().hit_ratio(),
+        'query templates used': sql_intents.get_intent_matcher().stats['by_intent'],
+    })
+
+    if st.button("Export spans"):
+        exported = tracing.export_spans()
+        st.write(f"Exported {exported} spans to {tracing.TRACE_EXPORT_PATH}.")
+
+
 if __name__ == "__main__":
     
     st.set_page_config(  
@@ -336,7 +385,9 @@ if __name__ == "__main__":
         layout="wide",  
         initial_sidebar_state="expanded"        
     )      
-    menu_items = ["TestSummary", "PerfTestAnalyzer", "Help"]     
+    # Load all configuration keys once per process so page renders read from the cache
+    appConfig.prefetch()
+    menu_items = ["TestSummary", "PerfTestAnalyzer", "Help", "Diagnostics"]     
     st.markdown(  
         """  
         <style>  
@@ -355,28 +406,25 @@ if __name__ == "__main__":
     menu_selection = st.sidebar.selectbox("Select a page", menu_items)  
   
     # Display content on the right pane based on menu item clicked  
-    if menu_selection == "TestSummary":          
-        st.markdown(f"<h2 style='text-align: center'>Test Results Summary</h1>", unsafe_allow_html=True)
-        generate_testresults_summary()  
-    elif menu_selection == "PerfTestAnalyzer":  
-        conn = sql_db.create_connection()
-        col1, col2, col3, col4 = st.columns([0.2, 2, 2, 0.5])         
-        generate_testresults_history()         
-        schemas = sql_db.get_schema_representation()
-        with col3:
-            st.header("Perf Analyzer-Chatbot")
-            upload_performance_metrics_data()                                             
-            generate_sql_queries()
-    elif menu_selection == "Help":  
-        st.markdown("""
-        ### Sample Queries to Analyze Performance Results
- 
-        1. **List all API/Transactions with response time > 400 for given Run-ID**
-            - Display records which has NinetyPercentile greater than 400 at RunID 1
-        2. **List Specific API/Transactions with response time > 400 for given Run-ID**
-            - Display API, NinetyPercentile columns for records which has NinetyPercentile greater than 400 at RunID 1
-        3. **List all API/Transactions with response time is between a range for given Run-ID**
-            - Get me list of API,NinetyPercentile which has NinetyPercentile > 1000 and < 2000 at RunID 3
-        4. **Compare and analyze API Response time between Test Runs**
-            - Get me list of API,Average,RunID of records with API names in SearchAPI, HomeAPI at RunID 1,2
-        """)
+    # Each rerun of a page is one trace
+    with tracing.span(f"page.{menu_selection}", new_trace=True):
+        if menu_selection == "TestSummary":          
+            st.markdown(f"<h2 style='text-align: center'>Test Results Summary</h1>", unsafe_allow_html=True)
+            generate_testresults_summary()  
+        elif menu_selection == "PerfTestAnalyzer":  
+            # Each database step checks out a pooled connection of its own, so none is held while the
+            # LLM answer streams in
+            col1, col2, col3, col4 = st.columns([0.2, 2, 2, 0.5])         
+            history_table = generate_testresults_history()
+            with col3:
+                st.header("Perf Analyzer-Chatbot")
+                upload_performance_metrics_data()                                             
+                generate_sql_queries()
+        elif menu_selection == "Help":  
+            help_text = "### Sample Queries to Analyze Performance Results\n"
+            for number, (title, question, _) in enumerate(SAMPLE_QUERIES, start=1):
+                help_text += f"\n{number}. **{title}**\n    - {question}"
+            st.markdown(help_text)
+        elif menu_selection == "Diagnostics":
+            st.markdown(f"<h2 style='text-align: center'>Diagnostics</h1>", unsafe_allow_html=True)
+            generate_diagnostics()
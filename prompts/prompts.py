@@ -1,4 +1,55 @@
-SYSTEM_MESSAGE = """You are an AI assistant that is able to convert natural language into a properly formatted SQL server query.
+SYSTEM_MESSAGE = """You are an AI assistant that is able to convert natural language into a properly formatted {dialect} query.
+{dialect_notes}
 
-The table you will be querying is called "PerformanceMetrics". Here is the schema of the table:
-{schema}"""
\ No newline at end of file
+The main table you will be querying is called "PerformanceMetrics" and holds one row per API per test run.
+Run details (TestName, TestStartTime, TestEndTime) are in the "Runs" table; join it to PerformanceMetrics on RunId when they are needed.
+Regression verdicts (REGRESSED, IMPROVED, OK, or NEW while an API has too few runs) of each API in each run against its rolling baseline are in the "RunVerdicts" table.
+Here is the schema, one table per line as Table(column type, ...):
+{schema}"""
+
+# Dialect-specific guidance appended to the system message, keyed by storage backend name
+DIALECT_NOTES = {
+    "sqlserver": "Use TOP n to limit the number of rows.",
+    "sqlite": "Use LIMIT n to limit the number of rows. Do not use TOP or schema prefixes such as [dbo].",
+}
+
+# Sample questions shown on the Help page, as (title, question, SQL). They also seed the few-shot
+# example store, so the SQL must run on every backend.
+SAMPLE_QUERIES = [
+    (
+        "List all API/Transactions with response time > 400 for given Run-ID",
+        "Display records which has NinetyPercentile greater than 400 at RunID 1",
+        "SELECT * FROM PerformanceMetrics WHERE NinetyPercentile > 400 AND RunId = 1",
+    ),
+    (
+        "List Specific API/Transactions with response time > 400 for given Run-ID",
+        "Display API, NinetyPercentile columns for records which has NinetyPercentile greater than 400 at RunID 1",
+        "SELECT API, NinetyPercentile FROM PerformanceMetrics WHERE NinetyPercentile > 400 AND RunId = 1",
+    ),
+    (
+        "List all API/Transactions with response time is between a range for given Run-ID",
+        "Get me list of API,NinetyPercentile which has NinetyPercentile > 1000 and < 2000 at RunID 3",
+        "SELECT API, NinetyPercentile FROM PerformanceMetrics WHERE NinetyPercentile > 1000 AND NinetyPercentile < 2000 AND RunId = 3",
+    ),
+    (
+        "Compare and analyze API Response time between Test Runs",
+        "Get me list of API,Average,RunID of records with API names in SearchAPI, HomeAPI at RunID 1,2",
+        "SELECT API, Average, RunId FROM PerformanceMetrics WHERE API IN ('SearchAPI', 'HomeAPI') AND RunId IN (1, 2) ORDER BY API, RunId",
+    ),
+    (
+        "Find the latest test run",
+        "Fetch me the latest RunId",
+        "SELECT MAX(RunId) AS LatestRunId FROM Runs",
+    ),
+    (
+        "Show the details of a test run",
+        "Show the test name, start time and end time of RunID 2",
+        "SELECT TestName, TestStartTime, TestEndTime FROM Runs WHERE RunId = 2",
+    ),
+    (
+        "List the APIs that regressed in a test run",
+        "Which APIs regressed at RunID 5",
+        "SELECT API, NinetyPercentile, BaselineNinetyPercentile, ErrorPercentage, BaselineErrorPercentage "
+        "FROM RunVerdicts WHERE RunId = 5 AND Verdict = 'REGRESSED'",
+    ),
+]
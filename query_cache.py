@@ -0,0 +1,120 @@
+# query_cache.py
+from collections import OrderedDict
+import os
+import re
+import threading
+
+import compact_frames
+import sql_guard
+
+# Upper bound on the memory held by cached result frames
+QUERY_CACHE_MAX_BYTES = int(os.getenv('QUERY_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+
+def canonicalize_sql(query):
+    """
+    Canonicalize SQL text so trivially different spellings of a query share a cache entry.
+
+    Comments are removed, whitespace is collapsed, a trailing semicolon is dropped and everything
+    outside string literals is lower-cased.
+
+    Parameters:
+    query (str): The SQL query.
+
+    Returns:
+    str: The canonical form.
+    """
+    parts = _STRING_LITERAL.split(sql_guard.strip_sql(query))
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r'\s+', ' ', parts[i]).lower()
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+class QueryResultCache:
+    """
+    LRU cache of query results keyed on a namespace, canonical SQL text and a data-version token.
+
+    Namespaces keep results fetched under different rules apart, e.g. a plain query result and the
+    row-capped result of the same generated SQL.
+
+    Because the key includes the data version, a result is only reused while the data it was
+    computed from is unchanged. The cache holds at most `max_bytes` of frames (measured with
+    `memory_usage(deep=True)`) and evicts least recently used entries beyond that.
+    """
+
+    def __init__(self, max_bytes=QUERY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query, data_version, namespace=''):
+        """
+        Return the cached result for `query` at `data_version` in `namespace`, or None on a miss.
+        """
+        key = (namespace, canonicalize_sql(query), data_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0].copy(deep=False)
+
+    def put(self, query, data_version, df, namespace=''):
+        """
+        Cache a result frame, evicting least recently used entries if the memory cap is exceeded.
+        Frames larger than the whole cap are not cached. Frames that are not compact yet are stored
+        in their compact form.
+        """
+        if not compact_frames.is_compact(df):
+            df = compact_frames.compact_frame(df)
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return
+        key = (namespace, canonicalize_sql(query), data_version)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (df, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.stats['evictions'] += 1
+
+    def invalidate(self):
+        """
+        Drop every cached result, e.g. after new data has been ingested.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self.stats['invalidations'] += 1
+
+    def hit_rate(self):
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def summary(self):
+        """
+        Returns:
+        dict: Entry count, bytes held, hit rate and the raw counters.
+        """
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self.bytes, hit_rate=self.hit_rate())
+
+
+_query_cache = QueryResultCache()
+
+
+def get_query_cache():
+    """
+    Returns the process-wide query result cache.
+    """
+    return _query_cache
@@ -0,0 +1,333 @@
+# report_mailer.py
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate
+import hashlib
+import json
+import os
+import random
+import re
+import smtplib
+import threading
+import time
+
+import appConfig
+
+# Durable outbox: pending/, sent/ and failed/ hold one JSON file per report, named by idempotency key
+REPORT_OUTBOX_DIR = os.getenv('REPORT_OUTBOX_DIR', '.outbox')
+# Reports sent over one SMTP session per wake-up
+MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', '20'))
+MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', '8'))
+MAIL_BACKOFF_SECS = float(os.getenv('MAIL_BACKOFF_SECS', '5'))
+MAIL_MAX_BACKOFF_SECS = float(os.getenv('MAIL_MAX_BACKOFF_SECS', '600'))
+# An idle SMTP session is closed after this many seconds
+SMTP_IDLE_SECS = float(os.getenv('SMTP_IDLE_SECS', '60'))
+MAIL_POLL_SECS = float(os.getenv('MAIL_POLL_SECS', '5'))
+# Delivered reports are kept in sent/ this long, which is also how long re-enqueueing them is a no-op
+MAIL_SENT_RETENTION_SECS = float(os.getenv('MAIL_SENT_RETENTION_SECS', str(7 * 24 * 3600)))
+# How often sent/ is checked for reports past their retention
+MAIL_PRUNE_INTERVAL_SECS = float(os.getenv('MAIL_PRUNE_INTERVAL_SECS', '3600'))
+
+MESSAGE_BODY = '''
+        Hi Team,
+
+        Please find the performance Test Report of {release_number}.
+
+        Thanks,
+        Performance Test Team.
+        '''
+
+
+def parse_recipients(receiver_emails):
+    """
+    Split a comma or semicolon separated recipient list.
+    """
+    if isinstance(receiver_emails, (list, tuple)):
+        return list(receiver_emails)
+    return [address.strip() for address in re.split(r'[,;]', receiver_emails or '') if address.strip()]
+
+
+def connect_smtp():
+    """
+    Open an SMTP session with the server configured in App Configuration.
+
+    STARTTLS and login are only used when the server offers them, so a local stand-in such as
+    `python -m aiosmtpd -n -l localhost:1025` works with smtp_server=localhost and smtp_port=1025.
+    """
+    server = smtplib.SMTP(appConfig.fetchKey("smtp_server"), int(appConfig.fetchKey("smtp_port")), timeout=30)
+    server.ehlo()
+    if server.has_extn('starttls'):
+        server.starttls()
+        server.ehlo()
+    username = appConfig.fetchKey("smtp_username")
+    if username and server.has_extn('auth'):
+        server.login(username, appConfig.fetchKey("smtp_password"))
+    return server
+
+
+class ReportMailer:
+    """
+    Background delivery worker for report emails.
+
+    Reports are written to a durable on-disk outbox and delivered by a daemon thread that keeps one
+    SMTP session open across reports, sends due reports in batches and retries failures with
+    jittered exponential backoff. Each report has an idempotency key, so enqueueing the same report
+    again (e.g. on a Streamlit rerun) does not send a duplicate. Delivered reports are deleted from
+    sent/ after MAIL_SENT_RETENTION_SECS.
+    """
+
+    def __init__(self, outbox_dir=REPORT_OUTBOX_DIR, smtp_factory=connect_smtp):
+        self.outbox_dir = outbox_dir
+        self.smtp_factory = smtp_factory
+        self.stats = {'sent': 0, 'retries': 0, 'failed': 0, 'duplicates': 0, 'sessions': 0, 'pruned': 0}
+        for folder in ('pending', 'sent', 'failed'):
+            os.makedirs(os.path.join(outbox_dir, folder), exist_ok=True)
+        self._session = None
+        self._session_used_at = 0.0
+        self._pruned_at = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _path(self, folder, key):
+        return os.path.join(self.outbox_dir, folder, f"{key}.json")
+
+    def _write(self, folder, message):
+        # Write then rename, so a crash never leaves a half-written outbox entry
+        path = self._path(folder, message['key'])
+        with open(path + '.tmp', 'w', encoding='utf-8') as outbox_file:
+            json.dump(message, outbox_file)
+        os.replace(path + '.tmp', path)
+
+    def enqueue(self, release_number, html_report, recipients, sender, subject='Performance Test Report'):
+        """
+        Queue a report for delivery and return immediately.
+
+        Parameters:
+            release_number (str): The release the report belongs to.
+            html_report (str): The HTML report, sent as an attachment.
+            recipients (list): Recipient addresses.
+            sender (str): The From address.
+            subject (str, optional): The email subject.
+
+        Returns:
+            str: The report's idempotency key.
+        """
+        key = hashlib.sha256(json.dumps([release_number, html_report, sorted(recipients)]).encode('utf-8')).hexdigest()
+        with self._lock:
+            if any(os.path.exists(self._path(folder, key)) for folder in ('pending', 'sent')):
+                self.stats['duplicates'] += 1
+                return key
+            self._write('pending', {
+                'key': key,
+                'release_number': release_number,
+                'html_report': html_report,
+                'recipients': recipients,
+                'sender': sender,
+                'subject': subject,
+                'attempts': 0,
+                'next_attempt_at': 0,
+                'created_at': time.time(),
+            })
+        self.start()
+        self._wakeup.set()
+        return key
+
+    def pending(self):
+        """
+        Returns:
+            list: Pending messages, oldest first.
+        """
+        folder = os.path.join(self.outbox_dir, 'pending')
+        messages = []
+        for name in os.listdir(folder):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(folder, name), encoding='utf-8') as outbox_file:
+                    messages.append(json.load(outbox_file))
+            except (OSError, ValueError):
+                continue
+        return sorted(messages, key=lambda message: message['created_at'])
+
+    def _build_message(self, message):
+        msg = MIMEMultipart()
+        msg['From'] = message['sender']
+        msg['To'] = ", ".join(message['recipients'])
+        msg['Subject'] = message['subject']
+        msg['Date'] = formatdate(localtime=True)
+        msg['Message-ID'] = f"<{message['key']}@perfinsights>"
+        msg.attach(MIMEText(MESSAGE_BODY.format(release_number=message['release_number']), 'plain'))
+        attachment = MIMEApplication(message['html_report'].encode('utf-8'), _subtype='html')
+        attachment.add_header('Content-Disposition', 'attachment', filename=f"{message['release_number']}_PerfTestReport.html")
+        msg.attach(attachment)
+        return msg
+
+    def _get_session(self):
+        if self._session is not None:
+            try:
+                self._session.noop()
+                return self._session
+            except smtplib.SMTPException:
+                self._close_session()
+        self._session = self.smtp_factory()
+        self.stats['sessions'] += 1
+        return self._session
+
+    def _close_session(self):
+        if self._session is not None:
+            try:
+                self._session.quit()
+            except Exception:
+                pass
+            self._session = None
+
+    def _deliver(self, message):
+        session = self._get_session()
+        session.sendmail(message['sender'], message['recipients'], self._build_message(message).as_string())
+        self._session_used_at = time.monotonic()
+
+    def _handle_failure(self, message, error):
+        print(f"Report email {message['key'][:12]} failed: {error}")
+        self._close_session()
+        message['attempts'] += 1
+        message['last_error'] = str(error)
+        if message['attempts'] >= MAIL_MAX_ATTEMPTS:
+            self._write('failed', message)
+            os.remove(self._path('pending', message['key']))
+            self.stats['failed'] += 1
+            return
+        backoff = min(MAIL_MAX_BACKOFF_SECS, MAIL_BACKOFF_SECS * 2 ** (message['attempts'] - 1))
+        message['next_attempt_at'] = time.time() + random.uniform(backoff / 2, backoff)
+        self._write('pending', message)
+        self.stats['retries'] += 1
+
+    def process_once(self):
+        """
+        Deliver up to MAIL_BATCH_SIZE due reports over one session.
+
+        Returns:
+            int: The number of reports sent.
+        """
+        now = time.time()
+        due = [message for message in self.pending() if message['next_attempt_at'] <= now][:MAIL_BATCH_SIZE]
+        sent = 0
+        for message in due:
+            try:
+                self._deliver(message)
+            except Exception as e:
+                self._handle_failure(message, e)
+                continue
+            os.replace(self._path('pending', message['key']), self._path('sent', message['key']))
+            # The retention period counts from delivery
+            os.utime(self._path('sent', message['key']))
+            self.stats['sent'] += 1
+            sent += 1
+        if self._session is not None and time.monotonic() - self._session_used_at > SMTP_IDLE_SECS:
+            self._close_session()
+        if self._pruned_at is None or time.monotonic() - self._pruned_at > MAIL_PRUNE_INTERVAL_SECS:
+            self.prune_sent()
+        return sent
+
+    def prune_sent(self, retention_secs=MAIL_SENT_RETENTION_SECS):
+        """
+        Delete delivered reports older than the retention period, so sent/ does not grow without bound.
+
+        Returns:
+            int: The number of reports deleted.
+        """
+        self._pruned_at = time.monotonic()
+        folder = os.path.join(self.outbox_dir, 'sent')
+        cutoff = time.time() - retention_secs
+        pruned = 0
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    pruned += 1
+            except OSError:
+                continue
+        self.stats['pruned'] += pruned
+        return pruned
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.process_once()
+            except Exception as e:
+                print(f"Report mailer error: {e}")
+            self._wakeup.wait(MAIL_POLL_SECS)
+            self._wakeup.clear()
+        self._close_session()
+
+    def start(self):
+        """
+        Start the delivery thread if it is not running. Pending reports from earlier processes are picked up too.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='report-mailer', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the delivery thread and close the SMTP session.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def flush(self, timeout=30):
+        """
+        Wait until no report is pending or `timeout` seconds pass.
+
+        Returns:
+            bool: True if the outbox was drained.
+        """
+        deadline = time.monotonic() + timeout
+        while self.pending():
+            if time.monotonic() >= deadline:
+                return False
+            self._wakeup.set()
+            time.sleep(0.05)
+        return True
+
+
+_mailer = None
+_mailer_lock = threading.Lock()
+
+
+def get_mailer():
+    """
+    Returns the process-wide report mailer, creating and starting it on first use.
+    """
+    global _mailer
+    with _mailer_lock:
+        if _mailer is None:
+            _mailer = ReportMailer()
+            _mailer.start()
+    return _mailer
+
+
+def enqueue_report(release_number, html_report):
+    """
+    Queue a test report for email delivery to the configured recipients.
+
+    Parameters:
+        release_number (str): The release the report belongs to.
+        html_report (str): The HTML report.
+
+    Returns:
+        str: The report's idempotency key.
+    """
+    return get_mailer().enqueue(
+        release_number,
+        html_report,
+        recipients=parse_recipients(appConfig.fetchKey("receiver_emails")),
+        sender=appConfig.fetchKey("smtp_username"),
+    )
@@ -1,45 +1,314 @@
 # sql_db.py
-import csv
-from datetime import date, timedelta
-from gettext import npgettext
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
 from dotenv import load_dotenv
-import random
 from sqlite3 import Error
-import sqlite3
+import sys
+import threading
 
-import pyodbc
-from tqdm import tqdm
-
-import numpy as np
 import pandas as pd
 import os
+import time
 import appConfig
+import compact_frames
+import db_backends
+import query_cache
+import sql_guard
+import tracing
+from latency_sketch import LatencySketch, merge_sketches
 
 load_dotenv()
 
+# JMeter aggregate report column -> PerformanceMetrics column
+PERFORMANCE_METRICS_COLUMNS = {
+    'Label': 'API',
+    '# Samples': 'Samples',
+    'Average': 'Average',
+    'Median': 'Median',
+    '90% Line': 'NinetyPercentile',
+    '95% Line': 'NinetyFivePercentile',
+    '99% Line': 'NinetyNinePercentile',
+    'Min': 'Minimum',
+    'Max': 'Maximum',
+    'Error %': 'ErrorPercentage',
+    'Throughput': 'Throughput',
+    'Received KB/sec': 'ReceivedKBPersecond',
+    'Std. Dev.': 'StandardDeviation',
+}
+
+# Run dimension: one row per uploaded test run; RunId is allocated by the database
+RUNS_TABLE_DDL = """
+CREATE TABLE Runs (
+    RunId {identity},
+    TestName VARCHAR(255),
+    TestStartTime {datetime},
+    TestEndTime {datetime},
+    IngestedAt {datetime}
+);
+"""
+
+# Fact table: one row per (RunId, API)
+PERFORMANCE_METRICS_TABLE_DDL = """
+CREATE TABLE {table_name} (
+    RunId INT NOT NULL,
+    API VARCHAR(255) NOT NULL,
+    Samples INT,
+    Average DECIMAL(10, 2),
+    Median DECIMAL(10, 2),
+    NinetyPercentile DECIMAL(10, 2),
+    NinetyFivePercentile DECIMAL(10, 2),
+    NinetyNinePercentile DECIMAL(10, 2),
+    Minimum INT,
+    Maximum INT,
+    ErrorPercentage VARCHAR(10),
+    Throughput DECIMAL(10, 2),
+    ReceivedKBPersecond DECIMAL(10, 2),
+    StandardDeviation DECIMAL(10, 2),
+    PRIMARY KEY (RunId, API)
+);
+"""
+
+# Rows sent per executemany call by bulk_insert
+BULK_INSERT_BATCH_SIZE = int(os.getenv('BULK_INSERT_BATCH_SIZE', '1000'))
+
+# Connection pool settings
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_IDLE_TIMEOUT_SECS = int(os.getenv('DB_POOL_IDLE_TIMEOUT_SECS', '600'))
+DB_POOL_HEALTH_CHECK_SECS = int(os.getenv('DB_POOL_HEALTH_CHECK_SECS', '30'))
+DB_POOL_CHECKOUT_TIMEOUT_SECS = int(os.getenv('DB_POOL_CHECKOUT_TIMEOUT_SECS', '30'))
+
+# Tables whose schema is shown to the NL-to-SQL model
+SCHEMA_TABLES = [table.strip() for table in os.getenv('SCHEMA_TABLES', 'Runs,PerformanceMetrics,RunVerdicts').split(',') if table.strip()]
+SCHEMA_VERSION_CHECK_SECS = int(os.getenv('SCHEMA_VERSION_CHECK_SECS', '60'))
+
+# How often the cached data-version token is re-read from the database
+DATA_VERSION_CHECK_SECS = int(os.getenv('DATA_VERSION_CHECK_SECS', '30'))
+
+_backend = None
+_pool = None
+_pool_lock = threading.Lock()
+_schema_cache = {'schema': None, 'prompt': None, 'version': None, 'checked_at': 0.0}
+_schema_lock = threading.Lock()
+_data_version = {'ingests': 0, 'token': None, 'checked_at': 0.0}
+_data_version_lock = threading.Lock()
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='page-prefetch')
+_prefetching = set()
+_prefetch_lock = threading.Lock()
+# Backend whose IngestedFiles table is known to exist
+_ingested_files_ready_for = None
+
+def get_backend():
+    """
+    Return the storage backend (SQL Server or embedded SQLite), chosen by DB_BACKEND on first use.
+
+    Returns:
+        The backend object from db_backends.
+    """
+    global _backend
+    if _backend is None:
+        _backend = db_backends.create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Switch the storage backend, closing pooled connections and dropping cached schema and results.
+
+    Parameters:
+    backend: A backend object from db_backends, e.g. db_backends.SqliteBackend(':memory:').
+    """
+    global _backend, _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _backend = backend
+        _pool = None
+    _schema_cache.update(schema=None, prompt=None, version=None, checked_at=0.0)
+    notify_data_changed()
+
+
 def create_connection_url():
-    DATABASE_NAME = appConfig.fetchKey('DATABASE_NAME')
-    server = appConfig.fetchKey('SQL_SERVER')
-    username = appConfig.fetchKey('SQL_USERNAME') 
-    password = appConfig.fetchKey('SQL_PASSWORD')
-    dbConnectionString = os.getenv('DB_CONNECTION_STRING')
-    return dbConnectionString.format(DATABASE_NAME=DATABASE_NAME, server=server, username=username, password=password)
+    return get_backend().connection_url()
 
 def create_connection():
     """ 
-    Create or connect to an SQLite database 
+    Create or connect to the configured database (SQL Server or SQLite)
     
     Returns:
-        conn: Connection object to the SQLite database
+        conn: Connection object to the database
     """
     conn = None;
     try:
-        conn = pyodbc.connect(create_connection_url())
+        conn = get_backend().connect()
     except Error as e:
         print(e)
     return conn
 
 
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections.
+
+    Connections are handed out LIFO so the most recently used (warmest) one is reused first.
+    A connection that has been idle longer than `health_check_secs` is pinged with `SELECT 1`
+    before it is handed out and replaced if the ping fails, and connections idle longer than
+    `idle_timeout_secs` are closed as long as `min_size` connections remain.
+    """
+
+    def __init__(self, connect, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 idle_timeout_secs=DB_POOL_IDLE_TIMEOUT_SECS, health_check_secs=DB_POOL_HEALTH_CHECK_SECS,
+                 checkout_timeout_secs=DB_POOL_CHECKOUT_TIMEOUT_SECS):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout_secs = idle_timeout_secs
+        self.health_check_secs = health_check_secs
+        self.checkout_timeout_secs = checkout_timeout_secs
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        for _ in range(min_size):
+            self._size += 1
+            self._idle.append((self._open(), time.monotonic()))
+
+    @tracing.traced('db.connect')
+    def _open(self):
+        # The slot has already been reserved in self._size; give it back if connecting fails.
+        try:
+            conn = self._connect()
+            if conn is None:
+                raise ConnectionError("Could not open a database connection")
+            return conn
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn):
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchall()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle(self, now):
+        # Called with the lock held; the oldest idle connections sit at the front of the list.
+        expired = []
+        while self._idle and self._size - len(expired) > self.min_size \
+                and now - self._idle[0][1] > self.idle_timeout_secs:
+            expired.append(self._idle.pop(0)[0])
+        return expired
+
+    @tracing.traced('db.checkout')
+    def acquire(self):
+        """
+        Check out a connection, waiting up to `checkout_timeout_secs` when the pool is exhausted.
+
+        Raises:
+        TimeoutError: If no connection became available in time.
+        """
+        deadline = time.monotonic() + self.checkout_timeout_secs
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                expired = self._evict_idle(now)
+                entry = self._idle.pop() if self._idle else None
+                can_grow = entry is None and self._size < self.max_size
+                if can_grow:
+                    self._size += 1
+                if entry is None and not can_grow:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a database connection")
+                    self._cond.wait(remaining)
+            for conn in expired:
+                self._discard(conn)
+            if can_grow:
+                return self._open()
+            if entry is None:
+                continue
+            conn, last_used = entry
+            if time.monotonic() - last_used < self.health_check_secs or self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn):
+        """
+        Return a connection to the pool, rolling back any uncommitted work.
+        """
+        try:
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that checks a connection out and always returns it.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """
+        Close every idle connection.
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+def get_pool():
+    """
+    Return the process-wide connection pool, creating it on first use.
+
+    The pool lives at module level, so it is shared by all Streamlit sessions and survives script reruns.
+
+    Returns:
+        ConnectionPool: The shared pool.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(lambda: get_backend().connect())
+    return _pool
+
+
+@contextmanager
+def connection():
+    """
+    Check out a pooled connection for the duration of a `with` block.
+
+    Yields:
+        conn: A connection from the shared pool.
+    """
+    with get_pool().connection() as conn:
+        yield conn
+
+
 def create_table(conn, create_table_sql):
     """
     Create a table with the specified SQL command.
@@ -58,30 +327,270 @@ def create_table(conn, create_table_sql):
         print(e)
 
 
-def insert_data(conn, table_name, data_dict):
+def create_run(conn, test_name, test_start_time, test_end_time):
+    """
+    Insert a row into the Runs table and return the RunId the database allocated for it.
+
+    The insert is not committed, so it can share a transaction with the run's metrics.
+
+    Parameters:
+    conn (Connection): The database connection object.
+    test_name (str): The test (release) name.
+    test_start_time (datetime): The test start time.
+    test_end_time (datetime): The test end time.
+
+    Returns:
+    int: The new RunId.
+    """
+    return get_backend().insert_returning_id(
+        conn.cursor(), 'Runs', 'RunId',
+        ['TestName', 'TestStartTime', 'TestEndTime', 'IngestedAt'],
+        [test_name, test_start_time, test_end_time, datetime.now()],
+    )
+
+
+def to_performance_metrics_frame(report_df, run_id):
     """
-    Insert a new data into a table.
+    Map a JMeter aggregate report to the PerformanceMetrics table layout.
+
+    Parameters:
+    report_df (pandas.DataFrame): The aggregate report with JMeter column names ('Label', '# Samples', ...).
+    run_id (int): The RunId assigned to every row.
+
+    Returns:
+    pandas.DataFrame: A frame whose columns are the PerformanceMetrics column names.
+    """
+    df = report_df[list(PERFORMANCE_METRICS_COLUMNS)].rename(columns=PERFORMANCE_METRICS_COLUMNS)
+    df.insert(0, 'RunId', run_id)
+    return df
+
+
+def bulk_insert(conn, table_name, dataframe, batch_size=None, commit=True):
+    """
+    Insert all rows of a dataframe into a table in a single transaction.
+
+    The INSERT statement is built once from the dataframe columns, numpy values are converted to
+    native Python types for the whole frame at once, and rows are sent in batches through
+    executemany (with pyodbc's fast_executemany on SQL Server). Either every row is committed
+    or the transaction is rolled back.
 
     Parameters:
     conn (Connection): The database connection object.
     table_name (str): The name of the table to insert data into.
-    data_dict (dict): A dictionary containing the data to be inserted, where the keys represent the column names and the values represent the corresponding values.
+    dataframe (pandas.DataFrame): The rows to insert; column names must match the table columns.
+    batch_size (int, optional): Rows per executemany call. Defaults to BULK_INSERT_BATCH_SIZE.
+    commit (bool, optional): Commit when done; False leaves the rows in the caller's transaction. Defaults to True.
 
     Returns:
-    int: The ID of the last inserted row.
+    dict: 'rows' inserted, elapsed 'seconds' and 'rows_per_sec'.
     """
-    columns = ', '.join(data_dict.keys())
-    placeholders = ', '.join('?' * len(data_dict))
+    batch_size = batch_size or BULK_INSERT_BATCH_SIZE
+    columns = ', '.join(dataframe.columns)
+    placeholders = ', '.join('?' * len(dataframe.columns))
     sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+    # astype(object) turns numpy scalars into Python ints/floats; NaN becomes NULL
+    values = dataframe.astype(object)
+    for column in dataframe.select_dtypes(include=['datetime', 'datetimetz']).columns:
+        values[column] = pd.Series(dataframe[column].dt.to_pydatetime(), index=dataframe.index, dtype=object)
+    rows = values.where(dataframe.notna(), None).values.tolist()
+
+    start = time.perf_counter()
     cur = conn.cursor()
-    # Convert numpy.int64 values to int
-    values = [int(value) if isinstance(value, np.int64) else value for value in data_dict.values()]
-    cur.execute(sql, values)
-    conn.commit()
-    # Fetch the ID of the last inserted row
-    cur.execute("SELECT SCOPE_IDENTITY()")
-    lastrowid = cur.fetchone()[0]
-    return lastrowid
+    get_backend().prepare_bulk_cursor(cur)
+    try:
+        for offset in range(0, len(rows), batch_size):
+            cur.executemany(sql, rows[offset:offset + batch_size])
+        if commit:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    elapsed = time.perf_counter() - start
+    if commit:
+        notify_data_changed()
+    return {
+        'rows': len(rows),
+        'seconds': elapsed,
+        'rows_per_sec': len(rows) / elapsed if elapsed > 0 else float('inf'),
+    }
+
+
+def get_data_version(conn):
+    """
+    Get a cheap token identifying the current contents of the analyzer tables.
+
+    The token combines an in-process ingest counter (bumped by every write made through this module)
+    with the latest RunId, which is re-read at most every DATA_VERSION_CHECK_SECS seconds so that
+    uploads made by other processes are picked up as well.
+
+    Parameters:
+    conn (Connection): The database connection object.
+
+    Returns:
+    tuple: The data-version token.
+    """
+    now = time.monotonic()
+    with _data_version_lock:
+        if now - _data_version['checked_at'] >= DATA_VERSION_CHECK_SECS:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(RunId) FROM Runs")
+            _data_version['token'] = cursor.fetchone()[0]
+            _data_version['checked_at'] = now
+        return (_data_version['ingests'], _data_version['token'])
+
+
+def notify_data_changed():
+    """
+    Record that data was written, invalidating cached query results.
+    """
+    with _data_version_lock:
+        _data_version['ingests'] += 1
+        _data_version['checked_at'] = 0.0
+    query_cache.get_query_cache().invalidate()
+
+
+def cached_query(query, conn):
+    """
+    Run SQL query through the result cache and return results in a dataframe.
+
+    Results are reused for the same canonical SQL text as long as the data version is unchanged.
+    The returned frame is shared with the cache and should be treated as read-only.
+
+    Parameters:
+    query (str): The SQL query to be executed.
+    conn (Connection): The database connection object.
+
+    Returns:
+    pandas.DataFrame: The results of the query in a dataframe.
+    """
+    cache = query_cache.get_query_cache()
+    version = get_data_version(conn)
+    df = cache.get(query, version)
+    if df is None:
+        with tracing.span('sql.execute'):
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query)
+                df = compact_frames.frame_from_cursor(cursor)
+            finally:
+                cursor.close()
+        cache.put(query, version, df)
+    return df
+
+
+def run_history_query(limit=10, after_run_id=None):
+    """
+    Build the query for the latest test runs in the backend's SQL dialect.
+
+    Parameters:
+    limit (int, optional): Number of runs to return. Defaults to 10.
+    after_run_id (int, optional): Only return runs newer than this one, to refresh a history incrementally.
+
+    Returns:
+    str: The SQL query.
+    """
+    # Backward scan of the Runs primary key; no DISTINCT over the fact table needed
+    where = f"WHERE RunId > {int(after_run_id)} " if after_run_id is not None else ""
+    return get_backend().top(limit, "RunId,TestName,TestStartTime,TestEndTime", f"FROM Runs {where}ORDER BY RunId DESC")
+
+
+def guarded_query(query, conn):
+    """
+    Run LLM-generated SQL through the read-only guard and the result cache.
+
+    Parameters:
+    query (str): The generated SQL query.
+    conn (Connection): The database connection object.
+
+    Returns:
+    tuple: The results dataframe (read-only) and whether it was truncated by the row cap or memory budget.
+
+    Raises:
+    sql_guard.UnsafeQueryError: If the query is not a single read-only SELECT.
+    """
+    sql_guard.validate_select(query)
+    cache = query_cache.get_query_cache()
+    version = get_data_version(conn)
+    # Capped results are kept apart from cached_query's, and from results under other limits
+    namespace = f"guarded:{sql_guard.SQL_MAX_ROWS}:{sql_guard.SQL_MEMORY_BUDGET_BYTES}"
+    df = cache.get(query, version, namespace)
+    if df is None:
+        df, truncated = sql_guard.execute_guarded(query, conn, get_backend())
+        df.attrs['truncated'] = truncated
+        cache.put(query, version, df, namespace)
+    return df, df.attrs.get('truncated', False)
+
+
+def query_page(query, conn, page, page_size=None):
+    """
+    Fetch one page of a generated query's results through the guard and the result cache.
+
+    Parameters:
+    query (str): The generated SQL query.
+    conn (Connection): The database connection object.
+    page (int): Zero-based page number.
+    page_size (int, optional): Rows per page. Defaults to sql_guard.SQL_PAGE_SIZE.
+
+    Returns:
+    tuple: The page dataframe and whether a next page exists.
+    """
+    page_size = page_size or sql_guard.SQL_PAGE_SIZE
+    page_sql = get_backend().paginate(sql_guard.validate_select(query), page * page_size, page_size + 1)
+    return _cached_page(page_sql, get_data_version(conn), lambda: sql_guard.fetch_page(query, conn, get_backend(), page, page_size))
+
+
+def _cached_page(page_sql, version, fetch):
+    cache = query_cache.get_query_cache()
+    df = cache.get(page_sql, version, 'page')
+    if df is None:
+        df, has_next = fetch()
+        df.attrs['has_next'] = has_next
+        cache.put(page_sql, version, df, 'page')
+    return df, df.attrs.get('has_next', False)
+
+
+def prefetch_page(query, page, page_size=None):
+    """
+    Warm the result cache with a page in the background, on its own pooled connection, so that
+    paging forward is served from memory.
+    """
+    page_size = page_size or sql_guard.SQL_PAGE_SIZE
+    key = (query_cache.canonicalize_sql(query), page, page_size)
+    with _prefetch_lock:
+        if key in _prefetching:
+            return
+        _prefetching.add(key)
+
+    def prefetch():
+        try:
+            with connection() as conn:
+                query_page(query, conn, page, page_size)
+        except Exception as e:
+            print(f"Prefetch of page {page} failed: {e}")
+        finally:
+            with _prefetch_lock:
+                _prefetching.discard(key)
+
+    _prefetch_executor.submit(prefetch)
+
+
+def query_row_count(query, conn):
+    """
+    Count a generated query's rows, cached until the data changes.
+
+    Returns:
+    int: The row count, or None if the backend cannot count this query.
+    """
+    count_sql = get_backend().count_rows(sql_guard.validate_select(query))
+    if count_sql is None:
+        return None
+    cache = query_cache.get_query_cache()
+    version = get_data_version(conn)
+    df = cache.get(count_sql, version, 'count')
+    if df is None:
+        df = pd.DataFrame({'rows': [sql_guard.count_rows(query, conn, get_backend())]})
+        cache.put(count_sql, version, df, 'count')
+    return int(df['rows'].iloc[0])
 
 
 def query_database(query):
@@ -94,19 +603,58 @@ def query_database(query):
     Returns:
     pandas.DataFrame: The results of the query in a dataframe.
     """
-    conn = create_connection()
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query)
+        return compact_frames.frame_from_cursor(cursor)
+
+
+def load_runs(conn, run_ids=None, apis=None):
+    """
+    Load the metrics of several runs, with their test names, as one compact frame.
+
+    Parameters:
+    conn (Connection): The database connection object.
+    run_ids (list, optional): Runs to load. Defaults to all runs.
+    apis (list, optional): APIs to load. Defaults to all APIs.
+
+    Returns:
+    pandas.DataFrame: PerformanceMetrics rows plus TestName, in compact dtypes (see compact_frames).
+    """
+    sql = "SELECT m.*, r.TestName FROM PerformanceMetrics m JOIN Runs r ON r.RunId = m.RunId"
+    conditions, params = [], []
+    if run_ids is not None:
+        conditions.append(f"m.RunId IN ({', '.join('?' * len(run_ids))})")
+        params.extend(int(run_id) for run_id in run_ids)
+    if apis is not None:
+        conditions.append(f"m.API IN ({', '.join('?' * len(apis))})")
+        params.extend(apis)
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql + " ORDER BY m.RunId, m.API", params)
+        return compact_frames.frame_from_cursor(cursor)
+    finally:
+        cursor.close()
+
+
+def _create_performance_metrics_indexes(cursor):
+    # (RunId, API) lookups use the primary key; this serves per-API comparisons across runs
+    get_backend().create_index(
+        cursor, 'IX_PerformanceMetrics_API_RunId', 'PerformanceMetrics', ['API', 'RunId'],
+        include=['Average', 'NinetyPercentile', 'NinetyFivePercentile', 'NinetyNinePercentile', 'ErrorPercentage'],
+    )
 
 
 # Create a Performance Metrics table
 def setup_performance_metrics_table():
     """
-    Creates the API_Performance table in the database and inserts data from a CSV file.
+    Creates the Runs and PerformanceMetrics tables in the database and inserts data from a CSV file.
 
-    This function creates the API_Performance table with the specified columns in the database.
-    It then reads data from a CSV file and inserts each row into the API_Performance table.
+    Runs holds one row per test run with an identity RunId; PerformanceMetrics holds one row per
+    (RunId, API), keyed and indexed for run and API lookups. The sample results in PerfMetrics.csv
+    are inserted as a run of their own.
 
     Args:
         None
@@ -114,89 +662,335 @@ def setup_performance_metrics_table():
     Returns:
         None
     """
-    conn = create_connection()
-    cursor = conn.cursor()  
-    sql_create_performance_metrics_table = """
-    CREATE TABLE PerformanceMetrics (
-        API VARCHAR(255),
-        Samples INT,
-        Average DECIMAL(10, 2),
-        Median DECIMAL(10, 2),
-        NinetyPercentile DECIMAL(10, 2),
-        NinetyFivePercentile DECIMAL(10, 2),
-        NinetyNinePercentile DECIMAL(10, 2),
-        Minimum INT,
-        Maximum INT,
-        ErrorPercentage VARCHAR(10),
-        Throughput DECIMAL(10, 2),
-        ReceivedKBPersecond DECIMAL(10, 2),
-        StandardDeviation DECIMAL(10, 2),
-        RunId INT,
-        TestName VARCHAR(255),
-        TestStartTime DATETIME,
-        TestEndTime DATETIME
-    );
-    """
-    create_table(conn, sql_create_performance_metrics_table)
-
-    with open('PerfMetrics.csv', 'r') as csv_file:
-        # Create a CSV reader
-        csv_reader = csv.reader(csv_file)
-
-        # Skip the header row
-        next(csv_reader)
-
-        # Insert each row into the PerformanceMetrics table
-        for row in csv_reader:
+    types = get_backend().types
+    with connection() as conn:
+        create_table(conn, RUNS_TABLE_DDL.format(**types))
+        create_table(conn, PERFORMANCE_METRICS_TABLE_DDL.format(table_name='PerformanceMetrics', **types))
+        _create_performance_metrics_indexes(conn.cursor())
+        conn.commit()
+
+        # Seed the tables with the sample results; the CSV still uses the legacy column names
+        seed_df = pd.read_csv('PerfMetrics.csv', encoding='utf-8-sig').rename(columns={
+            'NintyPercentage': 'NinetyPercentile',
+            'NintyFivePercentage': 'NinetyFivePercentile',
+            'NintyNinePercentage': 'NinetyNinePercentile',
+        })
+        run_date = pd.to_datetime(seed_df.pop('RunDate'), format='ISO8601').min().to_pydatetime()
+        run_id = create_run(conn, 'SampleRun', run_date, run_date)
+        seed_df['RunId'] = run_id
+        bulk_insert(conn, 'PerformanceMetrics', seed_df)
+
+
+def migrate_to_runs_schema():
+    """
+    Migrates a legacy PerformanceMetrics heap (run metadata repeated on every row) to the Runs/PerformanceMetrics schema.
+
+    Existing RunIds are preserved, the identity continues after the highest one, duplicate
+    (RunId, API) rows are collapsed and rows without a RunId or API are dropped. All steps run in
+    one transaction.
+
+    Args:
+        None
+
+    Returns:
+        bool: True if a migration was performed, False if the schema is already current.
+    """
+    backend = get_backend()
+    types = backend.types
+    with connection() as conn:
+        current = _introspect_schema(conn, ['Runs', 'PerformanceMetrics'])
+        if 'Runs' in current or 'TestName' not in current.get('PerformanceMetrics', {}):
+            return False
+
+        backend.begin(conn)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(RUNS_TABLE_DDL.format(**types))
+            backend.set_identity_insert(cursor, 'Runs', True)
             cursor.execute("""
-                INSERT INTO PerformanceMetrics (
-                    API, Samples, Average, Median, NintyPercentage, NintyFivePercentage, NintyNinePercentage, 
-                    Minimum, Maximum, ErrorPercentage, Throughput, ReceivedKBPersecond, 
-                    StandardDeviation, RunId
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, row)
+                INSERT INTO Runs (RunId, TestName, TestStartTime, TestEndTime)
+                SELECT RunId, MAX(TestName), MIN(TestStartTime), MAX(TestEndTime)
+                FROM PerformanceMetrics WHERE RunId IS NOT NULL GROUP BY RunId
+            """)
+            backend.set_identity_insert(cursor, 'Runs', False)
+
+            cursor.execute(PERFORMANCE_METRICS_TABLE_DDL.format(table_name='PerformanceMetrics_new', **types))
+            metric_columns = list(PERFORMANCE_METRICS_COLUMNS.values())[1:]
+            cursor.execute(f"""
+                INSERT INTO PerformanceMetrics_new (RunId, API, {', '.join(metric_columns)})
+                SELECT RunId, API, {', '.join(f'MAX({column})' for column in metric_columns)}
+                FROM PerformanceMetrics WHERE RunId IS NOT NULL AND API IS NOT NULL GROUP BY RunId, API
+            """)
+            cursor.execute("DROP TABLE PerformanceMetrics")
+            backend.rename_table(cursor, 'PerformanceMetrics_new', 'PerformanceMetrics')
+            _create_performance_metrics_indexes(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    get_schema_representation(force=True)
+    notify_data_changed()
+    return True
+
+
+def setup_latency_sketches_table():
+    """
+    Creates the LatencySketches table, which holds one serialized latency sketch per (RunId, API).
+
+    Returns:
+        None
+    """
+    with connection() as conn:
+        sql_create_latency_sketches_table = """
+        CREATE TABLE LatencySketches (
+            RunId INT NOT NULL,
+            API VARCHAR(255) NOT NULL,
+            RelativeAccuracy FLOAT NOT NULL,
+            SampleCount BIGINT NOT NULL,
+            Sketch {blob} NOT NULL,
+            PRIMARY KEY (RunId, API)
+        );
+        """.format(**get_backend().types)
+        create_table(conn, sql_create_latency_sketches_table)
+        conn.commit()
+
+
+def store_latency_sketches(conn, run_id, sketches, commit=True):
+    """
+    Store the latency sketches of one run.
+
+    Parameters:
+    conn (Connection): The database connection object.
+    run_id (int): The RunId the sketches belong to.
+    sketches (dict): API label -> LatencySketch.
+    commit (bool, optional): Commit when done; False leaves the rows in the caller's transaction. Defaults to True.
+
+    Returns:
+    int: The number of sketches stored.
+    """
+    rows = [
+        (int(run_id), api, sketch.relative_accuracy, sketch.count, sketch.to_bytes())
+        for api, sketch in sketches.items()
+    ]
+    if not rows:
+        return 0
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO LatencySketches (RunId, API, RelativeAccuracy, SampleCount, Sketch) VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+    if commit:
+        conn.commit()
+        notify_data_changed()
+    return len(rows)
+
+
+INGESTED_FILES_TABLE_DDL = """
+CREATE TABLE IngestedFiles (
+    ContentHash CHAR(64) NOT NULL PRIMARY KEY,
+    RunId INT NOT NULL,
+    FileName VARCHAR(255),
+    IngestedAt {datetime} NOT NULL
+);
+"""
+
+
+def setup_ingested_files_table(conn=None):
+    """
+    Creates the IngestedFiles table, which maps the SHA-256 of every ingested results file to its
+    run, if it does not exist yet.
+
+    Returns:
+        None
+    """
+    global _ingested_files_ready_for
+    if conn is None:
+        with connection() as conn:
+            return setup_ingested_files_table(conn)
+    backend = get_backend()
+    if _ingested_files_ready_for is backend:
+        return
+    if not backend.introspect_schema(conn, ['IngestedFiles']):
+        create_table(conn, INGESTED_FILES_TABLE_DDL.format(**backend.types))
+        conn.commit()
+    _ingested_files_ready_for = backend
+
+
+def ingested_runs(conn, content_hashes):
+    """
+    Look up which files were ingested already, by content hash.
+
+    Parameters:
+    conn (Connection): The database connection object.
+    content_hashes (list): SHA-256 hex digests of results files.
+
+    Returns:
+    dict: Content hash -> RunId, for the hashes that were ingested.
+    """
+    content_hashes = list(content_hashes)
+    if not content_hashes:
+        return {}
+    setup_ingested_files_table(conn)
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT ContentHash, RunId FROM IngestedFiles WHERE ContentHash IN ({', '.join('?' * len(content_hashes))})",
+        content_hashes,
+    )
+    return {content_hash: int(run_id) for content_hash, run_id in cur.fetchall()}
+
+
+def record_ingested_file(conn, content_hash, run_id, file_name=None):
+    """
+    Record that a file was ingested as `run_id`. The insert is not committed, so it belongs to the
+    run's transaction; a second ingest of the same content fails on the primary key. The table must
+    exist already (see `setup_ingested_files_table`).
+    """
+    conn.cursor().execute(
+        "INSERT INTO IngestedFiles (ContentHash, RunId, FileName, IngestedAt) VALUES (?, ?, ?, ?)",
+        (content_hash, int(run_id), file_name, datetime.now()),
+    )
+
+
+def query_quantiles(conn, quantiles, run_ids=None, apis=None, group_by=None):
+    """
+    Answer arbitrary latency quantiles by merging stored sketches across runs and APIs.
+
+    Every returned value is within the sketches' relative accuracy (1% by default) of the exact
+    quantile over all raw samples of the selected runs and APIs.
+
+    Parameters:
+    conn (Connection): The database connection object.
+    quantiles (list): Quantiles between 0 and 1, e.g. [0.5, 0.75, 0.999].
+    run_ids (list, optional): Restrict to these RunIds. Defaults to all runs.
+    apis (list, optional): Restrict to these API labels. Defaults to all APIs.
+    group_by (str, optional): 'RunId' or 'API' to get one row per group; None merges everything.
+
+    Returns:
+    pandas.DataFrame: One row per group with 'SampleCount' and one column per quantile.
+    """
+    sql = "SELECT RunId, API, Sketch FROM LatencySketches"
+    conditions, params = [], []
+    if run_ids:
+        conditions.append(f"RunId IN ({', '.join('?' * len(run_ids))})")
+        params.extend(int(run_id) for run_id in run_ids)
+    if apis:
+        conditions.append(f"API IN ({', '.join('?' * len(apis))})")
+        params.extend(apis)
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    cur = conn.cursor()
+    cur.execute(sql, params)
+
+    groups = {}
+    for run_id, api, blob in cur.fetchall():
+        key = {'RunId': run_id, 'API': api}.get(group_by, 'ALL')
+        groups.setdefault(key, []).append(LatencySketch.from_bytes(bytes(blob)))
+
+    rows = []
+    for key, sketches in groups.items():
+        merged = merge_sketches(sketches, sketches[0].relative_accuracy)
+        row = {group_by or 'Group': key, 'SampleCount': merged.count}
+        row.update({f"p{q * 100:g}": merged.quantile(q) for q in quantiles})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def get_schema_version(conn):
+    """
+    Get a cheap token that changes whenever a user table is created or altered.
+
+    Parameters:
+    conn (Connection): The database connection object.
 
-    # Commit the changes and close the connection
-    conn.commit()
-    conn.close()
+    Returns:
+    str: The schema version token.
+    """
+    return get_backend().schema_version(conn)
+
+
+@tracing.traced('schema.introspect')
+def _introspect_schema(conn, tables):
+    db_schema = {table_name: {} for table_name in tables}
+    for table_name, column_name, column_type in get_backend().introspect_schema(conn, tables):
+        db_schema[table_name][column_name] = column_type
+    return {table_name: columns for table_name, columns in db_schema.items() if columns}
 
 
-def get_schema_representation():
+def format_schema_prompt(db_schema):
+    """
+    Render a schema as one compact line per table, e.g. `PerformanceMetrics(API varchar, Samples int, ...)`.
+
+    Parameters:
+    db_schema (dict): Table name -> {column name: data type}.
+
+    Returns:
+    str: The schema text for the prompt.
+    """
+    return '\n'.join(
+        f"{table_name}({', '.join(f'{column} {data_type}' for column, data_type in columns.items())})"
+        for table_name, columns in db_schema.items()
+    )
+
+
+@tracing.traced('schema.fetch')
+def get_schema_representation(force=False):
     """ 
     Get the database schema in a JSON-like format 
+
+    All tables in SCHEMA_TABLES are introspected with a single query and the result is memoized.
+    The cached schema is revalidated at most every SCHEMA_VERSION_CHECK_SECS seconds with a cheap
+    schema-version query, and only re-introspected when that version changes.
+
+    Parameters:
+    force (bool, optional): Re-introspect even if the cached schema is current. Defaults to False.
     
     Returns:
         dict: A dictionary representing the database schema, where the keys are table names and the values are dictionaries representing column details.
     """
-    conn = create_connection()
-    cursor = conn.cursor()
-    
-    # Query to get all table names
-    cursor.execute("SELECT table_name, column_name, data_type, is_nullable,column_default FROM information_schema.columns WHERE table_name = 'PerformanceMetrics'")
-    tables = cursor.fetchall()
-    
-    db_schema = {}
-    
-    for table in tables:
-        table_name = table[0]
-        columns = cursor.fetchall()        
-        column_details = {}
-        for column in columns:
-            column_name = column[1]
-            column_type = column[2]
-            column_details[column_name] = column_type
-        
-        db_schema[table_name] = column_details
-    
-    conn.close()
-    return db_schema
+    now = time.monotonic()
+    if not force and _schema_cache['schema'] is not None and now - _schema_cache['checked_at'] < SCHEMA_VERSION_CHECK_SECS:
+        return _schema_cache['schema']
+
+    with _schema_lock:
+        with connection() as conn:
+            version = get_schema_version(conn)
+            if force or version != _schema_cache['version'] or _schema_cache['schema'] is None:
+                db_schema = _introspect_schema(conn, SCHEMA_TABLES)
+                _schema_cache['schema'] = db_schema
+                _schema_cache['prompt'] = format_schema_prompt(db_schema)
+                _schema_cache['version'] = version
+        _schema_cache['checked_at'] = time.monotonic()
+    return _schema_cache['schema']
+
+
+def get_schema_prompt():
+    """
+    Get the memoized, token-minimal schema text used in the NL-to-SQL prompt.
+
+    Returns:
+        str: One line per table listing its columns and types.
+    """
+    get_schema_representation()
+    return _schema_cache['prompt']
 
 
 # This will create the table and insert 100 rows when you run sql_db.py
 if __name__ == "__main__":
 
+    if 'migrate' in sys.argv[1:]:
+        # Upgrading a database created before the Runs table existed
+        print("Migrated" if migrate_to_runs_schema() else "Schema is already up to date")
+        sys.exit(0)
+
     # Setting up the Performance Metrics table
     setup_performance_metrics_table()
+    setup_latency_sketches_table()
+    setup_ingested_files_table()
+
+    # Baselines and verdicts for the seeded runs
+    import baselines
+    baselines.rebuild_baselines()
 
     # Querying the database
     print(query_database("SELECT * FROM PerformanceMetrics"))
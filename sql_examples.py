@@ -0,0 +1,214 @@
+# sql_examples.py
+"""
+Few-shot examples for the NL-to-SQL prompt.
+
+Questions whose generated SQL ran successfully are kept in a local SQLite store, seeded with the
+Help page samples. For each new question the most similar examples (TF-IDF cosine similarity over
+an in-process index) are added to the user message, up to a fixed token budget. Grounding the model
+in working queries for this schema lets the call use a smaller model and shorter completions.
+"""
+from collections import Counter
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from prompts.prompts import SAMPLE_QUERIES
+
+SQL_EXAMPLES_PATH = os.getenv('SQL_EXAMPLES_PATH', '.cache/sql_examples.db')
+SQL_EXAMPLES_TOP_K = int(os.getenv('SQL_EXAMPLES_TOP_K', '4'))
+# Estimated prompt tokens the examples may take up in total
+SQL_EXAMPLES_TOKEN_BUDGET = int(os.getenv('SQL_EXAMPLES_TOKEN_BUDGET', '400'))
+# Examples less similar than this to the question are left out
+SQL_EXAMPLES_MIN_SCORE = float(os.getenv('SQL_EXAMPLES_MIN_SCORE', '0.25'))
+SQL_EXAMPLES_MAX_ITEMS = int(os.getenv('SQL_EXAMPLES_MAX_ITEMS', '2000'))
+
+# Model and completion length for NL-to-SQL calls; the examples keep a smaller model accurate
+NL_TO_SQL_MODEL = os.getenv('NL_TO_SQL_MODEL', 'gpt-4')
+NL_TO_SQL_MAX_TOKENS = int(os.getenv('NL_TO_SQL_MAX_TOKENS', '300'))
+
+_ANY_DIALECT = ''
+
+
+def normalize(question):
+    return re.sub(r'\s+', ' ', question).strip().rstrip('?.!').lower()
+
+
+def tokenize(text):
+    """
+    Split a question into lower-case terms. CamelCase column names are split into words and numbers
+    become one placeholder term, so "RunID 1" and "RunID 3" count as the same question shape.
+    """
+    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
+    return ['<num>' if term.isdigit() else term for term in re.findall(r'[a-z]+|\d+', text.lower())]
+
+
+def estimate_tokens(text):
+    # About four characters per token for English and SQL
+    return len(text) // 4 + 1
+
+
+class ExampleStore:
+    """
+    Question -> SQL examples in a SQLite file with an in-memory TF-IDF index.
+
+    The index is rebuilt lazily after examples are added, which is cheap for a few thousand short
+    questions. Examples are stored per backend dialect; seeded examples run on every backend.
+    """
+
+    def __init__(self, path=SQL_EXAMPLES_PATH, max_items=SQL_EXAMPLES_MAX_ITEMS):
+        self.path = path
+        self.max_items = max_items
+        self.stats = {'retrievals': 0, 'examples_used': 0, 'recorded': 0}
+        self._lock = threading.Lock()
+        self._index = None
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS examples (
+                normalized TEXT NOT NULL,
+                dialect TEXT NOT NULL,
+                question TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                seeded INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (normalized, dialect)
+            )
+        """)
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR IGNORE INTO examples (normalized, dialect, question, sql, seeded, created_at) VALUES (?, ?, ?, ?, 1, ?)",
+            [(normalize(question), _ANY_DIALECT, question, sql, now) for _, question, sql in SAMPLE_QUERIES],
+        )
+        self._db.commit()
+        self._known = {row for row in self._db.execute("SELECT normalized, dialect FROM examples")}
+
+    def add(self, question, sql, dialect):
+        """
+        Remember a question whose SQL ran successfully. Known questions are left as they are.
+
+        Parameters:
+        question (str): The natural language question.
+        sql (str): The SQL that answered it.
+        dialect (str): The backend name the SQL ran on, e.g. 'sqlserver'.
+        """
+        key = (normalize(question), dialect)
+        with self._lock:
+            if key in self._known or (key[0], _ANY_DIALECT) in self._known:
+                return
+            self._db.execute(
+                "INSERT OR IGNORE INTO examples (normalized, dialect, question, sql, seeded, created_at) VALUES (?, ?, ?, ?, 0, ?)",
+                (key[0], dialect, question.strip(), sql.strip(), time.time()),
+            )
+            # Beyond the size limit, the oldest learned examples go first; seeds are kept
+            self._db.execute(
+                "DELETE FROM examples WHERE seeded = 0 AND rowid NOT IN "
+                "(SELECT rowid FROM examples WHERE seeded = 0 ORDER BY created_at DESC LIMIT ?)",
+                (self.max_items,),
+            )
+            self._db.commit()
+            self._known.add(key)
+            self._index = None
+            self.stats['recorded'] += 1
+
+    def _build_index(self):
+        # Called with the lock held
+        rows = self._db.execute("SELECT normalized, dialect, question, sql FROM examples").fetchall()
+        term_counts = [Counter(tokenize(question)) for _, _, question, _ in rows]
+        document_frequency = Counter(term for counts in term_counts for term in counts)
+        idf = {term: math.log((1 + len(rows)) / (1 + frequency)) + 1 for term, frequency in document_frequency.items()}
+        vectors = [self._vector(counts, idf) for counts in term_counts]
+        self._index = {'rows': rows, 'idf': idf, 'vectors': vectors}
+
+    @staticmethod
+    def _vector(counts, idf):
+        weights = {term: count * idf.get(term, 0.0) for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {term: weight / norm for term, weight in weights.items() if weight} if norm else {}
+
+    def retrieve(self, question, dialect, top_k=SQL_EXAMPLES_TOP_K, token_budget=SQL_EXAMPLES_TOKEN_BUDGET,
+                 min_score=SQL_EXAMPLES_MIN_SCORE):
+        """
+        Find the examples most similar to a question.
+
+        The question itself is never returned: a repeated question is answered by the completion
+        cache, and leaving it out keeps its prompt, and so its cache key, stable.
+
+        Parameters:
+        question (str): The natural language question.
+        dialect (str): The current backend name; examples recorded on other backends are skipped.
+        top_k (int, optional): At most this many examples. Defaults to SQL_EXAMPLES_TOP_K.
+        token_budget (int, optional): Estimated tokens the examples may take. Defaults to SQL_EXAMPLES_TOKEN_BUDGET.
+        min_score (float, optional): Lowest cosine similarity. Defaults to SQL_EXAMPLES_MIN_SCORE.
+
+        Returns:
+        list: (question, SQL, score) tuples, most similar first.
+        """
+        normalized = normalize(question)
+        with self._lock:
+            if self._index is None:
+                self._build_index()
+            index = self._index
+        query_vector = self._vector(Counter(tokenize(question)), index['idf'])
+        scored = []
+        for (example_normalized, example_dialect, example_question, sql), vector in zip(index['rows'], index['vectors']):
+            if example_normalized == normalized or example_dialect not in (dialect, _ANY_DIALECT):
+                continue
+            score = sum(weight * vector.get(term, 0.0) for term, weight in query_vector.items())
+            if score >= min_score:
+                scored.append((score, example_question, sql))
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        examples, tokens = [], 0
+        for score, example_question, sql in scored[:top_k]:
+            cost = estimate_tokens(format_examples([(example_question, sql, score)]))
+            if tokens + cost > token_budget:
+                continue
+            examples.append((example_question, sql, score))
+            tokens += cost
+        self.stats['retrievals'] += 1
+        self.stats['examples_used'] += len(examples)
+        return examples
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM examples").fetchone()[0]
+
+
+def format_examples(examples):
+    return ''.join(f"Question: {question}\nSQL: {sql}\n\n" for question, sql, _ in examples)
+
+
+def build_user_message(question, dialect):
+    """
+    Prefix a question with the most similar known examples.
+
+    Parameters:
+    question (str): The natural language question.
+    dialect (str): The current backend name.
+
+    Returns:
+    str: The user message for the NL-to-SQL completion.
+    """
+    examples = get_example_store().retrieve(question, dialect)
+    if not examples:
+        return question
+    return f"Examples of questions and the SQL that answers them:\n\n{format_examples(examples)}Question: {question}"
+
+
+_example_store = None
+_example_store_lock = threading.Lock()
+
+
+def get_example_store():
+    """
+    Returns the process-wide example store, creating it on first use.
+    """
+    global _example_store
+    with _example_store_lock:
+        if _example_store is None:
+            _example_store = ExampleStore()
+        return _example_store
@@ -0,0 +1,219 @@
+# sql_guard.py
+from contextlib import contextmanager
+import os
+import re
+import time
+
+import pandas as pd
+
+import compact_frames
+import tracing
+
+# Limits applied to LLM-generated SQL
+SQL_MAX_ROWS = int(os.getenv('SQL_MAX_ROWS', '10000'))
+SQL_TIMEOUT_SECS = int(os.getenv('SQL_TIMEOUT_SECS', '30'))
+SQL_FETCH_CHUNK_ROWS = int(os.getenv('SQL_FETCH_CHUNK_ROWS', '1000'))
+SQL_MEMORY_BUDGET_BYTES = int(os.getenv('SQL_MEMORY_BUDGET_BYTES', str(64 * 1024 * 1024)))
+# Result browsing: default rows per page and the sizes offered in the UI
+SQL_PAGE_SIZE = int(os.getenv('SQL_PAGE_SIZE', '50'))
+SQL_PAGE_SIZES = (25, 50, 100, 500)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_QUOTED_IDENTIFIER = re.compile(r'"[^"]*"|\[[^\]]*\]')
+_FORBIDDEN = re.compile(
+    r'\b(INSERT|UPDATE|DELETE|MERGE|DROP|ALTER|CREATE|TRUNCATE|EXEC|EXECUTE|GRANT|REVOKE|DENY|INTO|'
+    r'ATTACH|DETACH|PRAGMA|VACUUM|REINDEX|OPENROWSET|OPENQUERY|OPENDATASOURCE|BULK|SHUTDOWN|WAITFOR|'
+    r'DBCC|BACKUP|RESTORE|USE|DECLARE|SET|KILL|RECONFIGURE)\b|\b(SP|XP)_\w+',
+    re.IGNORECASE,
+)
+
+
+class UnsafeQueryError(ValueError):
+    """
+    Raised when generated SQL is not a single read-only SELECT statement.
+    """
+
+
+def strip_sql(query):
+    """
+    Remove comments and a trailing semicolon from a SQL statement. String literals and quoted
+    identifiers are skipped, so `'a--b'` is kept as it is.
+    """
+    parts, start, i = [], 0, 0
+    while i < len(query):
+        char = query[i]
+        if char in "'\"[":
+            end = query.find({'[': ']'}.get(char, char), i + 1)
+            i = len(query) if end < 0 else end + 1
+            continue
+        if query.startswith('--', i) or query.startswith('/*', i):
+            end = query.find('\n' if char == '-' else '*/', i + 2)
+            parts.append(query[start:i])
+            parts.append(' ')
+            i = start = len(query) if end < 0 else end + (1 if char == '-' else 2)
+            continue
+        i += 1
+    parts.append(query[start:])
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def validate_select(query):
+    """
+    Check that a statement is a single read-only SELECT (optionally starting with a CTE).
+
+    Parameters:
+    query (str): The SQL statement.
+
+    Returns:
+    str: The statement without comments or a trailing semicolon.
+
+    Raises:
+    UnsafeQueryError: If the statement is empty, has several statements, does not start with
+    SELECT/WITH or uses a keyword that writes data or changes server state.
+    """
+    statement = strip_sql(query)
+    # Only inspect the SQL itself, not the contents of literals and quoted names
+    code = _QUOTED_IDENTIFIER.sub('""', _STRING_LITERAL.sub("''", statement))
+    if not code:
+        raise UnsafeQueryError("The generated query is empty.")
+    if ';' in code:
+        raise UnsafeQueryError("Only a single SQL statement can be run.")
+    if not re.match(r'(SELECT|WITH)\b', code, re.IGNORECASE):
+        raise UnsafeQueryError("Only SELECT queries can be run.")
+    forbidden = _FORBIDDEN.search(code)
+    if forbidden:
+        raise UnsafeQueryError(f"'{forbidden.group(0)}' is not allowed in a read-only query.")
+    return statement
+
+
+@contextmanager
+def statement_timeout(conn, timeout_secs):
+    """
+    Bound how long statements on `conn` may run.
+
+    pyodbc connections use their query timeout; SQLite connections are interrupted by a progress
+    handler once the deadline passes.
+    """
+    if hasattr(conn, 'set_progress_handler'):
+        deadline = time.monotonic() + timeout_secs
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+        try:
+            yield
+        finally:
+            conn.set_progress_handler(None, 0)
+        return
+    previous = conn.timeout
+    conn.timeout = timeout_secs
+    try:
+        yield
+    finally:
+        conn.timeout = previous
+
+
+def execute_guarded(query, conn, backend, max_rows=None, timeout_secs=None, memory_budget_bytes=None):
+    """
+    Run a generated query read-only, with a row cap, a statement timeout and a memory budget.
+
+    The row cap is pushed into the statement where the backend can do so (TOP / LIMIT) and is also
+    enforced while fetching. Rows are fetched in chunks and fetching stops once the cap or the
+    memory budget is reached.
+
+    Parameters:
+    query (str): The generated SQL.
+    conn (Connection): The database connection object.
+    backend: The storage backend from db_backends.
+    max_rows (int, optional): Row cap. Defaults to SQL_MAX_ROWS.
+    timeout_secs (int, optional): Statement timeout. Defaults to SQL_TIMEOUT_SECS.
+    memory_budget_bytes (int, optional): Memory budget for the result. Defaults to SQL_MEMORY_BUDGET_BYTES.
+
+    Returns:
+    tuple: The results dataframe and whether it was truncated.
+
+    Raises:
+    UnsafeQueryError: If the query is not a single read-only SELECT.
+    """
+    max_rows = max_rows or SQL_MAX_ROWS
+    statement = backend.cap_rows(validate_select(query), max_rows + 1)
+    return _fetch_capped(statement, conn, max_rows, timeout_secs, memory_budget_bytes)
+
+
+@tracing.traced('sql.execute')
+def _fetch_capped(statement, conn, max_rows, timeout_secs=None, memory_budget_bytes=None):
+    """
+    Fetch at most `max_rows` rows of `statement` in chunks, under a timeout and memory budget.
+
+    Returns:
+    tuple: The results dataframe and whether more rows were available.
+    """
+    memory_budget_bytes = memory_budget_bytes or SQL_MEMORY_BUDGET_BYTES
+    chunks, columns, rows_fetched, bytes_fetched, truncated = [], [], 0, 0, False
+    with statement_timeout(conn, timeout_secs or SQL_TIMEOUT_SECS):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(statement)
+            columns = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(min(SQL_FETCH_CHUNK_ROWS, max_rows + 1 - rows_fetched))
+                if not rows:
+                    break
+                chunk = pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns)
+                chunks.append(chunk)
+                rows_fetched += len(chunk)
+                bytes_fetched += int(chunk.memory_usage(deep=True).sum())
+                if rows_fetched > max_rows or bytes_fetched > memory_budget_bytes:
+                    truncated = True
+                    break
+        finally:
+            cursor.close()
+
+    if not chunks:
+        return pd.DataFrame(columns=columns), False
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    return compact_frames.compact_frame(df.iloc[:max_rows]), truncated
+
+
+def fetch_page(query, conn, backend, page, page_size=None, timeout_secs=None):
+    """
+    Fetch one page of a generated query, with paging pushed into the SQL so only that page is transferred.
+
+    Parameters:
+    query (str): The generated SQL.
+    conn (Connection): The database connection object.
+    backend: The storage backend from db_backends.
+    page (int): Zero-based page number.
+    page_size (int, optional): Rows per page. Defaults to SQL_PAGE_SIZE.
+    timeout_secs (int, optional): Statement timeout. Defaults to SQL_TIMEOUT_SECS.
+
+    Returns:
+    tuple: The page dataframe and whether a next page exists.
+
+    Raises:
+    UnsafeQueryError: If the query is not a single read-only SELECT.
+    """
+    page_size = page_size or SQL_PAGE_SIZE
+    # One extra row tells whether there is a next page without counting the whole result
+    statement = backend.paginate(validate_select(query), page * page_size, page_size + 1)
+    return _fetch_capped(statement, conn, page_size, timeout_secs)
+
+
+@tracing.traced('sql.count')
+def count_rows(query, conn, backend, timeout_secs=None):
+    """
+    Count the rows a generated query returns, without fetching them.
+
+    Returns:
+    int: The row count, or None if the backend cannot count this statement (e.g. a T-SQL CTE).
+
+    Raises:
+    UnsafeQueryError: If the query is not a single read-only SELECT.
+    """
+    statement = backend.count_rows(validate_select(query))
+    if statement is None:
+        return None
+    with statement_timeout(conn, timeout_secs or SQL_TIMEOUT_SECS):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(statement)
+            return int(cursor.fetchone()[0])
+        finally:
+            cursor.close()
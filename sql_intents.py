@@ -0,0 +1,223 @@
+# sql_intents.py
+"""
+Deterministic fast path for the common analyzer questions.
+
+Questions shaped like the Help page samples (the latest run, APIs above a response time at a run,
+response times within a range, APIs compared across runs, regressed APIs of a run) are matched by strict patterns and
+answered by filling SQL templates, without an LLM round trip. A question is only answered here
+when the whole of it matches a pattern and every column it names is a known one; anything else,
+including aggregates such as "average of records", falls back to the model.
+"""
+import re
+import threading
+
+import tracing
+
+# Lower-case names and phrases -> PerformanceMetrics / Runs column
+COLUMN_ALIASES = {
+    'api': 'API', 'apis': 'API', 'api name': 'API', 'api names': 'API', 'transaction': 'API', 'transactions': 'API',
+    'runid': 'RunId', 'run': 'RunId',
+    'samples': 'Samples',
+    'average': 'Average', 'avg': 'Average', 'average response time': 'Average',
+    'median': 'Median',
+    'ninetypercentile': 'NinetyPercentile', '90th percentile': 'NinetyPercentile', '90 percentile': 'NinetyPercentile',
+    'p90': 'NinetyPercentile', 'response time': 'NinetyPercentile',
+    'ninetyfivepercentile': 'NinetyFivePercentile', '95th percentile': 'NinetyFivePercentile', 'p95': 'NinetyFivePercentile',
+    'ninetyninepercentile': 'NinetyNinePercentile', '99th percentile': 'NinetyNinePercentile', 'p99': 'NinetyNinePercentile',
+    'minimum': 'Minimum', 'min': 'Minimum',
+    'maximum': 'Maximum', 'max': 'Maximum',
+    'errorpercentage': 'ErrorPercentage', 'error percentage': 'ErrorPercentage', 'error %': 'ErrorPercentage',
+    'throughput': 'Throughput',
+    'receivedkbpersecond': 'ReceivedKBPersecond',
+    'standarddeviation': 'StandardDeviation', 'std dev': 'StandardDeviation',
+}
+# Column lists meaning "every column"
+ALL_COLUMNS = {'records', 'rows', 'all records', 'all rows', 'all', 'everything', 'all columns', 'details', 'all details'}
+# Columns that can be compared with a number
+NUMERIC_COLUMNS = {
+    'Samples', 'Average', 'Median', 'NinetyPercentile', 'NinetyFivePercentile', 'NinetyNinePercentile',
+    'Minimum', 'Maximum', 'Throughput', 'ReceivedKBPersecond', 'StandardDeviation',
+}
+COMPARISONS = {
+    'greater than or equal to': '>=', 'at least': '>=', '>=': '>=',
+    'greater than': '>', 'more than': '>', 'higher than': '>', 'above': '>', 'over': '>', '>': '>',
+    'less than or equal to': '<=', 'at most': '<=', '<=': '<=',
+    'less than': '<', 'lower than': '<', 'below': '<', 'under': '<', '<': '<',
+}
+# Words that read as an aggregate ("average of records") rather than a column when followed by "of records/rows"
+AGGREGATE_WORDS = {'average', 'avg', 'mean', 'median', 'minimum', 'min', 'maximum', 'max', 'count', 'sum', 'total'}
+# API names are quoted into the SQL, so only plain label characters are accepted
+API_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.:/\-]+$")
+
+
+def _alternation(phrases):
+    return '|'.join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+
+
+_VERB = r"(?:(?:please )?(?:display|show|list|get|fetch|give|find|return)(?: me)?(?: (?:the|a|all))?(?: list of)? )"
+_METRIC = rf"(?P<metric>{_alternation(name for name, column in COLUMN_ALIASES.items() if column in NUMERIC_COLUMNS)})"
+_OP = rf"(?:{_alternation(COMPARISONS)})"
+_NUMBER = r"\d+(?:\.\d+)?"
+_RUN = r"(?:runid|run)"
+_COLUMNS = r"(?P<columns>[a-z0-9_%, ]+?)(?: columns?)?(?P<scope> (?:for|of) (?:all )?(?:records|rows|apis|transactions))?"
+_FILTER = r"(?:which|that|where|with)(?: (?:has|have|is|are))?"
+_UNIT = r"(?: ?(?:ms|milliseconds))?"
+
+INTENTS = [
+    ('latest_run', re.compile(
+        rf"^(?:{_VERB}|what is |what's |which is )?(?:the )?(?:latest|last|most recent|newest)(?: test)? {_RUN}$"
+        rf"|^which (?:test )?run is the (?:latest|most recent|newest)$", re.IGNORECASE
+    )),
+    ('metric_threshold', re.compile(
+        rf"^{_VERB}{_COLUMNS} {_FILTER} {_METRIC} (?P<op>{_OP}) (?P<value>{_NUMBER}){_UNIT}"
+        rf"(?: and (?P<op2>{_OP}) (?P<value2>{_NUMBER}){_UNIT})? (?:at|for|in|of) {_RUN} (?P<run>\d+)$", re.IGNORECASE
+    )),
+    ('metric_between', re.compile(
+        rf"^{_VERB}{_COLUMNS} {_FILTER} {_METRIC} between (?P<low>{_NUMBER}){_UNIT} and (?P<high>{_NUMBER}){_UNIT}"
+        rf" (?:at|for|in|of) {_RUN} (?P<run>\d+)$", re.IGNORECASE
+    )),
+    ('compare_apis', re.compile(
+        rf"^{_VERB}{_COLUMNS} (?:with|where|for) (?:api names?|apis?)(?: in)? (?P<apis>[^ ].*?)"
+        rf" (?:at|for|in|across|between) {_RUN}s? (?P<runs>\d+(?:(?: ?, ?| and | ?, and )\d+)*)$", re.IGNORECASE
+    )),
+    ('regressed_apis', re.compile(
+        rf"^(?:which|what) (?:apis|transactions) (?:have )?regressed (?:at|in|for|of) {_RUN} (?P<run>\d+)$"
+        rf"|^{_VERB}(?:the )?regressed (?:apis|transactions) (?:at|in|for|of) {_RUN} (?P<regressed_run>\d+)$", re.IGNORECASE
+    )),
+]
+
+
+class IntentMatcher:
+    """
+    Matches questions against INTENTS and counts how many are answered without the LLM.
+    """
+
+    def __init__(self):
+        self.stats = {'questions': 0, 'hits': 0, 'by_intent': {}}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(question):
+        """
+        Collapse whitespace, drop trailing punctuation and spell run IDs one way. Case is kept, so
+        API names reach the SQL as typed; the patterns ignore case.
+        """
+        text = re.sub(r'\s+', ' ', question).strip().rstrip('?.!').strip()
+        text = re.sub(r'\brun[ _-]?ids?\b', 'runid', text, flags=re.IGNORECASE)
+        return re.sub(r'\s*,\s*', ', ', text)
+
+    @tracing.traced('intent.match')
+    def match(self, question):
+        """
+        Answer a question from a SQL template if it has one of the known shapes.
+
+        Parameters:
+        question (str): The natural language question.
+
+        Returns:
+        dict: The intent name, SQL and parameters, or None if the question needs the LLM.
+        """
+        text = self.normalize(question)
+        result = None
+        for intent, pattern in INTENTS:
+            found = pattern.match(text)
+            if found is None:
+                continue
+            params = found.groupdict()
+            sql = _build_sql(intent, params)
+            if sql is not None:
+                result = {'intent': intent, 'sql': sql, 'params': {key: value for key, value in params.items() if value is not None}}
+                break
+        with self._lock:
+            self.stats['questions'] += 1
+            if result is not None:
+                self.stats['hits'] += 1
+                self.stats['by_intent'][result['intent']] = self.stats['by_intent'].get(result['intent'], 0) + 1
+        return result
+
+    def hit_ratio(self):
+        """
+        Fraction of questions answered without the LLM.
+        """
+        return self.stats['hits'] / self.stats['questions'] if self.stats['questions'] else 0.0
+
+
+def _columns(phrase, scope=None):
+    """
+    Map a column list like "API, NinetyPercentile and Average" to a SELECT list; None if any part is
+    unknown, or if it is only an aggregate, like "average of records". An aggregate word among other
+    columns, as in "API, Average of records", is the column of that name.
+    """
+    phrase = phrase.strip().lower()
+    if phrase in ALL_COLUMNS:
+        return '*'
+    parts = [part.strip() for part in re.split(r', and |, | and ', phrase)]
+    if scope and len(parts) == 1 and parts[0] in AGGREGATE_WORDS:
+        return None
+    columns = []
+    for part in parts:
+        column = COLUMN_ALIASES.get(part)
+        if column is None:
+            return None
+        if column not in columns:
+            columns.append(column)
+    return ', '.join(columns)
+
+
+def _number(text):
+    value = float(text)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _run_ids(text):
+    return [int(run_id) for run_id in re.findall(r'\d+', text)]
+
+
+def _api_names(text):
+    names = [name.strip() for name in re.split(r', and |, | and ', text) if name.strip()]
+    if not names or not all(API_NAME_PATTERN.match(name) for name in names):
+        return None
+    return names
+
+
+def _build_sql(intent, params):
+    if intent == 'latest_run':
+        return "SELECT MAX(RunId) AS LatestRunId FROM Runs"
+
+    if intent == 'regressed_apis':
+        run_id = int(params['run'] or params['regressed_run'])
+        return (
+            "SELECT API, NinetyPercentile, BaselineNinetyPercentile, ErrorPercentage, BaselineErrorPercentage "
+            f"FROM RunVerdicts WHERE RunId = {run_id} AND Verdict = 'REGRESSED'"
+        )
+
+    columns = _columns(params['columns'], params['scope'])
+    if columns is None:
+        return None
+    if intent in ('metric_threshold', 'metric_between'):
+        metric = COLUMN_ALIASES[params['metric'].lower()]
+        if intent == 'metric_between':
+            conditions = [f"{metric} BETWEEN {_number(params['low'])} AND {_number(params['high'])}"]
+        else:
+            conditions = [f"{metric} {COMPARISONS[params['op'].lower()]} {_number(params['value'])}"]
+            if params['op2']:
+                conditions.append(f"{metric} {COMPARISONS[params['op2'].lower()]} {_number(params['value2'])}")
+        conditions.append(f"RunId = {int(params['run'])}")
+        return f"SELECT {columns} FROM PerformanceMetrics WHERE {' AND '.join(conditions)}"
+
+    apis = _api_names(params['apis'])
+    if apis is None:
+        return None
+    api_list = ', '.join(f"'{api}'" for api in apis)
+    run_list = ', '.join(str(run_id) for run_id in _run_ids(params['runs']))
+    return f"SELECT {columns} FROM PerformanceMetrics WHERE API IN ({api_list}) AND RunId IN ({run_list}) ORDER BY API, RunId"
+
+
+_matcher = IntentMatcher()
+
+
+def get_intent_matcher():
+    """
+    Returns the process-wide intent matcher.
+    """
+    return _matcher
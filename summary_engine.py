@@ -0,0 +1,187 @@
+# summary_engine.py
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import html
+import os
+import re
+import string
+import threading
+
+import numpy as np
+import pandas as pd
+
+import jtl_ingest
+
+# Number of summarized files kept in memory, keyed by content hash
+SUMMARY_CACHE_SIZE = int(os.getenv('SUMMARY_CACHE_SIZE', '32'))
+
+SUMMARY_TEMPLATE = string.Template("""
+        <table>
+        <style>
+        table {
+        border-collapse: collapse;
+        width: 90%;
+        }
+        th, td {
+        text-align: left;
+        padding: 8px;
+        border: 1px solid black;
+        }
+
+        </style>
+        <tr><th colspan="3" style="text-align:center;">Performance Test Summary</th></tr>\
+<tr><td><b>TestStatus</b></td><td style="color:${status_color};">${test_status}</td></tr>\
+<tr><td><b>RequestPerSecond</b></td><td>${overall_rps}</td></tr>\
+<tr><td><b>Test Configuration</b></td><td><table><tr><td>Run Duration</td><td>${duration}</td></tr>\
+<tr><td>StartTime</td><td>${test_start_time}</td></tr><tr><td>EndTime</td><td>${test_end_time}</td></tr></table></td></tr>\
+<tr><td><b>Test Execution Summary</b></td><td><table><tr><td>Transactions</td><td>${total_samples}</td></tr>\
+<tr><td>Passed</td><td style="color:Green;">${passed_samples}</td></tr>\
+<tr><td>Failed</td><td style="color:red;">${failed_samples}</td></tr>\
+<tr><td>Meeting SLA (${sla_secs} sec):</td><td style="color:Green;">${meeting_sla}</td></tr>\
+<tr><td>Not Meeting SLA (${sla_secs} sec)</td><td style="color:Red;">${not_meeting_sla}</td></tr></table></td></tr>\
+<tr><td><b>Transactions-Not Meeting SLA(90th Percentile)</b></td><td><table>${sla_breach_rows}</table></td></tr>\
+</table>
+        """)
+
+# Results file names: `<Release>_<start>_<end>` with times as dd-mm-YYYY-HH-MM-SS
+RUN_FILE_NAME_PATTERN = re.compile(
+    r'^[A-Za-z0-9]+[\d.]*_[0-9]{2}-[0-9]{2}-[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}_[0-9]{2}-[0-9]{2}-[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}$'
+)
+
+_summary_cache = OrderedDict()
+_summary_cache_lock = threading.Lock()
+
+
+def is_run_file_name(file_name):
+    """
+    Check whether a file name follows the `<Release>_<start>_<end>.csv` convention.
+    """
+    return RUN_FILE_NAME_PATTERN.match(os.path.splitext(os.path.basename(file_name))[0]) is not None
+
+
+def parse_run_file_name(file_name):
+    """
+    Split a `<Release>_<start>_<end>.csv` results file name into its parts.
+
+    Parameters:
+        file_name (str): The results file name.
+
+    Returns:
+        tuple: The release name, test start time and test end time.
+    """
+    release, start_str, end_str = os.path.splitext(os.path.basename(file_name))[0].split('_')
+    return (
+        release,
+        datetime.strptime(start_str, '%d-%m-%Y-%H-%M-%S'),
+        datetime.strptime(end_str, '%d-%m-%Y-%H-%M-%S'),
+    )
+
+
+def compute_summary(data, file_name, sla_secs, acceptable_error_rate):
+    """
+    Compute every test summary statistic from an aggregate report in one vectorized pass.
+
+    Parameters:
+        data (pandas.DataFrame): The JMeter aggregate report, including its 'TOTAL' row.
+        file_name (str): The `<Release>_<start>_<end>.csv` file name.
+        sla_secs (int): The 90th percentile SLA in seconds.
+        acceptable_error_rate (float): The highest error percentage for a passing test.
+
+    Returns:
+        dict: Test status, throughput, sample counts, SLA counts and the SLA breaches frame.
+    """
+    labels = data['Label'].to_numpy()
+    is_total = labels == 'TOTAL'
+    total_row = data.iloc[int(np.flatnonzero(is_total)[0])]
+    p90 = pd.to_numeric(data['90% Line'], errors='coerce').to_numpy()
+    breaching = ~is_total & (p90 > sla_secs * 1000)
+    meeting = ~is_total & (p90 <= sla_secs * 1000)
+
+    error_percentage = float(str(total_row['Error %']).rstrip('%'))
+    total_samples = int(total_row['# Samples'])
+    failed_samples = round(total_samples * (error_percentage / 100))
+    release, test_start_time, test_end_time = parse_run_file_name(file_name)
+    duration = test_end_time - test_start_time
+
+    return {
+        'release': release,
+        'test_status': 'FAIL' if error_percentage > acceptable_error_rate else 'PASS',
+        'overall_rps': total_row['Throughput'],
+        'error_percentage': error_percentage,
+        'total_samples': total_samples,
+        'passed_samples': total_samples - failed_samples,
+        'failed_samples': failed_samples,
+        'meeting_sla': len(pd.unique(labels[meeting])),
+        'not_meeting_sla': len(pd.unique(labels[breaching])),
+        'sla_breaches': data.loc[breaching, ['Label', '90% Line']],
+        'sla_secs': sla_secs,
+        'test_start_time': test_start_time,
+        'test_end_time': test_end_time,
+        'duration': '{:02d}:{:02d}'.format(duration.seconds // 60, duration.seconds % 60),
+    }
+
+
+def render_summary_html(summary):
+    """
+    Render a summary from `compute_summary` through the precompiled HTML template.
+
+    Returns:
+        str: The HTML report.
+    """
+    breaches = summary['sla_breaches']
+    breach_rows = (
+        '<tr><td>' + breaches['Label'].astype(str).map(html.escape)
+        + '</td><td>' + breaches['90% Line'].astype(str) + '</td></tr>'
+    ).str.cat()
+    return SUMMARY_TEMPLATE.substitute(
+        status_color='red' if summary['test_status'] == 'FAIL' else 'Green',
+        sla_breach_rows=breach_rows,
+        **{key: value for key, value in summary.items() if key != 'sla_breaches'},
+    )
+
+
+def content_hash(uploaded_file, chunk_size=1024 * 1024):
+    """
+    Hash a file's content in chunks without loading it whole, leaving the file at its start.
+
+    Returns:
+        str: The SHA-256 hex digest.
+    """
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(chunk_size), b''):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def summarize_results_file(uploaded_file, sla_secs, acceptable_error_rate):
+    """
+    Summarize an uploaded results file, memoized by file content hash and SLA settings.
+
+    Parameters:
+        uploaded_file (file-like): The uploaded aggregate report or raw sample log; must have a `name`.
+        sla_secs (int): The 90th percentile SLA in seconds.
+        acceptable_error_rate (float): The highest error percentage for a passing test.
+
+    Returns:
+        dict: The summary from `compute_summary` plus its rendered 'html'.
+    """
+    digest = content_hash(uploaded_file)
+    key = (digest, os.path.basename(uploaded_file.name), sla_secs, acceptable_error_rate)
+    with _summary_cache_lock:
+        if key in _summary_cache:
+            _summary_cache.move_to_end(key)
+            return _summary_cache[key]
+
+    data = jtl_ingest.read_results_file(uploaded_file)
+    summary = compute_summary(data, uploaded_file.name, sla_secs, acceptable_error_rate)
+    summary['html'] = render_summary_html(summary)
+    summary['content_hash'] = digest
+
+    with _summary_cache_lock:
+        _summary_cache[key] = summary
+        while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+    return summary
@@ -0,0 +1,40 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Some modules read their settings at import time, so the environment is set before they are imported
+_work_dir = tempfile.mkdtemp(prefix='perf-analyzer-tests-')
+os.environ.update({
+    'DB_BACKEND': 'sqlite',
+    'SQLITE_PATH': os.path.join(_work_dir, 'tests.db'),
+    'APP_CONFIG_BACKEND': 'env',
+    'COMPLETION_CACHE_PATH': os.path.join(_work_dir, 'completions.db'),
+    'SQL_EXAMPLES_PATH': os.path.join(_work_dir, 'sql_examples.db'),
+    'DATA_VERSION_CHECK_SECS': '0',
+})
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    A scratch SQLite database with every table created and the sample run from PerfMetrics.csv.
+    """
+    import baselines
+    import db_backends
+    import sql_db
+
+    # The sample results are read from the working directory
+    monkeypatch.chdir(REPO_ROOT)
+    sql_db.set_backend(db_backends.SqliteBackend(str(tmp_path / 'perf_analyzer.db')))
+    sql_db.setup_performance_metrics_table()
+    sql_db.setup_latency_sketches_table()
+    sql_db.setup_ingested_files_table()
+    baselines.setup_baseline_tables()
+    yield sql_db
+    sql_db.get_pool().close_all()
@@ -0,0 +1,125 @@
+# tests/test_completion_cache.py
+from types import SimpleNamespace
+
+import pytest
+
+import azure_openai
+from azure_openai import CompletionCache
+import sql_examples
+
+SYSTEM = "Schema: PerformanceMetrics(API, NinetyPercentile, RunId)"
+PARAMS = {'model': 'gpt-4', 'temperature': 0, 'max_tokens': 500}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CompletionCache(path=str(tmp_path / 'completions.db'), memory_items=4, disk_items=100, ttl_secs=60)
+
+
+def test_key_includes_the_prompt_and_parameters(cache):
+    key = cache.make_key(cache.hash_text(SYSTEM), "show the latest run", PARAMS)
+    assert key != cache.make_key(cache.hash_text(SYSTEM + " "), "show the latest run", PARAMS)
+    assert key != cache.make_key(cache.hash_text(SYSTEM), "show the latest run", dict(PARAMS, max_tokens=300))
+    assert key != cache.make_key(cache.hash_text(SYSTEM), "show the latest run", dict(PARAMS, model='gpt-35-turbo'))
+
+
+def test_whitespace_and_trailing_punctuation_are_normalized(cache):
+    cache.put(SYSTEM, "show the latest run", PARAMS, "SELECT MAX(RunId) FROM Runs")
+    assert cache.get(SYSTEM, "  show   the latest run?! ", PARAMS) == "SELECT MAX(RunId) FROM Runs"
+
+
+def test_questions_are_matched_case_sensitively(cache):
+    cache.put(SYSTEM, "show p90 for api Login", PARAMS, "SELECT ... WHERE API = 'Login'")
+    assert cache.get(SYSTEM, "show p90 for api LOGIN", PARAMS) is None
+
+
+def test_a_new_prompt_does_not_wipe_other_entries(cache):
+    cache.put(SYSTEM, "show the latest run", PARAMS, "old schema")
+    new_system = SYSTEM + ", Runs(RunId, TestName)"
+    assert cache.get(new_system, "show the latest run", PARAMS) is None
+    cache.put(new_system, "show the latest run", PARAMS, "new schema")
+    assert cache.get(SYSTEM, "show the latest run", PARAMS) == "old schema"
+    assert cache.get(new_system, "show the latest run", PARAMS) == "new schema"
+
+
+def test_entries_survive_a_restart(cache):
+    cache.put(SYSTEM, "show the latest run", PARAMS, "SELECT MAX(RunId) FROM Runs")
+    reopened = CompletionCache(path=cache.path, ttl_secs=60)
+    assert reopened.get(SYSTEM, "show the latest run", PARAMS) == "SELECT MAX(RunId) FROM Runs"
+    assert reopened.stats['disk_hits'] == 1
+    assert reopened.get(SYSTEM, "show the latest run", PARAMS) == "SELECT MAX(RunId) FROM Runs"
+    assert reopened.stats['memory_hits'] == 1
+
+
+def test_discard_drops_both_tiers(cache):
+    cache.put(SYSTEM, "show the latest run", PARAMS, "SELECT broken")
+    cache.discard(SYSTEM, "show the latest run?", PARAMS)
+    assert cache.stats['discards'] == 1
+    assert cache.get(SYSTEM, "show the latest run", PARAMS) is None
+    assert CompletionCache(path=cache.path).get(SYSTEM, "show the latest run", PARAMS) is None
+    # Discarding a missing entry is not counted
+    cache.discard(SYSTEM, "show the latest run", PARAMS)
+    assert cache.stats['discards'] == 1
+
+
+def test_entries_expire_after_the_ttl(cache, monkeypatch):
+    cache.put(SYSTEM, "show the latest run", PARAMS, "SELECT MAX(RunId) FROM Runs")
+    now = azure_openai.time.time()
+    monkeypatch.setattr(azure_openai.time, 'time', lambda: now + cache.ttl_secs + 1)
+    assert cache.get(SYSTEM, "show the latest run", PARAMS) is None
+    assert cache.stats['misses'] == 1
+
+
+def test_memory_tier_is_bounded(cache):
+    for i in range(10):
+        cache.put(SYSTEM, f"question {i}", PARAMS, f"answer {i}")
+    assert len(cache._memory) == cache.memory_items
+    # Evicted from memory, still on disk
+    assert cache.get(SYSTEM, "question 0", PARAMS) == "answer 0"
+    assert cache.stats['disk_hits'] == 1
+
+
+@pytest.fixture
+def fake_model(cache, monkeypatch):
+    """
+    Serve completions from `cache` and answer model requests from a list, recording each request's user message.
+    """
+    requests = []
+    answers = []
+    monkeypatch.setattr(azure_openai, '_completion_cache', cache)
+    monkeypatch.setattr(azure_openai, '_build_request', lambda system_message, user_message, *args: {'user_message': user_message})
+
+    def create(request):
+        requests.append(request['user_message'])
+        return SimpleNamespace(choices=[SimpleNamespace(message={'content': answers.pop(0)})])
+
+    monkeypatch.setattr(azure_openai, '_create_with_retries', create)
+    return SimpleNamespace(requests=requests, answers=answers)
+
+
+def test_repeat_is_a_hit_after_similar_examples_are_learned(fake_model, tmp_path, monkeypatch):
+    store = sql_examples.ExampleStore(path=str(tmp_path / 'examples.db'))
+    monkeypatch.setattr(sql_examples, '_example_store', store)
+    question = "Show the slowest APIs of RunID 4"
+
+    def ask():
+        prompt = sql_examples.build_user_message(question, 'sqlite')
+        return azure_openai.get_completion_from_messages(SYSTEM, prompt, cache_key=question)
+
+    fake_model.answers.append("SELECT TOP 5 API FROM PerformanceMetrics WHERE RunId = 4")
+    first_prompt = sql_examples.build_user_message(question, 'sqlite')
+    assert ask() == "SELECT TOP 5 API FROM PerformanceMetrics WHERE RunId = 4"
+    store.add("Show the slowest APIs of RunID 3", "SELECT API FROM PerformanceMetrics WHERE RunId = 3 ORDER BY NinetyPercentile DESC", 'sqlite')
+    # The examples sent to the model changed, the cached answer did not
+    assert sql_examples.build_user_message(question, 'sqlite') != first_prompt
+    assert ask() == "SELECT TOP 5 API FROM PerformanceMetrics WHERE RunId = 4"
+    assert fake_model.requests == [first_prompt]
+
+
+def test_failed_sql_is_not_served_again(fake_model):
+    fake_model.answers.extend(["SELECT broken", "SELECT MAX(RunId) FROM Runs"])
+
+    assert azure_openai.get_completion_from_messages(SYSTEM, "show the latest run") == "SELECT broken"
+    assert azure_openai.get_completion_from_messages(SYSTEM, "show the latest run") == "SELECT broken"
+    azure_openai.discard_completion(SYSTEM, "show the latest run")
+    assert azure_openai.get_completion_from_messages(SYSTEM, "show the latest run") == "SELECT MAX(RunId) FROM Runs"
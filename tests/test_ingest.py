@@ -0,0 +1,140 @@
+# tests/test_ingest.py
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+
+import pytest
+
+import baselines
+import batch_ingest
+import jtl_ingest
+import summary_engine
+from benchmarks import synthetic_data
+
+TABLES = ['Runs', 'PerformanceMetrics', 'LatencySketches', 'IngestedFiles', 'RunVerdicts']
+
+
+def results_file(seed, apis=5):
+    start = datetime(2024, 1, 1) + timedelta(days=seed)
+    samples = synthetic_data.generate_samples(apis, 200, start=start, seed=seed)
+    uploaded_file = synthetic_data.to_csv_buffer(samples, synthetic_data.run_file_name(f"Release{seed}", start, 3600))
+    content_hash = summary_engine.content_hash(uploaded_file)
+    uploaded_file.seek(0)
+    report, sketches = jtl_ingest.load_results_file(uploaded_file)
+    release, test_start_time, test_end_time = summary_engine.parse_run_file_name(uploaded_file.name)
+    return {
+        'release': release, 'test_start_time': test_start_time, 'test_end_time': test_end_time,
+        'report': report, 'sketches': sketches, 'content_hash': content_hash, 'file_name': uploaded_file.name,
+    }
+
+
+def ingest(sql_db, results, conn=None):
+    if conn is None:
+        with sql_db.connection() as conn:
+            return ingest(sql_db, results, conn)
+    return batch_ingest.ingest_run(
+        conn, results['release'], results['test_start_time'], results['test_end_time'], results['report'],
+        results['sketches'], content_hash=results['content_hash'], file_name=results['file_name'],
+    )
+
+
+def row_counts(sql_db):
+    with sql_db.connection() as conn:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES}
+
+
+def test_ingest_stores_the_whole_run(database):
+    before = row_counts(database)
+    result = ingest(database, results_file(1))
+    assert not result['duplicate']
+    assert result['rows'] == 6
+    assert result['verdicts'] == {baselines.NEW: 5}
+    after = row_counts(database)
+    assert {table: after[table] - before[table] for table in TABLES} == {
+        'Runs': 1, 'PerformanceMetrics': 6, 'LatencySketches': 5, 'IngestedFiles': 1, 'RunVerdicts': 5,
+    }
+
+
+def test_same_file_is_ingested_once(database):
+    results = results_file(1)
+    first = ingest(database, results)
+    counts = row_counts(database)
+    second = ingest(database, results)
+    assert second == {'run_id': first['run_id'], 'rows': 0, 'duplicate': True, 'verdicts': {}, 'regressed': []}
+    assert row_counts(database) == counts
+
+
+def test_concurrent_duplicates_store_one_run(database):
+    results = results_file(1)
+    before = row_counts(database)
+    barrier = threading.Barrier(6)
+
+    def upload(_):
+        barrier.wait()
+        return ingest(database, results)
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        outcomes = list(pool.map(upload, range(6)))
+    assert len({outcome['run_id'] for outcome in outcomes}) == 1
+    assert sum(not outcome['duplicate'] for outcome in outcomes) == 1
+    assert row_counts(database)['Runs'] == before['Runs'] + 1
+
+
+def test_concurrent_ingests_update_every_baseline(database):
+    files = [results_file(seed) for seed in range(8)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda results: ingest(database, results), files))
+    with database.connection() as conn:
+        run_counts = dict(conn.execute("SELECT API, RunCount FROM ApiBaselines").fetchall())
+    # No update is lost, and the TOTAL row gets no baseline
+    assert run_counts == {api: 8 for api in synthetic_data.api_names(5)}
+
+
+def test_failed_ingest_leaves_nothing_behind(database, monkeypatch):
+    results = results_file(1)
+    before = row_counts(database)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("baseline update failed")
+
+    monkeypatch.setattr(baselines, 'update_baselines', fail)
+    with pytest.raises(RuntimeError):
+        ingest(database, results)
+    assert row_counts(database) == before
+
+    # The file was not recorded as ingested, so it can be retried
+    monkeypatch.undo()
+    assert not ingest(database, results)['duplicate']
+    assert row_counts(database)['Runs'] == before['Runs'] + 1
+
+
+def test_regression_is_detected_and_total_gets_no_verdict(database):
+    results = results_file(1)
+    for seed in range(baselines.BASELINE_MIN_RUNS):
+        results['content_hash'] = f"hash-{seed}"
+        ingest(database, results)
+    slow = dict(results, content_hash='hash-slow', report=results['report'].copy())
+    api = slow['report']['Label'].iloc[0]
+    slow['report'].loc[slow['report']['Label'] == api, '90% Line'] *= 3
+    result = ingest(database, slow)
+    assert result['regressed'] == [api]
+    assert result['verdicts'] == {baselines.OK: 4, baselines.REGRESSED: 1}
+    with database.connection() as conn:
+        labels = [row[0] for row in conn.execute("SELECT API FROM RunVerdicts UNION SELECT API FROM ApiBaselines")]
+    assert baselines.TOTAL_LABEL not in labels
+
+
+def test_uploads_are_not_hashed_twice(monkeypatch):
+    start = datetime(2024, 1, 1)
+    samples = synthetic_data.generate_samples(3, 50, start=start, seed=1)
+    uploaded_file = synthetic_data.to_csv_buffer(samples, synthetic_data.run_file_name("Release1", start, 3600))
+    digest = summary_engine.content_hash(uploaded_file)
+    assert batch_ingest.parse_upload(uploaded_file)['content_hash'] == digest
+
+    def hash_again(uploaded_file):
+        raise AssertionError("upload hashed twice")
+
+    monkeypatch.setattr(summary_engine, 'content_hash', hash_again)
+    [(parsed, error)] = batch_ingest.parse_uploads([uploaded_file], content_hashes=[digest])
+    assert error is None
+    assert parsed['content_hash'] == digest
@@ -0,0 +1,84 @@
+# tests/test_latency_sketch.py
+import math
+import zlib
+
+import numpy as np
+import pytest
+
+from latency_sketch import LatencySketch, merge_sketches
+
+QUANTILES = [0.0, 0.01, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1.0]
+
+
+def exact_quantile(values, q):
+    # Nearest-rank quantile, the definition the sketch's error bound refers to
+    return float(np.sort(values)[max(1, math.ceil(q * len(values))) - 1])
+
+
+def assert_within_relative_accuracy(sketch, values):
+    for q in QUANTILES:
+        exact = exact_quantile(values, q)
+        estimate = sketch.quantile(q)
+        if exact <= 0:
+            assert estimate == 0.0
+        else:
+            assert abs(estimate - exact) <= sketch.relative_accuracy * exact * (1 + 1e-9), q
+
+
+@pytest.mark.parametrize('relative_accuracy', [0.01, 0.05])
+@pytest.mark.parametrize('distribution', ['lognormal', 'pareto', 'uniform'])
+def test_quantiles_are_within_the_relative_accuracy(relative_accuracy, distribution):
+    rng = np.random.default_rng(42)
+    values = {
+        'lognormal': lambda: rng.lognormal(mean=5, sigma=1.2, size=20000),
+        'pareto': lambda: (rng.pareto(1.5, size=20000) + 1) * 50,
+        'uniform': lambda: rng.uniform(0.5, 30000, size=20000),
+    }[distribution]()
+    sketch = LatencySketch(relative_accuracy)
+    sketch.add_many(values)
+    assert sketch.count == len(values)
+    assert_within_relative_accuracy(sketch, values)
+
+
+def test_counts_and_zero_latencies():
+    values = np.array([0, 0, 0, 10, 20, 30, 40])
+    counts = np.array([1, 2, 3, 4, 5, 6, 7])
+    sketch = LatencySketch()
+    sketch.add_many(values, counts)
+    assert sketch.count == counts.sum()
+    assert sketch.zero_count == 6
+    assert_within_relative_accuracy(sketch, np.repeat(values, counts))
+
+
+def test_merged_sketches_keep_the_error_bound():
+    rng = np.random.default_rng(7)
+    parts = [rng.lognormal(mean=4 + i, sigma=0.8, size=5000) for i in range(4)]
+    sketches = []
+    for part in parts:
+        sketch = LatencySketch()
+        sketch.add_many(part)
+        sketches.append(sketch)
+    merged = merge_sketches(sketches)
+    assert merged.count == 20000
+    assert_within_relative_accuracy(merged, np.concatenate(parts))
+
+
+def test_serialization_round_trip():
+    rng = np.random.default_rng(3)
+    sketch = LatencySketch()
+    sketch.add_many(rng.exponential(300, size=5000))
+    sketch.add(0, count=5)
+    restored = LatencySketch.from_bytes(sketch.to_bytes())
+    assert restored.buckets == sketch.buckets
+    assert (restored.count, restored.zero_count) == (sketch.count, sketch.zero_count)
+    assert restored.quantiles(QUANTILES) == sketch.quantiles(QUANTILES)
+
+
+def test_empty_sketch_and_invalid_use():
+    assert LatencySketch().quantile(0.5) is None
+    with pytest.raises(ValueError):
+        LatencySketch(0)
+    with pytest.raises(ValueError):
+        LatencySketch(0.01).merge(LatencySketch(0.02))
+    with pytest.raises(ValueError):
+        LatencySketch.from_bytes(zlib.compress(b'XXXX' + bytes(20)))
@@ -0,0 +1,79 @@
+# tests/test_pagination.py
+from datetime import datetime
+
+import pytest
+
+import db_backends
+
+PAGING = "OFFSET 20 ROWS FETCH NEXT 11 ROWS ONLY"
+
+
+@pytest.mark.parametrize('statement, expected', [
+    ("SELECT * FROM Runs ORDER BY RunId DESC", f"SELECT * FROM Runs ORDER BY RunId DESC {PAGING}"),
+    ("SELECT * FROM Runs", f"SELECT * FROM Runs ORDER BY (SELECT NULL) {PAGING}"),
+    ("SELECT API FROM PerformanceMetrics UNION SELECT API FROM RunVerdicts",
+     f"SELECT API FROM PerformanceMetrics UNION SELECT API FROM RunVerdicts ORDER BY 1 {PAGING}"),
+    ("SELECT TOP 5 * FROM Runs ORDER BY RunId",
+     f"SELECT * FROM (SELECT TOP 5 * FROM Runs ORDER BY RunId) AS page_source ORDER BY (SELECT NULL) {PAGING}"),
+    ("SELECT * FROM Runs ORDER BY RunId OFFSET 0 ROWS FETCH NEXT 5 ROWS ONLY",
+     "SELECT * FROM (SELECT * FROM Runs ORDER BY RunId OFFSET 0 ROWS FETCH NEXT 5 ROWS ONLY) AS page_source "
+     f"ORDER BY (SELECT NULL) {PAGING}"),
+    # ORDER BY inside a subquery or a literal is not the statement's own
+    ("SELECT * FROM (SELECT TOP 3 * FROM Runs ORDER BY RunId) AS t",
+     f"SELECT * FROM (SELECT TOP 3 * FROM Runs ORDER BY RunId) AS t ORDER BY (SELECT NULL) {PAGING}"),
+    ("SELECT * FROM Runs WHERE TestName = 'order by'", f"SELECT * FROM Runs WHERE TestName = 'order by' ORDER BY (SELECT NULL) {PAGING}"),
+])
+def test_sqlserver_paginate(statement, expected):
+    assert db_backends.SqlServerBackend().paginate(statement, 20, 11) == expected
+
+
+@pytest.mark.parametrize('statement, expected', [
+    ("SELECT * FROM Runs", "SELECT COUNT(*) FROM (SELECT * FROM Runs) AS counted"),
+    ("SELECT * FROM Runs ORDER BY RunId", "SELECT COUNT(*) FROM (SELECT * FROM Runs) AS counted"),
+    ("SELECT TOP 5 * FROM Runs ORDER BY RunId", "SELECT COUNT(*) FROM (SELECT TOP 5 * FROM Runs ORDER BY RunId) AS counted"),
+    ("SELECT * FROM Runs ORDER BY RunId OFFSET 5 ROWS",
+     "SELECT COUNT(*) FROM (SELECT * FROM Runs ORDER BY RunId OFFSET 5 ROWS) AS counted"),
+    ("WITH r AS (SELECT * FROM Runs) SELECT * FROM r", None),
+])
+def test_sqlserver_count_rows(statement, expected):
+    assert db_backends.SqlServerBackend().count_rows(statement) == expected
+
+
+def test_sqlite_paginate_and_count_rows():
+    backend = db_backends.SqliteBackend(':memory:')
+    assert backend.paginate("SELECT * FROM Runs ORDER BY RunId", 20, 11) == "SELECT * FROM (SELECT * FROM Runs ORDER BY RunId) LIMIT 11 OFFSET 20"
+    assert backend.count_rows("SELECT * FROM Runs") == "SELECT COUNT(*) FROM (SELECT * FROM Runs)"
+
+
+def test_query_page_walks_the_results_in_order(database):
+    query = "SELECT API FROM PerformanceMetrics ORDER BY API"
+    with database.connection() as conn:
+        expected = database.cached_query(query, conn)['API'].tolist()
+        pages, page, has_next = [], 0, True
+        while has_next:
+            df, has_next = database.query_page(query, conn, page, page_size=4)
+            assert len(df) <= 4
+            pages.append(df['API'].tolist())
+            page += 1
+        assert [len(rows) for rows in pages] == [4, 4, len(expected) - 8]
+        assert sum(pages, []) == expected
+        # A page past the end is empty
+        df, has_next = database.query_page(query, conn, page, page_size=4)
+        assert df.empty and not has_next
+
+
+def test_query_row_count_follows_data_changes(database):
+    with database.connection() as conn:
+        assert database.query_row_count("SELECT * FROM Runs", conn) == 1
+        assert database.query_row_count("SELECT * FROM PerformanceMetrics ORDER BY API", conn) == 11
+        database.create_run(conn, 'Release2', datetime(2024, 1, 2), datetime(2024, 1, 2, 1))
+        assert database.query_row_count("SELECT * FROM Runs", conn) == 2
+
+
+def test_pages_and_counts_are_not_served_as_each_other(database):
+    query = "SELECT RunId FROM Runs"
+    with database.connection() as conn:
+        page, _ = database.query_page(query, conn, 0, page_size=5)
+        assert database.query_row_count(query, conn) == 1
+        assert list(page.columns) == ['RunId']
+        assert list(database.cached_query(query, conn).columns) == ['RunId']
@@ -0,0 +1,45 @@
+# tests/test_query_cache.py
+import pandas as pd
+
+import compact_frames
+from query_cache import QueryResultCache, canonicalize_sql
+
+
+def test_canonical_sql_ignores_spelling_but_not_literals():
+    assert canonicalize_sql("SELECT *\n  FROM Runs -- latest\n;") == canonicalize_sql("select * from runs")
+    assert canonicalize_sql("SELECT * FROM Runs WHERE TestName = 'A'") != canonicalize_sql("SELECT * FROM Runs WHERE TestName = 'a'")
+
+
+def test_results_are_stored_compact():
+    cache = QueryResultCache()
+    df = pd.DataFrame({'API': ['Login', 'Search'], 'RunId': [1, 2], 'NinetyPercentile': [120.5, 300.0], 'Label': ['a', 'b']})
+    cache.put("SELECT * FROM PerformanceMetrics", 1, df)
+    cached = cache.get("SELECT * FROM PerformanceMetrics", 1)
+    assert compact_frames.is_compact(cached)
+    assert isinstance(cached['API'].dtype, pd.CategoricalDtype)
+    # Columns the compact rules do not know are left as they are
+    assert cached['Label'].tolist() == ['a', 'b']
+    assert cache.get("SELECT * FROM PerformanceMetrics", 2) is None
+
+
+def test_compact_results_are_not_compacted_again(monkeypatch):
+    cache = QueryResultCache()
+    df = compact_frames.compact_frame(pd.DataFrame({'API': ['Login'], 'Samples': [10]}))
+    assert compact_frames.is_compact(df)
+
+    def compact_again(df):
+        raise AssertionError("frame compacted twice")
+
+    monkeypatch.setattr(compact_frames, 'compact_frame', compact_again)
+    cache.put("SELECT API, Samples FROM PerformanceMetrics", 1, df)
+    assert cache.get("SELECT API, Samples FROM PerformanceMetrics", 1)['Samples'].dtype == df['Samples'].dtype
+
+
+def test_namespaces_and_memory_cap():
+    cache = QueryResultCache(max_bytes=10_000)
+    cache.put("SELECT 1", 1, pd.DataFrame({'rows': [1]}), 'count')
+    assert cache.get("SELECT 1", 1) is None
+    assert cache.get("SELECT 1", 1, 'count')['rows'].iloc[0] == 1
+    cache.put("SELECT 2", 1, pd.DataFrame({'x': range(5000)}))
+    assert cache.get("SELECT 2", 1) is None
+    assert cache.bytes <= cache.max_bytes
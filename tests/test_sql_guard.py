@@ -0,0 +1,108 @@
+# tests/test_sql_guard.py
+import pytest
+
+import db_backends
+import sql_guard
+
+
+def test_strip_sql_removes_comments_and_trailing_semicolon():
+    query = "SELECT API -- the label\nFROM /* metrics */ PerformanceMetrics;"
+    assert sql_guard.strip_sql(query).split() == ['SELECT', 'API', 'FROM', 'PerformanceMetrics']
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM PerformanceMetrics WHERE API = 'a--b'",
+    "SELECT * FROM PerformanceMetrics WHERE API = 'a/*b*/'",
+    "SELECT * FROM PerformanceMetrics WHERE API = 'it''s -- here'",
+    'SELECT "a--b" FROM PerformanceMetrics',
+    "SELECT [a/*b] FROM PerformanceMetrics",
+])
+def test_strip_sql_keeps_comment_markers_inside_literals(query):
+    assert sql_guard.strip_sql(query) == query
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM Runs",
+    "select RunId from Runs;",
+    "WITH latest AS (SELECT MAX(RunId) AS RunId FROM Runs) SELECT * FROM latest",
+    "SELECT * FROM PerformanceMetrics WHERE API = 'DELETE; DROP TABLE Runs'",
+    "SELECT * FROM Runs -- ; DROP TABLE Runs",
+])
+def test_validate_select_accepts_read_only_queries(query):
+    assert sql_guard.validate_select(query)
+
+
+@pytest.mark.parametrize('query', [
+    "",
+    "-- only a comment",
+    "DELETE FROM Runs",
+    "SELECT * FROM Runs; DROP TABLE Runs",
+    "SELECT '--'; DROP TABLE Runs",
+    "SELECT '/*'; DROP TABLE Runs --*/",
+    "SELECT * INTO Copy FROM Runs",
+    "SELECT * FROM Runs WHERE 1 = 1 EXEC xp_cmdshell 'dir'",
+    "UPDATE Runs SET TestName = 'x'",
+])
+def test_validate_select_rejects_unsafe_queries(query):
+    with pytest.raises(sql_guard.UnsafeQueryError):
+        sql_guard.validate_select(query)
+
+
+@pytest.mark.parametrize('statement, expected', [
+    ("SELECT * FROM Runs", "SELECT TOP (11) * FROM Runs"),
+    ("SELECT DISTINCT API FROM PerformanceMetrics", "SELECT DISTINCT TOP (11) API FROM PerformanceMetrics"),
+    ("SELECT TOP 5 * FROM Runs", "SELECT TOP 5 * FROM Runs"),
+    ("WITH r AS (SELECT * FROM Runs) SELECT * FROM r", "WITH r AS (SELECT * FROM Runs) SELECT * FROM r"),
+])
+def test_sqlserver_cap_rows(statement, expected):
+    assert db_backends.SqlServerBackend().cap_rows(statement, 11) == expected
+
+
+@pytest.mark.parametrize('statement, expected', [
+    ("SELECT * FROM Runs", "SELECT * FROM Runs LIMIT 11"),
+    ("SELECT * FROM Runs LIMIT 5", "SELECT * FROM Runs LIMIT 5"),
+    ("SELECT * FROM Runs LIMIT 5 OFFSET 10", "SELECT * FROM Runs LIMIT 5 OFFSET 10"),
+])
+def test_sqlite_cap_rows(statement, expected):
+    assert db_backends.SqliteBackend(':memory:').cap_rows(statement, 11) == expected
+
+
+def test_execute_guarded_truncates_at_the_row_cap(database):
+    with database.connection() as conn:
+        df, truncated = sql_guard.execute_guarded("SELECT * FROM PerformanceMetrics", conn, database.get_backend(), max_rows=3)
+        assert len(df) == 3
+        assert truncated
+        df, truncated = sql_guard.execute_guarded("SELECT * FROM Runs", conn, database.get_backend(), max_rows=3)
+        assert len(df) == 1
+        assert not truncated
+
+
+def test_execute_guarded_stops_at_the_memory_budget(database, monkeypatch):
+    monkeypatch.setattr(sql_guard, 'SQL_FETCH_CHUNK_ROWS', 2)
+    with database.connection() as conn:
+        df, truncated = sql_guard.execute_guarded("SELECT * FROM PerformanceMetrics", conn, database.get_backend(), memory_budget_bytes=1)
+    assert len(df) == 2
+    assert truncated
+
+
+def test_guarded_results_are_cached_apart_from_uncapped_results(database, monkeypatch):
+    query = "SELECT * FROM PerformanceMetrics"
+    with database.connection() as conn:
+        full = database.cached_query(query, conn)
+        monkeypatch.setattr(sql_guard, 'SQL_MAX_ROWS', 3)
+        capped, truncated = database.guarded_query(query, conn)
+        assert len(capped) == 3
+        assert truncated
+        # Neither result is served for the other
+        assert len(database.cached_query(query, conn)) == len(full) > 3
+        monkeypatch.setattr(sql_guard, 'SQL_MAX_ROWS', 100)
+        uncapped, truncated = database.guarded_query(query, conn)
+        assert len(uncapped) == len(full)
+        assert not truncated
+
+
+def test_guarded_query_refuses_writes(database):
+    with database.connection() as conn:
+        with pytest.raises(sql_guard.UnsafeQueryError):
+            database.guarded_query("DELETE FROM Runs", conn)
+        assert len(database.cached_query("SELECT * FROM Runs", conn)) == 1
@@ -0,0 +1,100 @@
+# tests/test_sql_intents.py
+import pytest
+
+from prompts.prompts import SAMPLE_QUERIES
+import sql_guard
+import sql_intents
+
+# Run details need a Runs column list, which no template writes
+HELP_SAMPLES = [(question, sql) for title, question, sql in SAMPLE_QUERIES if title != "Show the details of a test run"]
+
+
+@pytest.fixture
+def matcher():
+    return sql_intents.IntentMatcher()
+
+
+@pytest.mark.parametrize('question, intent, sql', [
+    ("Fetch me the latest RunId?", 'latest_run', "SELECT MAX(RunId) AS LatestRunId FROM Runs"),
+    ("which run is the most recent", 'latest_run', "SELECT MAX(RunId) AS LatestRunId FROM Runs"),
+    ("Display all records which has NinetyPercentile greater than 1000 at Run ID 3", 'metric_threshold',
+     "SELECT * FROM PerformanceMetrics WHERE NinetyPercentile > 1000 AND RunId = 3"),
+    ("show API and p95 where response time above 500 ms and below 2000.5 ms for run 7", 'metric_threshold',
+     "SELECT API, NinetyFivePercentile FROM PerformanceMetrics WHERE NinetyPercentile > 500 "
+     "AND NinetyPercentile < 2000.5 AND RunId = 7"),
+    ("List API, Average and Throughput with Average between 100 and 200 at run_id 2", 'metric_between',
+     "SELECT API, Average, Throughput FROM PerformanceMetrics WHERE Average BETWEEN 100 AND 200 AND RunId = 2"),
+    ("Show NinetyPercentile with API names Login, Checkout and Search across runs 1, 2 and 3", 'compare_apis',
+     "SELECT NinetyPercentile FROM PerformanceMetrics WHERE API IN ('Login', 'Checkout', 'Search') "
+     "AND RunId IN (1, 2, 3) ORDER BY API, RunId"),
+    ("Which APIs regressed in run 4?", 'regressed_apis',
+     "SELECT API, NinetyPercentile, BaselineNinetyPercentile, ErrorPercentage, BaselineErrorPercentage "
+     "FROM RunVerdicts WHERE RunId = 4 AND Verdict = 'REGRESSED'"),
+    ("show the regressed transactions for runid 9", 'regressed_apis',
+     "SELECT API, NinetyPercentile, BaselineNinetyPercentile, ErrorPercentage, BaselineErrorPercentage "
+     "FROM RunVerdicts WHERE RunId = 9 AND Verdict = 'REGRESSED'"),
+])
+def test_known_question_shapes_are_answered_from_templates(matcher, question, intent, sql):
+    result = matcher.match(question)
+    assert result['intent'] == intent
+    assert result['sql'] == sql
+    # Template SQL must pass the same guard as generated SQL
+    sql_guard.validate_select(result['sql'])
+
+
+@pytest.mark.parametrize('question, sql', HELP_SAMPLES)
+def test_help_samples_are_answered_from_templates(question, sql):
+    result = sql_intents.get_intent_matcher().match(question)
+    assert result is not None
+    assert result['sql'] == sql
+
+
+def test_aggregate_word_among_other_columns_is_a_column(matcher):
+    result = matcher.match("show API, Min and Max of records with API names Login at runs 1 and 2")
+    assert result['sql'] == (
+        "SELECT API, Minimum, Maximum FROM PerformanceMetrics WHERE API IN ('Login') AND RunId IN (1, 2) ORDER BY API, RunId"
+    )
+
+
+def test_api_names_keep_their_case(matcher):
+    result = matcher.match("show p90 for api LoginAPI at run 1")
+    assert "API IN ('LoginAPI')" in result['sql']
+
+
+@pytest.mark.parametrize('question', [
+    # Aggregates need GROUP BY / AVG, which no template writes
+    "Display average of records which has NinetyPercentile greater than 1000 at Run ID 3",
+    "show the max of all rows where Average above 10 for run 2",
+    "show count of apis with API names Login across runs 1 and 2",
+    # Unknown columns
+    "Display Latency which has NinetyPercentile greater than 1000 at Run ID 3",
+    "show API and colour where Average between 1 and 2 at run 1",
+    # API names that would have to be quoted or escaped
+    "show p90 for api Login' OR '1'='1 at run 1",
+    "show p90 for api Lo gin at run 1",
+    # Anything beyond the whole-question patterns
+    "Display all records which has NinetyPercentile greater than 1000 at Run ID 3 grouped by API",
+    "how did the latest run compare with the baseline",
+    "",
+])
+def test_other_questions_fall_back_to_the_model(matcher, question):
+    assert matcher.match(question) is None
+
+
+def test_plain_average_column_is_still_a_column(matcher):
+    result = matcher.match("show API and Average where p95 above 100 for run 2")
+    assert result['sql'] == "SELECT API, Average FROM PerformanceMetrics WHERE NinetyFivePercentile > 100 AND RunId = 2"
+
+
+def test_normalize_spells_run_ids_one_way():
+    assert sql_intents.IntentMatcher.normalize("  Fetch   the latest Run-ID ?") == "Fetch the latest runid"
+    assert sql_intents.IntentMatcher.normalize("runs 1 ,2,3") == "runs 1, 2, 3"
+
+
+def test_stats_count_hits_per_intent(matcher):
+    matcher.match("Fetch me the latest RunId?")
+    matcher.match("what is the latest run")
+    matcher.match("Which APIs regressed in run 4?")
+    matcher.match("how many runs failed last week")
+    assert matcher.stats == {'questions': 4, 'hits': 3, 'by_intent': {'latest_run': 2, 'regressed_apis': 1}}
+    assert matcher.hit_ratio() == 0.75
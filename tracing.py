@@ -0,0 +1,299 @@
+# tracing.py
+"""
+Lightweight in-process tracing.
+
+Stages are wrapped in spans (`with tracing.span('sql.execute'):` or `@tracing.traced('db.checkout')`).
+Spans opened inside another span share its trace ID, so one Streamlit rerun or one CLI request forms
+one trace. Finished spans feed per-stage latency histograms (p50/p95/p99) and a bounded buffer of
+recent spans, which can be exported as OpenTelemetry (OTLP/JSON) lines to a local file.
+"""
+from collections import deque
+from contextlib import contextmanager
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+
+from latency_sketch import LatencySketch
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+# Finished spans kept in memory for the diagnostics page and export
+TRACE_BUFFER_SPANS = int(os.getenv('TRACE_BUFFER_SPANS', '5000'))
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '.cache/traces.jsonl')
+SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'perf-analyzer')
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_lock = threading.Lock()
+_spans = deque(maxlen=TRACE_BUFFER_SPANS)
+_unexported = deque(maxlen=TRACE_BUFFER_SPANS)
+# Durations are folded into the stage histograms lazily, so recording a span stays cheap
+_pending_durations = []
+_stage_sketches = {}
+_stage_totals = {}
+
+
+class Span:
+    """
+    One timed stage. Times are wall-clock nanoseconds, as OpenTelemetry expects; the duration is
+    measured with the monotonic performance counter.
+    """
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'error', '_started')
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._started = time.perf_counter_ns()
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def elapsed_ms(self):
+        """
+        Milliseconds since the span started.
+        """
+        return (time.perf_counter_ns() - self._started) / 1e6
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns is not None else None
+
+    def finish(self, error=None):
+        """
+        End the span and record it. Finishing twice has no effect.
+        """
+        if self.end_ns is not None:
+            return
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._started)
+        self.error = error
+        if TRACING_ENABLED:
+            _record(self)
+
+
+def new_trace_id():
+    return f"{random.getrandbits(128):032x}"
+
+
+def current_trace_id():
+    """
+    Returns the trace ID of the active span, or None outside a trace.
+    """
+    active = _current_span.get()
+    return active.trace_id if active is not None else None
+
+
+def start_span(name, new_trace=False, **attributes):
+    """
+    Start a span that is a child of the active span but does not become active itself.
+
+    Use this for work whose lifetime is not a single `with` block, such as a generator that is
+    consumed by the caller; call `finish()` when the work ends.
+    """
+    parent = None if new_trace else _current_span.get()
+    if parent is None:
+        return Span(name, new_trace_id(), attributes=attributes)
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+@contextmanager
+def span(name, new_trace=False, **attributes):
+    """
+    Time the enclosed block as a span named `name`; spans opened inside it become its children.
+
+    Parameters:
+    name (str): The stage name, e.g. 'sql.execute'.
+    new_trace (bool, optional): Start a new trace instead of joining the active one. Defaults to False.
+    **attributes: Attributes recorded on the span.
+
+    Yields:
+    Span: The span, so attributes can be added while it runs.
+    """
+    current = start_span(name, new_trace, **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        # Control flow such as st.rerun()/st.stop(), KeyboardInterrupt or GeneratorExit is not an
+        # error; those spans are just closed below
+        current.finish(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+
+
+def traced(name):
+    """
+    Decorator that runs every call of the function (or coroutine function) in a span named `name`.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _record(finished):
+    with _lock:
+        _spans.append(finished)
+        _unexported.append(finished)
+        _pending_durations.append((finished.name, finished.duration_ms))
+        if len(_pending_durations) >= 1024:
+            _fold_pending()
+
+
+def _fold_pending():
+    # Called with _lock held
+    durations = {}
+    for name, duration_ms in _pending_durations:
+        durations.setdefault(name, []).append(duration_ms)
+    _pending_durations.clear()
+    for name, values in durations.items():
+        sketch = _stage_sketches.setdefault(name, LatencySketch())
+        sketch.add_many(values)
+        count, total, maximum = _stage_totals.get(name, (0, 0.0, 0.0))
+        _stage_totals[name] = (count + len(values), total + sum(values), max(maximum, max(values)))
+
+
+def stage_summary():
+    """
+    Latency statistics per stage since start-up (or the last `reset`).
+
+    Returns:
+    list: One dict per stage with count, mean/p50/p95/p99/max milliseconds and total seconds,
+    slowest total first. Percentiles are within 1% of the exact values.
+    """
+    with _lock:
+        _fold_pending()
+        rows = []
+        for name, sketch in _stage_sketches.items():
+            count, total, maximum = _stage_totals[name]
+            quantiles = sketch.quantiles([0.5, 0.95, 0.99])
+            rows.append({
+                'stage': name, 'count': count, 'mean_ms': total / count,
+                'p50_ms': quantiles[0.5], 'p95_ms': quantiles[0.95], 'p99_ms': quantiles[0.99], 'max_ms': maximum, 'total_secs': total / 1000,
+            })
+    return sorted(rows, key=lambda row: row['total_secs'], reverse=True)
+
+
+def recent_traces(limit=20):
+    """
+    Break down the most recent traces by stage.
+
+    Returns:
+    list: One dict per trace, newest first, with its trace ID, root span name, start time, total
+    milliseconds and the milliseconds spent in each stage.
+    """
+    with _lock:
+        spans = list(_spans)
+    traces = {}
+    for finished in spans:
+        traces.setdefault(finished.trace_id, []).append(finished)
+    rows = []
+    for trace_id, trace_spans in traces.items():
+        root = next((s for s in trace_spans if s.parent_id is None), trace_spans[-1])
+        stages = {}
+        for finished in trace_spans:
+            if finished is not root:
+                stages[finished.name] = stages.get(finished.name, 0.0) + finished.duration_ms
+        rows.append({
+            'trace_id': trace_id,
+            'root': root.name,
+            'started_at': time.strftime('%H:%M:%S', time.localtime(root.start_ns / 1e9)),
+            'start_ns': root.start_ns,
+            'total_ms': root.duration_ms,
+            'errors': sum(1 for s in trace_spans if s.error),
+            'stages': stages,
+        })
+    return sorted(rows, key=lambda row: row.pop('start_ns'), reverse=True)[:limit]
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans):
+    """
+    Convert spans to an OTLP/JSON `ExportTraceServiceRequest` body.
+    """
+    otlp_spans = []
+    for finished in spans:
+        otlp_span = {
+            'traceId': finished.trace_id,
+            'spanId': finished.span_id,
+            'name': finished.name,
+            'kind': 1,
+            'startTimeUnixNano': str(finished.start_ns),
+            'endTimeUnixNano': str(finished.end_ns),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in finished.attributes.items()],
+            # STATUS_CODE_OK = 1, STATUS_CODE_ERROR = 2
+            'status': {'code': 2, 'message': finished.error} if finished.error else {'code': 1},
+        }
+        if finished.parent_id:
+            otlp_span['parentSpanId'] = finished.parent_id
+        otlp_spans.append(otlp_span)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+        'scopeSpans': [{'scope': {'name': 'tracing'}, 'spans': otlp_spans}],
+    }]}
+
+
+def export_spans(path=None):
+    """
+    Append the spans finished since the last export to `path` as one OTLP/JSON line, the format
+    of the OpenTelemetry Collector file exporter.
+
+    Parameters:
+    path (str, optional): Output file. Defaults to TRACE_EXPORT_PATH.
+
+    Returns:
+    int: The number of spans exported.
+    """
+    path = path or TRACE_EXPORT_PATH
+    with _lock:
+        spans = list(_unexported)
+        _unexported.clear()
+    if not spans:
+        return 0
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as export_file:
+        export_file.write(json.dumps(to_otlp(spans)) + '\n')
+    return len(spans)
+
+
+def reset():
+    """
+    Forget all recorded spans and stage statistics.
+    """
+    with _lock:
+        _spans.clear()
+        _unexported.clear()
+        _pending_durations.clear()
+        _stage_sketches.clear()
+        _stage_totals.clear()